@@ -3,6 +3,8 @@
 from llama_index.core.workflow import Context
 from llama_index.core.tools import BaseTool
 
+from llms import FAST_MODEL
+from state_store import get_state_store
 from workflow import AgentConfig, ProgressEvent
 from utils import FunctionToolWithContext
 
@@ -11,29 +13,34 @@ def get_authentication_tools() -> list[BaseTool]:
     async def is_authenticated(ctx: Context) -> bool:
         """Checks if the user has a session token."""
         ctx.write_event_to_stream(ProgressEvent(msg="Checking if authenticated"))
-        user_state = await ctx.get("user_state")
-        return user_state["session_token"] is not None
+        store = await get_state_store(ctx)
+        return store.get("session_token") is not None
 
     async def store_username(ctx: Context, username: str) -> None:
         """Adds the username to the user state."""
         ctx.write_event_to_stream(ProgressEvent(msg="Recording username"))
-        user_state = await ctx.get("user_state")
-        user_state["username"] = username
-        await ctx.set("user_state", user_state)
+        store = await get_state_store(ctx)
+        await store.set("username", username)
 
     async def login(ctx: Context, password: str) -> str:
         """Given a password, logs in and stores a session token in the user state."""
-        user_state = await ctx.get("user_state")
-        username = user_state["username"]
+        store = await get_state_store(ctx)
+        username = store.get("username")
         ctx.write_event_to_stream(ProgressEvent(msg=f"Logging in user {username}"))
         # todo: actually check the password
         session_token = "1234567890"
-        user_state["session_token"] = session_token
-        user_state["account_id"] = "123"
-        user_state["account_balance"] = 1000
-        await ctx.set("user_state", user_state)
+        account_id = "123"
+        account_balance = 1000
+        # written together, so no tool ever sees a token without its account
+        await store.merge(
+            {
+                "session_token": session_token,
+                "account_id": account_id,
+                "account_balance": account_balance,
+            }
+        )
 
-        return f"Logged in user {username} with session token {session_token}. They have an account with id {user_state['account_id']} and a balance of ${user_state['account_balance']}."
+        return f"Logged in user {username} with session token {session_token}. They have an account with id {account_id} and a balance of ${account_balance}."
 
     return [
         FunctionToolWithContext.from_defaults(async_fn=store_username),
@@ -54,4 +61,5 @@ If the user supplies a username and password, call the tool "login" to log them
 Once the user is logged in and authenticated, you can transfer them to another agent.
         """,
         tools=get_authentication_tools(),
+        llm=FAST_MODEL,
     )
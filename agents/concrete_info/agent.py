@@ -1,6 +1,8 @@
 """Concrete Fabrication Information Agent configuration."""
 
+from llms import FAST_MODEL
 from workflow import AgentConfig
+from .commands import get_concrete_info_commands
 from .tools import get_concrete_info_tools
 
 def get_concrete_info_agent_config() -> AgentConfig:
@@ -20,10 +22,18 @@ You can provide information on:
 4. Common additives and their effects
 5. Troubleshooting common concrete problems
 6. Safety considerations in concrete work
+7. Material take-offs: use calculate_concrete_quantities to work out cement bags, sand, aggregate
+   and water for a list of pours or a CSV schedule
+8. Curing from sensor data: use simulate_curing_strength to estimate in-place strength and
+   when formwork can be stripped from measured concrete temperatures
 
 Always provide practical, actionable information that helps users understand 
 the concrete fabrication process better. When appropriate, suggest related topics 
 that might be of interest to the user based on their query.
         """,
         tools=get_concrete_info_tools(),
+        commands=get_concrete_info_commands(),
+        llm=FAST_MODEL,
+        # none of the user state is about concrete
+        state_keys=[],
     )
@@ -0,0 +1,21 @@
+"""Commands the Concrete Fabrication Information Agent answers without its LLM."""
+
+from fast_path import Command
+
+STRENGTH_CLASSES = ["low", "medium", "high", "very high"]
+
+_STRENGTH = r"(?P<strength_requirement>[a-z ]+?)"
+
+
+def get_concrete_info_commands() -> list[Command]:
+    """Return the command grammars of the Concrete Fabrication Information Agent."""
+    return [
+        Command(
+            tool_name="get_mixing_ratios",
+            patterns=[
+                rf"(?:what(?:'s| is| are) the )?mix(?:ing)? ratios? (?:for )?(?:an? )?{_STRENGTH} strength(?: concrete| mix)?",
+                rf"{_STRENGTH} strength (?:concrete )?mix(?:ing)? ratios?",
+            ],
+            choices={"strength_requirement": STRENGTH_CLASSES},
+        ),
+    ]
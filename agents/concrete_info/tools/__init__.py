@@ -6,11 +6,16 @@ from utils import FunctionToolWithContext
 from .get_fabrication_info import get_fabrication_info
 from .get_mixing_ratios import get_mixing_ratios
 from .get_curing_info import get_curing_info
+from .calculate_quantities import calculate_concrete_quantities
+from .simulate_curing import simulate_curing_strength
 
 def get_concrete_info_tools() -> list[BaseTool]:
     """Return tools for the Concrete Fabrication Information Agent."""
     return [
-        FunctionToolWithContext.from_defaults(async_fn=get_fabrication_info),
-        FunctionToolWithContext.from_defaults(async_fn=get_mixing_ratios),
-        FunctionToolWithContext.from_defaults(async_fn=get_curing_info)
+        # lookups over static tables, so identical ones can share a run
+        FunctionToolWithContext.from_defaults(async_fn=get_fabrication_info, pure=True),
+        FunctionToolWithContext.from_defaults(async_fn=get_mixing_ratios, pure=True),
+        FunctionToolWithContext.from_defaults(async_fn=get_curing_info, pure=True),
+        FunctionToolWithContext.from_defaults(async_fn=calculate_concrete_quantities),
+        FunctionToolWithContext.from_defaults(async_fn=simulate_curing_strength),
     ]
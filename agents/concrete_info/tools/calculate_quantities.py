@@ -0,0 +1,229 @@
+"""Tool for calculating material take-offs for a schedule of concrete pours."""
+
+import csv
+import io
+import os
+
+import numpy as np
+from pydantic import BaseModel, Field
+from llama_index.core.workflow import Context
+from tool_outputs import get_tool_output_store
+from utils import resolve_data_file
+from workflow import ProgressEvent
+from .get_mixing_ratios import MIXING_RATIOS
+
+# dry materials fill each other's voids when mixed, so 1 m³ of concrete takes ~1.54 m³ of them
+DRY_VOLUME_FACTOR = 1.54
+# bulk density of cement, in kg/m³
+CEMENT_DENSITY = 1440.0
+DEFAULT_BAG_KG = 50.0
+DEFAULT_WASTE_FACTOR = 0.05
+# strength class assumed from the application when a pour doesn't give one
+APPLICATION_STRENGTH = {
+    "footpaths": "low",
+    "garden paths": "low",
+    "driveways": "medium",
+    "patios": "medium",
+    "sidewalks": "medium",
+    "foundations": "medium",
+    "footings": "medium",
+    "slabs": "medium",
+    "general": "medium",
+    "floors": "high",
+    "beams": "high",
+    "columns": "high",
+    "water-retaining structures": "high",
+    "bridges": "very high",
+    "high-rise buildings": "very high",
+}
+# pours listed one by one in the summary; longer schedules only get totals
+MAX_LISTED_POURS = 10
+
+STRENGTH_CLASSES = list(MIXING_RATIOS)
+# per strength class: volume shares of cement, sand and aggregate, and the water-cement ratio
+_SHARES = np.array([MIXING_RATIOS[s]["parts"] for s in STRENGTH_CLASSES], dtype=float)
+_SHARES /= _SHARES.sum(axis=1, keepdims=True)
+_WATER_CEMENT = np.array(
+    [np.mean(MIXING_RATIOS[s]["water_cement"]) for s in STRENGTH_CLASSES]
+)
+
+CSV_COLUMNS = [
+    "pour",
+    "application",
+    "strength_class",
+    "volume_m3",
+    "waste_factor",
+    "cement_bags",
+    "cement_kg",
+    "sand_m3",
+    "aggregate_m3",
+    "water_l",
+]
+
+
+class Pour(BaseModel):
+    """One pour in a schedule."""
+
+    volume_m3: float = Field(description="Volume of concrete to place, in cubic metres")
+    strength_class: str | None = Field(
+        default=None,
+        description="low, medium, high or very high; inferred from the application if omitted",
+    )
+    application: str = "general"
+    waste_factor: float = Field(
+        default=DEFAULT_WASTE_FACTOR,
+        description="Extra material for spillage and uneven subgrade, e.g. 0.05 for 5%",
+    )
+    name: str | None = None
+
+
+def calculate_quantities(
+    volumes: np.ndarray,
+    strength_classes: np.ndarray,
+    waste_factors: np.ndarray,
+    bag_kg: float = DEFAULT_BAG_KG,
+) -> dict[str, np.ndarray]:
+    """Materials for every pour at once. `strength_classes` indexes STRENGTH_CLASSES."""
+    dry_volume = volumes * DRY_VOLUME_FACTOR * (1 + waste_factors)
+    materials = dry_volume[:, None] * _SHARES[strength_classes]
+    cement_kg = materials[:, 0] * CEMENT_DENSITY
+    return {
+        "cement_bags": np.ceil(cement_kg / bag_kg),
+        "cement_kg": cement_kg,
+        "sand_m3": materials[:, 1],
+        "aggregate_m3": materials[:, 2],
+        # a kilogram of water is a litre
+        "water_l": cement_kg * _WATER_CEMENT[strength_classes],
+    }
+
+
+def _strength_class(pour: Pour) -> str | None:
+    if pour.strength_class:
+        key = pour.strength_class.strip().lower()
+        return key if key in MIXING_RATIOS else None
+    return APPLICATION_STRENGTH.get(pour.application.strip().lower(), "medium")
+
+
+def _read_schedule(path: str) -> list[Pour]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            Pour(
+                volume_m3=float(row["volume_m3"]),
+                strength_class=row.get("strength_class") or None,
+                application=row.get("application") or "general",
+                waste_factor=float(row.get("waste_factor") or DEFAULT_WASTE_FACTOR),
+                name=row.get("name") or row.get("pour") or None,
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def _totals_line(
+    label: str, quantities: dict[str, np.ndarray], mask=slice(None)
+) -> str:
+    return (
+        f"{label}: {quantities['cement_bags'][mask].sum():,.0f} bags of cement, "
+        f"{quantities['sand_m3'][mask].sum():,.2f} m³ sand, "
+        f"{quantities['aggregate_m3'][mask].sum():,.2f} m³ aggregate, "
+        f"{quantities['water_l'][mask].sum():,.0f} L water"
+    )
+
+
+async def calculate_concrete_quantities(
+    ctx: Context,
+    pours: list[Pour] | None = None,
+    schedule_csv: str | None = None,
+    bag_kg: float = DEFAULT_BAG_KG,
+    export_csv: bool = False,
+) -> str:
+    """Calculates cement bags, sand, aggregate and water for a list of pours, using the same mixing ratios as get_mixing_ratios.
+
+    Args:
+        pours: The pours, each with a volume in m³, a strength class and/or application, and a waste factor.
+        schedule_csv: Path to a CSV schedule in the data directory instead, with columns name, volume_m3, strength_class, application, waste_factor.
+        bag_kg: Weight of one bag of cement, in kg.
+        export_csv: Also save a per-pour table as CSV.
+    """
+    if schedule_csv:
+        path = resolve_data_file(schedule_csv)
+        if path is None:
+            return f"Schedule {schedule_csv} is outside the data directory; only files in it can be read."
+        if not os.path.exists(path):
+            return f"Schedule {schedule_csv} not found."
+        try:
+            pours = _read_schedule(path)
+        except (KeyError, ValueError) as e:
+            return f"Could not read schedule {schedule_csv}: {e}"
+    pours = [Pour.model_validate(p) for p in pours or []]
+    if not pours:
+        return "No pours given."
+
+    ctx.write_event_to_stream(
+        ProgressEvent(msg=f"Calculating material quantities for {len(pours)} pours")
+    )
+
+    strength_classes = [_strength_class(p) for p in pours]
+    invalid = [i + 1 for i, s in enumerate(strength_classes) if s is None]
+    if invalid:
+        return (
+            f"Unknown strength class for pour(s) {', '.join(map(str, invalid[:20]))}. "
+            "Please choose from low, medium, high, or very high."
+        )
+
+    class_index = {s: i for i, s in enumerate(STRENGTH_CLASSES)}
+    classes = np.array([class_index[s] for s in strength_classes])
+    volumes = np.array([p.volume_m3 for p in pours], dtype=float)
+    waste_factors = np.array([p.waste_factor for p in pours], dtype=float)
+    if (volumes < 0).any() or (waste_factors < 0).any():
+        return "Volumes and waste factors can't be negative."
+
+    quantities = calculate_quantities(volumes, classes, waste_factors, bag_kg)
+
+    lines = [
+        f"Material take-off for {len(pours)} pours ({volumes.sum():,.2f} m³ of concrete):"
+    ]
+    if len(pours) <= MAX_LISTED_POURS:
+        for i, pour in enumerate(pours):
+            label = f"{pour.name or f'Pour {i + 1}'} ({pour.volume_m3:g} m³, {strength_classes[i]})"
+            lines.append("- " + _totals_line(label, quantities, slice(i, i + 1)))
+    else:
+        for i, strength in enumerate(STRENGTH_CLASSES):
+            mask = classes == i
+            if mask.any():
+                lines.append(
+                    "- "
+                    + _totals_line(
+                        f"{strength.capitalize()} strength ({mask.sum()} pours)",
+                        quantities,
+                        mask,
+                    )
+                )
+    lines.append(_totals_line("Total", quantities))
+
+    if export_csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for i, pour in enumerate(pours):
+            writer.writerow(
+                [
+                    pour.name or f"Pour {i + 1}",
+                    pour.application,
+                    strength_classes[i],
+                    pour.volume_m3,
+                    pour.waste_factor,
+                    int(quantities["cement_bags"][i]),
+                    round(float(quantities["cement_kg"][i]), 1),
+                    round(float(quantities["sand_m3"][i]), 3),
+                    round(float(quantities["aggregate_m3"][i]), 3),
+                    round(float(quantities["water_l"][i]), 1),
+                ]
+            )
+        store = await get_tool_output_store(ctx)
+        handle = store.put(buffer.getvalue())
+        lines.append(
+            f'Per-pour CSV saved as tool output "{handle}" ({store.path(handle)}); '
+            "page through it with read_tool_output."
+        )
+
+    return "\n".join(lines)
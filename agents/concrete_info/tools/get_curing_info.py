@@ -9,6 +9,7 @@ async def get_curing_info(
     environmental_conditions: str = "normal"
 ) -> str:
     """Retrieves detailed information about concrete curing techniques and best practices.
+    For strength estimates from measured concrete temperatures, use simulate_curing_strength.
     
     Args:
         curing_method: The specific curing method to get information about
@@ -1,11 +1,60 @@
 """Tool for retrieving concrete mixing ratios."""
 
+from typing import Literal
+
 from llama_index.core.workflow import Context
 from workflow import ProgressEvent
 
+# In a production system, this would come from a technical database.
+# Parts are by volume (cement:sand:aggregate); the water-cement ratio is by mass.
+# design_mpa is the 28-day compressive strength the mix is specified for.
+MIXING_RATIOS = {
+    "low": {
+        "parts": (1, 3, 6),
+        "water_cement": (0.55, 0.6),
+        "design_mpa": 10,
+        "ratio": "1:3:6 (cement:sand:aggregate)",
+        "water_cement_ratio": "0.55-0.60",
+        "strength": "10-15 MPa (1450-2175 psi)",
+        "applications": "Footpaths, garden paths, and non-structural elements",
+        "notes": "Economical mix for non-load bearing applications"
+    },
+    "medium": {
+        "parts": (1, 2, 4),
+        "water_cement": (0.45, 0.55),
+        "design_mpa": 20,
+        "ratio": "1:2:4 (cement:sand:aggregate)",
+        "water_cement_ratio": "0.45-0.55",
+        "strength": "20-25 MPa (2900-3625 psi)",
+        "applications": "Residential foundations, driveways, patios",
+        "notes": "Standard mix for general construction"
+    },
+    "high": {
+        "parts": (1, 1.5, 3),
+        "water_cement": (0.4, 0.45),
+        "design_mpa": 30,
+        "ratio": "1:1.5:3 (cement:sand:aggregate)",
+        "water_cement_ratio": "0.40-0.45",
+        "strength": "30-35 MPa (4350-5075 psi)",
+        "applications": "Commercial floors, beams, columns, water-retaining structures",
+        "notes": "Higher cement content for structural applications"
+    },
+    "very high": {
+        "parts": (1, 1, 2),
+        "water_cement": (0.35, 0.4),
+        "design_mpa": 40,
+        "ratio": "1:1:2 (cement:sand:aggregate)",
+        "water_cement_ratio": "0.35-0.40",
+        "strength": "40+ MPa (5800+ psi)",
+        "applications": "High-rise buildings, bridges, heavy industrial floors",
+        "notes": "May require admixtures and careful curing for best results"
+    }
+}
+
+
 async def get_mixing_ratios(
     ctx: Context,
-    strength_requirement: str,
+    strength_requirement: Literal["low", "medium", "high", "very high"],
     application: str = "general"
 ) -> str:
     """Retrieves recommended mixing ratios for concrete based on strength requirements and application.
@@ -16,43 +65,9 @@ async def get_mixing_ratios(
     """
     ctx.write_event_to_stream(ProgressEvent(msg=f"Retrieving mixing ratios for {strength_requirement} strength concrete for {application}"))
     
-    # In a production system, this would query a technical database
-    # For this example, we'll return predefined information
-    
-    mixing_ratios = {
-        "low": {
-            "ratio": "1:3:6 (cement:sand:aggregate)",
-            "water_cement_ratio": "0.55-0.60",
-            "strength": "10-15 MPa (1450-2175 psi)",
-            "applications": "Footpaths, garden paths, and non-structural elements",
-            "notes": "Economical mix for non-load bearing applications"
-        },
-        "medium": {
-            "ratio": "1:2:4 (cement:sand:aggregate)",
-            "water_cement_ratio": "0.45-0.55",
-            "strength": "20-25 MPa (2900-3625 psi)",
-            "applications": "Residential foundations, driveways, patios",
-            "notes": "Standard mix for general construction"
-        },
-        "high": {
-            "ratio": "1:1.5:3 (cement:sand:aggregate)",
-            "water_cement_ratio": "0.40-0.45",
-            "strength": "30-35 MPa (4350-5075 psi)",
-            "applications": "Commercial floors, beams, columns, water-retaining structures",
-            "notes": "Higher cement content for structural applications"
-        },
-        "very high": {
-            "ratio": "1:1:2 (cement:sand:aggregate)",
-            "water_cement_ratio": "0.35-0.40",
-            "strength": "40+ MPa (5800+ psi)",
-            "applications": "High-rise buildings, bridges, heavy industrial floors",
-            "notes": "May require admixtures and careful curing for best results"
-        }
-    }
-    
     strength_key = strength_requirement.lower()
-    if strength_key in mixing_ratios:
-        ratio_info = mixing_ratios[strength_key]
+    if strength_key in MIXING_RATIOS:
+        ratio_info = MIXING_RATIOS[strength_key]
         
         response = f"## Mixing Ratio for {strength_requirement.capitalize()} Strength Concrete\n\n"
         response += f"- **Basic Ratio**: {ratio_info['ratio']}\n"
@@ -0,0 +1,287 @@
+"""Tool for estimating in-place strength and stripping times from curing temperatures."""
+
+import csv
+import io
+import os
+
+import numpy as np
+from pydantic import BaseModel, Field
+from llama_index.core.workflow import Context
+from tool_outputs import get_tool_output_store
+from utils import resolve_data_file
+from workflow import ProgressEvent
+from .get_mixing_ratios import MIXING_RATIOS
+
+# Nurse-Saul datum temperature, below which cement is taken not to hydrate, in °C
+DATUM_TEMPERATURE = -10.0
+# Arrhenius (Freiesleben Hansen-Pedersen) equivalent age, relative to curing at 20 °C
+ACTIVATION_ENERGY = 40000.0  # J/mol
+GAS_CONSTANT = 8.314  # J/(mol·K)
+REFERENCE_TEMPERATURE = 20.0
+# hyperbolic strength-age curve: rate constant at 20 °C (0.3/day) and age at which strength starts to develop
+RATE_CONSTANT = 0.3 / 24  # per hour
+SETTING_AGE = 12.0  # hours
+DESIGN_AGE = 28 * 24.0  # hours
+# below this strength, concrete that freezes is likely damaged
+MIN_FREEZE_STRENGTH = 3.5  # MPa
+DEFAULT_STRIP_FRACTION = 0.7
+# elements listed one by one in the summary; larger projects get percentiles
+MAX_LISTED_ELEMENTS = 10
+
+
+class CuringElement(BaseModel):
+    """Temperature readings of one concrete element, from placement onwards."""
+
+    name: str
+    temperatures_c: list[float] = Field(
+        description="Concrete temperatures in °C, one reading per interval"
+    )
+    strength_class: str = Field(
+        default="medium", description="low, medium, high or very high"
+    )
+
+
+def _ultimate_strength(design_mpa: np.ndarray) -> np.ndarray:
+    # the limiting strength that makes the curve reach the design strength at 28 days at 20 °C
+    k_age = RATE_CONSTANT * (DESIGN_AGE - SETTING_AGE)
+    return design_mpa * (1 + k_age) / k_age
+
+
+def simulate_curing(
+    temperatures: np.ndarray,
+    design_mpa: np.ndarray,
+    interval_hours: float = 1.0,
+) -> dict[str, np.ndarray]:
+    """Maturity and strength of every element after every reading.
+
+    `temperatures` has one row per element and one column per reading, NaN after an
+    element's last reading. Returns the Nurse-Saul maturity (°C·h), the equivalent age
+    at 20 °C (hours) and the estimated compressive strength (MPa), all shaped like
+    `temperatures`.
+    """
+    measured = ~np.isnan(temperatures)
+    readings = np.where(measured, temperatures, REFERENCE_TEMPERATURE)
+
+    maturity = np.where(measured, np.maximum(readings - DATUM_TEMPERATURE, 0.0), 0.0)
+    np.cumsum(maturity, axis=1, out=maturity)
+    maturity *= interval_hours
+
+    age_factor = np.exp(
+        -ACTIVATION_ENERGY
+        / GAS_CONSTANT
+        * (1 / (readings + 273.15) - 1 / (REFERENCE_TEMPERATURE + 273.15))
+    )
+    age_factor[~measured] = 0.0
+    equivalent_age = np.cumsum(age_factor, axis=1, out=age_factor)
+    equivalent_age *= interval_hours
+
+    k_age = RATE_CONSTANT * np.maximum(equivalent_age - SETTING_AGE, 0.0)
+    strength = _ultimate_strength(design_mpa)[:, None] * k_age / (1 + k_age)
+    return {
+        "maturity": maturity,
+        "equivalent_age": equivalent_age,
+        "strength": strength,
+    }
+
+
+def first_reaching(
+    strength: np.ndarray, target_mpa: np.ndarray, interval_hours: float = 1.0
+) -> np.ndarray:
+    """Hours after placement at which each element first reaches its target, NaN if it doesn't."""
+    reached = strength >= target_mpa[:, None]
+    hours = (reached.argmax(axis=1) + 1) * interval_hours
+    return np.where(reached.any(axis=1), hours, np.nan)
+
+
+def _read_readings(path: str) -> tuple[list[str], np.ndarray]:
+    # one column per element, one row per reading; an optional first "hour" column is skipped
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader([f.readline()]))
+        skip = (
+            1
+            if header and header[0].strip().lower() in ("hour", "hours", "time")
+            else 0
+        )
+        names = [name.strip() for name in header[skip:]]
+        start = f.tell()
+        try:
+            rows = np.loadtxt(
+                f, delimiter=",", ndmin=2, usecols=range(skip, len(header))
+            )
+        except ValueError:
+            # gaps in the readings; slower, but reads empty cells as NaN
+            f.seek(start)
+            rows = np.genfromtxt(
+                f, delimiter=",", ndmin=2, usecols=range(skip, len(header))
+            )
+    return names, rows.T
+
+
+def _stack(series: list[list[float]]) -> np.ndarray:
+    temperatures = np.full((len(series), max(map(len, series), default=0)), np.nan)
+    for i, readings in enumerate(series):
+        temperatures[i, : len(readings)] = readings
+    return temperatures
+
+
+def _hours(hours: float) -> str:
+    if np.isnan(hours):
+        return "not yet"
+    return f"{hours:.0f}h ({hours / 24:.1f} days)"
+
+
+async def simulate_curing_strength(
+    ctx: Context,
+    elements: list[CuringElement] | None = None,
+    readings_csv: str | None = None,
+    strength_class: str = "medium",
+    interval_hours: float = 1.0,
+    strip_fraction: float = DEFAULT_STRIP_FRACTION,
+    strip_strength_mpa: float | None = None,
+    export_csv: bool = False,
+) -> str:
+    """Estimates strength gain and when formwork can be stripped from measured concrete temperatures, using the maturity method.
+
+    Args:
+        elements: The elements, each with a name, its temperature readings since placement in °C, and a strength class.
+        readings_csv: Path to a CSV of sensor readings in the data directory instead, with one column per element and one row per reading.
+        strength_class: Strength class of the elements in readings_csv (low, medium, high, very high).
+        interval_hours: Hours between two readings.
+        strip_fraction: Share of the design strength needed before stripping, e.g. 0.7 for slab soffits.
+        strip_strength_mpa: Strength needed before stripping in MPa, instead of strip_fraction.
+        export_csv: Also save the daily strength of every element as CSV.
+    """
+    if readings_csv:
+        path = resolve_data_file(readings_csv)
+        if path is None:
+            return f"Readings {readings_csv} are outside the data directory; only files in it can be read."
+        if not os.path.exists(path):
+            return f"Readings {readings_csv} not found."
+        try:
+            names, temperatures = _read_readings(path)
+        except (StopIteration, ValueError) as e:
+            return f"Could not read readings {readings_csv}: {e}"
+        classes = [strength_class] * len(names)
+    else:
+        elements = [CuringElement.model_validate(e) for e in elements or []]
+        names = [e.name for e in elements]
+        temperatures = _stack([e.temperatures_c for e in elements])
+        classes = [e.strength_class for e in elements]
+    if not names or temperatures.shape[1] == 0:
+        return "No temperature readings given."
+    if interval_hours <= 0:
+        return "The interval between readings has to be positive."
+
+    classes = [c.strip().lower() for c in classes]
+    invalid = sorted({c for c in classes if c not in MIXING_RATIOS})
+    if invalid:
+        return (
+            f"Unknown strength class {', '.join(invalid)}. "
+            "Please choose from low, medium, high, or very high."
+        )
+
+    ctx.write_event_to_stream(
+        ProgressEvent(
+            msg=f"Simulating curing of {len(names)} elements over {temperatures.shape[1]} readings"
+        )
+    )
+
+    design_mpa = np.array(
+        [MIXING_RATIOS[c]["design_mpa"] for c in classes], dtype=float
+    )
+    target_mpa = (
+        np.full_like(design_mpa, strip_strength_mpa)
+        if strip_strength_mpa is not None
+        else design_mpa * strip_fraction
+    )
+    curing = simulate_curing(temperatures, design_mpa, interval_hours)
+    strength = curing["strength"]
+    strip_hours = first_reaching(strength, target_mpa, interval_hours)
+    last_reading = np.isnan(temperatures)[:, ::-1].argmin(axis=1)
+    last_reading = temperatures.shape[1] - 1 - last_reading
+    rows = np.arange(len(names))
+    current = strength[rows, last_reading]
+    froze = ((temperatures < 0) & (strength < MIN_FREEZE_STRENGTH)).any(axis=1)
+
+    target = (
+        f"{strip_strength_mpa:g} MPa"
+        if strip_strength_mpa is not None
+        else f"{strip_fraction:.0%} of design strength"
+    )
+    lines = [f"Curing of {len(names)} elements (stripping at {target}):"]
+    if len(names) <= MAX_LISTED_ELEMENTS:
+        for i, name in enumerate(names):
+            lines.append(
+                f"- {name} ({classes[i]}, {design_mpa[i]:g} MPa design): "
+                f"{current[i]:.1f} MPa after {(last_reading[i] + 1) * interval_hours / 24:.1f} days "
+                f"(equivalent age {curing['equivalent_age'][i, last_reading[i]] / 24:.1f} days at 20°C, "
+                f"maturity {curing['maturity'][i, last_reading[i]]:,.0f} °C·h), "
+                f"strip: {_hours(strip_hours[i])}"
+            )
+    else:
+        stripped = ~np.isnan(strip_hours)
+        lines.append(f"- Ready to strip: {stripped.sum()} of {len(names)} elements")
+        if stripped.any():
+            p50, p90 = np.percentile(strip_hours[stripped], [50, 90])
+            lines.append(
+                f"- Stripping time: median {_hours(p50)}, P90 {_hours(p90)}, "
+                f"latest {_hours(strip_hours[stripped].max())}"
+            )
+        waiting = np.flatnonzero(~stripped)
+        if waiting.size:
+            slowest = waiting[np.argsort(current[waiting] / target_mpa[waiting])[:5]]
+            lines.append(
+                "- Furthest from stripping: "
+                + ", ".join(
+                    f"{names[i]} ({current[i]:.1f} of {target_mpa[i]:.1f} MPa)"
+                    for i in slowest
+                )
+            )
+    if froze.any():
+        frozen = [names[i] for i in np.flatnonzero(froze)]
+        lines.append(
+            f"Warning: {len(frozen)} element(s) dropped below 0°C before reaching "
+            f"{MIN_FREEZE_STRENGTH:g} MPa and may be frost-damaged: {', '.join(frozen[:10])}"
+            + (" ..." if len(frozen) > 10 else "")
+        )
+    lines.append(
+        "Estimates use the Nurse-Saul maturity and Arrhenius equivalent age with a generic strength curve; "
+        "confirm stripping with cylinder tests or a mix-specific calibration."
+    )
+
+    if export_csv:
+        days = np.arange(1, int(temperatures.shape[1] * interval_hours // 24) + 1)
+        columns = np.minimum(
+            (days * 24 / interval_hours).astype(int) - 1, temperatures.shape[1] - 1
+        )
+        daily = strength[:, columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(
+            ["element", "strength_class", "design_mpa", "strength_mpa", "strip_hour"]
+            + [f"day_{d}_mpa" for d in days]
+        )
+        # days after an element's last reading are left empty
+        measured_days = (last_reading + 1) * interval_hours // 24
+        for i, name in enumerate(names):
+            writer.writerow(
+                [
+                    name,
+                    classes[i],
+                    design_mpa[i],
+                    round(float(current[i]), 2),
+                    "" if np.isnan(strip_hours[i]) else strip_hours[i],
+                ]
+                + [
+                    round(float(s), 2) if d <= measured_days[i] else ""
+                    for d, s in zip(days, daily[i])
+                ]
+            )
+        store = await get_tool_output_store(ctx)
+        handle = store.put(buffer.getvalue())
+        lines.append(
+            f'Daily strength CSV saved as tool output "{handle}" ({store.path(handle)}); '
+            "page through it with read_tool_output."
+        )
+
+    return "\n".join(lines)
@@ -1,6 +1,9 @@
 """Epic Redaction Agent configuration."""
 
+from approvals import ApprovalPolicy, ApprovalRule, during_hours
+from llms import STANDARD_MODEL
 from workflow import AgentConfig
+from .commands import get_epic_redaction_commands
 from .tools import get_epic_redaction_tools
 
 def get_epic_redaction_agent_config() -> AgentConfig:
@@ -25,6 +28,15 @@ Always suggest to the user that they should list epics first if they want to ref
 
 For estimation, you can provide estimates in story points, hours, or days, and adjust for complexity
 and uncertainty factors. This helps with sprint planning and resource allocation.
+To plan across the whole backlog, use estimate_backlog: it forecasts the remaining effort of all
+epics together (P50/P80/P95) and how many sprints it will take at the team's capacity.
+
+Tasks can depend on each other. Record dependencies with add_task_dependency, use plan_epic_tasks
+to order an epic's tasks and find its critical path, and get_ready_tasks to see what can start now.
+Mark tasks done with update_epic_status and a task_id.
+
+To onboard an existing backlog, use import_backlog with the path of a JSONL or CSV file. It imports
+thousands of epics and tasks at once, and continues where it stopped if called again on the same file.
 
 NEW CAPABILITY: You now have a deep thinking mode that uses advanced AI to perform comprehensive analysis
 of epics. When a user wants to create a well-defined epic, suggest using the deep_thinking_epic_definition tool
@@ -34,4 +46,17 @@ Valid epic statuses are: Draft, Ready, In Progress, Review, Done
 Valid priorities are: Low, Medium, High, Critical
         """,
         tools=get_epic_redaction_tools(),
+        commands=get_epic_redaction_commands(),
+        llm=STANDARD_MODEL,
+        tools_requiring_human_confirmation=["deep_thinking_epic_definition", "import_backlog"],
+        approval_policy=ApprovalPolicy(
+            rules=[
+                ApprovalRule(
+                    tool_name="deep_thinking_epic_definition",
+                    decision="approve",
+                    condition=during_hours(),
+                    reason="deep thinking runs unattended during business hours",
+                ),
+            ],
+        ),
     )
@@ -0,0 +1,36 @@
+"""Commands the Epic Redaction Agent answers without its LLM."""
+
+from fast_path import Command
+
+EPIC_STATUSES = ["Draft", "Ready", "In Progress", "Review", "Done"]
+TASK_STATUSES = ["To Do", "In Progress", "Done"]
+
+_EPIC_ID = r"(?P<epic_id>epic-\d+)"
+_NEW_STATUS = r"(?:status )?(?:to|as) (?P<new_status>[a-z ]+)"
+
+
+def get_epic_redaction_commands() -> list[Command]:
+    """Return the command grammars of the Epic Redaction Agent."""
+    return [
+        Command(
+            tool_name="list_epics",
+            patterns=[
+                r"(?:list|show)(?: me)?(?: all)?(?: the| my| our)? epics",
+                r"what epics (?:are there|do (?:i|we) have)",
+            ],
+        ),
+        Command(
+            tool_name="update_epic_status",
+            patterns=[rf"(?:set|mark|move|change) {_EPIC_ID}(?:'s)? {_NEW_STATUS}"],
+            choices={"new_status": EPIC_STATUSES},
+            convert={"epic_id": str.upper},
+        ),
+        Command(
+            tool_name="update_epic_status",
+            patterns=[
+                rf"(?:set|mark|move|change) (?P<task_id>task-\d+) (?:of|in) {_EPIC_ID} {_NEW_STATUS}"
+            ],
+            choices={"new_status": TASK_STATUSES},
+            convert={"epic_id": str.upper, "task_id": str.upper},
+        ),
+    ]
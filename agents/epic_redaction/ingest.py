@@ -0,0 +1,488 @@
+"""Streaming ingestion of an existing backlog, from JSONL or CSV, into the epics of a user state."""
+
+import asyncio
+import csv
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Iterator, Literal, NamedTuple, get_args
+
+from llama_index.core.llms import LLM
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from state_store import UserStateStore
+from .task_graph import parse_dependencies
+from .tools.deep_thinking import analyze_epic, extract_tasks
+
+Priority = Literal["Low", "Medium", "High", "Critical"]
+EpicStatus = Literal["Draft", "Ready", "In Progress", "Review", "Done"]
+TaskStatus = Literal["To Do", "In Progress", "Review", "Done"]
+
+# user state key holding where each imported file was read up to
+IMPORTS_KEY = "backlog_imports"
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_ANALYSIS_CONCURRENCY = 4
+# row errors listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# most rows repeat a handful of dependency texts, like "TASK-1"
+_parse_dependencies = lru_cache(maxsize=4096)(parse_dependencies)
+# bytes that weren't UTF-8, as decoded with errors="surrogateescape"
+_UNDECODABLE = re.compile("[\udc80-\udcff]")
+
+
+def _choice(value: Any, choices: tuple[str, ...]) -> Any:
+    # "high" or "in progress" are taken for "High" and "In Progress"
+    if isinstance(value, str):
+        for choice in choices:
+            if value.strip().lower() == choice.lower():
+                return choice
+    return value
+
+
+class _Row(BaseModel):
+    model_config = ConfigDict(
+        extra="forbid", str_strip_whitespace=True, coerce_numbers_to_str=True
+    )
+
+
+class TaskRow(_Row):
+    """A task, either nested in its epic's row or on a row of its own naming the epic."""
+
+    # id, key or title of the task's epic, on rows of their own
+    epic: str | None = None
+    description: str = Field(min_length=1)
+    status: TaskStatus = "To Do"
+    complexity: str | None = None
+    # e.g. "TASK-2" or "1, 3", numbered within the epic
+    depends_on: str | list[str] | None = None
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def _status(cls, value: Any) -> Any:
+        return _choice(value, get_args(TaskStatus))
+
+
+class EpicRow(_Row):
+    """An epic, with its tasks inline (JSONL) or on the task rows that follow (CSV)."""
+
+    # the item's id in the source, e.g. a tracker key; imported epics are deduplicated by it
+    key: str | None = None
+    title: str = Field(min_length=1)
+    description: str = ""
+    priority: Priority = "Medium"
+    estimated_size: str = "Unknown"
+    status: EpicStatus = "Draft"
+    tasks: list[TaskRow] = []
+    # queue the epic for deep analysis once it's stored
+    analyze: bool = False
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def _priority(cls, value: Any) -> Any:
+        return _choice(value, get_args(Priority))
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def _status(cls, value: Any) -> Any:
+        return _choice(value, get_args(EpicStatus))
+
+
+class SourceRow(NamedTuple):
+    """A row as read from the file, before validation."""
+
+    line: int
+    # byte offset and line number just past the row, where reading resumes
+    end: int
+    next_line: int
+    values: dict | None
+    error: str | None = None
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+def read_jsonl(path: str, offset: int = 0, line: int = 1) -> Iterator[SourceRow]:
+    """Yields the objects of a JSONL file one line at a time, starting at byte `offset`."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            try:
+                text = raw.decode("utf-8-sig").strip()
+            except UnicodeDecodeError as e:
+                yield SourceRow(
+                    line, offset, line + 1, None, f"not valid UTF-8 at byte {e.start}"
+                )
+                line += 1
+                continue
+            if text:
+                try:
+                    values = json.loads(text)
+                except ValueError as e:
+                    yield SourceRow(line, offset, line + 1, None, f"invalid JSON: {e}")
+                else:
+                    if isinstance(values, dict):
+                        yield SourceRow(line, offset, line + 1, values)
+                    else:
+                        yield SourceRow(
+                            line, offset, line + 1, None, "expected a JSON object"
+                        )
+            line += 1
+
+
+def read_csv(path: str, offset: int = 0, line: int = 1) -> Iterator[SourceRow]:
+    """Yields the rows of a CSV file as dicts by header, starting at byte `offset`.
+
+    The header is always read from the top. Empty cells are left out, so the columns of
+    epic and task rows can share one header; quoted cells may span lines. Rows that
+    aren't valid UTF-8 are reported as invalid.
+    """
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8-sig", errors="replace")
+        header = next(csv.reader([header]), [])
+        header = [name.strip() for name in header]
+        if offset < f.tell():
+            offset, line = f.tell(), 2
+        f.seek(offset)
+        position = [offset, line]
+
+        def lines() -> Iterator[str]:
+            # the reader pulls one record's lines at a time, so `position` ends each row
+            for raw in f:
+                position[0] += len(raw)
+                position[1] += 1
+                # kept undecoded, so a bad byte only spoils its own row
+                yield raw.decode("utf-8", errors="surrogateescape")
+
+        for cells in csv.reader(lines()):
+            if any(cell.strip() for cell in cells):
+                if any(_UNDECODABLE.search(cell) for cell in cells):
+                    yield SourceRow(line, *position, None, "not valid UTF-8")
+                elif len(cells) > len(header):
+                    yield SourceRow(
+                        line,
+                        *position,
+                        None,
+                        f"{len(cells)} cells for {len(header)} columns",
+                    )
+                else:
+                    values = {
+                        name: cell for name, cell in zip(header, cells) if cell.strip()
+                    }
+                    yield SourceRow(line, *position, values)
+            line = position[1]
+
+
+def read_backlog(
+    path: str,
+    format: Literal["jsonl", "csv"] | None = None,
+    offset: int = 0,
+    line: int = 1,
+) -> Iterator[SourceRow]:
+    """Rows of a backlog file, CSV if it's named *.csv (or `format` says so), JSONL otherwise."""
+    if format is None:
+        format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    reader = read_csv if format == "csv" else read_jsonl
+    return reader(path, offset, line)
+
+
+def parse_row(values: dict) -> EpicRow | TaskRow:
+    """Validates a row: rows naming an `epic` are tasks, the others epics."""
+    if "epic" in values:
+        return TaskRow.model_validate(values)
+    return EpicRow.model_validate(values)
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+@dataclass
+class IngestReport:
+    """What an ingestion run did so far; the row counts are for this run only."""
+
+    source: str
+    rows: int = 0
+    epics: int = 0
+    tasks: int = 0
+    # epic rows whose key was already imported
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list[RowError] = field(default_factory=list)
+    batches: int = 0
+    # where the next run resumes
+    offset: int = 0
+    line: int = 1
+    analyses: int = 0
+    failed_analyses: int = 0
+
+    def add_error(self, line: int, message: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+
+class _EpicIndex:
+    """Positions of the epics in the stored list, by id, key and title.
+
+    The index follows the import's own batches. Any other write to the epics may have
+    moved them (e.g. a cancelled turn restoring a shorter list), so `sync` rebuilds it
+    when the epics' version isn't the one it was built for.
+    """
+
+    def __init__(self):
+        self.by_id: dict[str, int] = {}
+        self.by_key: dict[str, int] = {}
+        self.by_title: dict[str, int] = {}
+        self.size = 0
+        self.version: int | None = None
+
+    def sync(self, store: UserStateStore) -> None:
+        if store.version_of("epics") == self.version:
+            return
+        self.by_id.clear()
+        self.by_key.clear()
+        self.by_title.clear()
+        self.size = 0
+        for position, epic in enumerate(store.get("epics") or []):
+            self.add(epic, position)
+
+    def add(self, epic: dict, position: int) -> None:
+        self.by_id.setdefault(epic["id"], position)
+        if epic.get("source_key"):
+            self.by_key.setdefault(epic["source_key"], position)
+        self.by_title.setdefault(epic.get("title", ""), position)
+        self.size = max(self.size, position + 1)
+
+    def find(self, name: str) -> int | None:
+        for index in (self.by_id, self.by_key, self.by_title):
+            if name in index:
+                return index[name]
+        return None
+
+
+def _task(task: TaskRow, tasks: list[dict], offset: int) -> dict:
+    task_id = f"TASK-{len(tasks) + 1}"
+    new = {"id": task_id, "description": task.description, "status": task.status}
+    if task.complexity:
+        new["complexity"] = task.complexity
+    if task.depends_on:
+        text = (
+            task.depends_on
+            if isinstance(task.depends_on, str)
+            else ", ".join(task.depends_on)
+        )
+        new["depends_on"] = [
+            d for d in _parse_dependencies(text, offset) if d != task_id
+        ]
+    return new
+
+
+def _apply_batch(
+    epics: list[dict],
+    batch: list[tuple[int, EpicRow | TaskRow]],
+    index: _EpicIndex,
+    report: IngestReport,
+) -> tuple[list[dict], list[tuple[str, int]]]:
+    """The epics list with a batch of rows applied, and the (epic id, line)s to analyze.
+
+    Stored epics aren't touched: the list and any epic gaining tasks are copied.
+    """
+    epics = list(epics)
+    copied: set[int] = set()
+    to_analyze = []
+    for line, row in batch:
+        if isinstance(row, TaskRow):
+            position = index.find(row.epic)
+            if position is None:
+                report.invalid += 1
+                report.add_error(line, f"epic {row.epic!r} not found")
+                continue
+            if position not in copied:
+                epics[position] = {
+                    **epics[position],
+                    "tasks": list(epics[position]["tasks"]),
+                }
+                copied.add(position)
+            tasks = epics[position]["tasks"]
+            tasks.append(_task(row, tasks, 0))
+            report.tasks += 1
+            continue
+
+        if row.key is not None and row.key in index.by_key:
+            report.duplicates += 1
+            continue
+        epic = {
+            "id": f"EPIC-{len(epics) + 1}",
+            "title": row.title,
+            "description": row.description,
+            "priority": row.priority,
+            "estimated_size": row.estimated_size,
+            "status": row.status,
+            "tasks": [],
+        }
+        if row.key is not None:
+            epic["source_key"] = row.key
+        for task in row.tasks:
+            epic["tasks"].append(_task(task, epic["tasks"], 0))
+        # a new epic is only reachable from this batch until it's committed
+        copied.add(len(epics))
+        index.add(epic, len(epics))
+        epics.append(epic)
+        report.epics += 1
+        report.tasks += len(row.tasks)
+        if row.analyze:
+            to_analyze.append((epic["id"], line))
+    return epics, to_analyze
+
+
+def deep_analysis(
+    default: LLM | None = None, on_fallback: Callable[[str], None] | None = None
+) -> Callable[[dict], Awaitable[str]]:
+    """An `analyze` for `ingest_backlog` that runs the deep thinking model on an epic."""
+
+    async def analyze(epic: dict) -> str:
+        return await analyze_epic(
+            epic["title"], epic["description"], default=default, on_fallback=on_fallback
+        )
+
+    return analyze
+
+
+async def ingest_backlog(
+    path: str,
+    store: UserStateStore,
+    format: Literal["jsonl", "csv"] | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    restart: bool = False,
+    analyze: Callable[[dict], Awaitable[str]] | None = None,
+    analysis_concurrency: int = DEFAULT_ANALYSIS_CONCURRENCY,
+    on_progress: Callable[[IngestReport], None] | None = None,
+) -> IngestReport:
+    """Streams a backlog file into `store`'s epics, `batch_size` rows per write.
+
+    Each batch is one `merge` of the epics and the file's read position, under
+    `backlog_imports`, so an interrupted run picks up after its last committed batch
+    (unless `restart`). Invalid rows are counted and reported, not written. Epics get
+    ids like `create_epic`'s, and keep their source key to skip duplicates. Only
+    keyed epics are deduplicated: after a `restart`, epic rows without a key and all
+    task rows are added again.
+
+    With `analyze`, epics whose row sets `analyze` are queued once committed, and up
+    to `analysis_concurrency` of them are analyzed at a time while the file is still
+    being read; their analysis and its tasks are stored like the deep thinking tool's.
+    Analyses still queued when a run is interrupted are dropped, and so are those of
+    epics that are gone (e.g. rolled back) by the time their analysis is done.
+    """
+    source = os.path.abspath(path)
+    position = {} if restart else (store.get(IMPORTS_KEY) or {}).get(source, {})
+    report = IngestReport(
+        source, offset=position.get("offset", 0), line=position.get("line", 1)
+    )
+    index = _EpicIndex()
+    queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+    workers: list[asyncio.Task] = []
+
+    async def commit(
+        batch: list[tuple[int, EpicRow | TaskRow]], end: int, next_line: int
+    ) -> None:
+        # nothing is awaited from reading the epics to the merge, so no other write slips in
+        index.sync(store)
+        epics, to_analyze = _apply_batch(store.get("epics") or [], batch, index, report)
+        report.offset, report.line = end, next_line
+        imports = dict(store.get(IMPORTS_KEY) or {})
+        imports[source] = {"offset": end, "line": next_line}
+        await store.merge({"epics": epics, IMPORTS_KEY: imports})
+        index.version = store.version_of("epics")
+        report.batches += 1
+        for item in to_analyze:
+            queue.put_nowait(item)
+        if to_analyze and analyze is not None and not workers:
+            workers.extend(
+                asyncio.create_task(analysis_worker())
+                for _ in range(analysis_concurrency)
+            )
+
+    async def analysis_worker() -> None:
+        while True:
+            epic_id, line = await queue.get()
+            try:
+                if await store_analysis(epic_id):
+                    report.analyses += 1
+            except Exception as e:
+                report.failed_analyses += 1
+                report.add_error(line, f"deep analysis of {epic_id} failed: {e}")
+            finally:
+                queue.task_done()
+
+    def find_epic(epic_id: str) -> dict | None:
+        # by id: positions can move, e.g. when a cancelled turn rolls the epics back
+        return next((e for e in store.get("epics") or [] if e["id"] == epic_id), None)
+
+    async def store_analysis(epic_id: str) -> bool:
+        """Analyzes an epic and stores the result, unless the epic is gone by then."""
+        epic = find_epic(epic_id)
+        if epic is None:
+            return False
+        analysis = await analyze(epic)
+        tasks = extract_tasks(analysis)
+
+        def add_analysis(current: dict) -> dict:
+            current["deep_analysis"] = analysis
+            for description in tasks:
+                current["tasks"].append(
+                    {
+                        "id": f"TASK-{len(current['tasks']) + 1}",
+                        "description": description,
+                        "status": "To Do",
+                    }
+                )
+            return current
+
+        # looked up again: the id may now belong to another epic, if this one was rolled back
+        current = find_epic(epic_id)
+        if current is None or current["title"] != epic["title"]:
+            return False
+        await store.update_item("epics", epic_id, add_analysis)
+        return True
+
+    try:
+        batch: list[tuple[int, EpicRow | TaskRow]] = []
+        end, next_line = report.offset, report.line
+        for row in read_backlog(path, format, report.offset, report.line):
+            report.rows += 1
+            end, next_line = row.end, row.next_line
+            if row.error is not None:
+                report.invalid += 1
+                report.add_error(row.line, row.error)
+            else:
+                try:
+                    batch.append((row.line, parse_row(row.values)))
+                except ValidationError as e:
+                    report.invalid += 1
+                    report.add_error(row.line, _describe(e))
+            if report.rows % batch_size == 0:
+                await commit(batch, end, next_line)
+                batch = []
+                if on_progress is not None:
+                    on_progress(report)
+                # let the analyses and other sessions run between batches
+                await asyncio.sleep(0)
+        if batch or end != report.offset:
+            await commit(batch, end, next_line)
+            if on_progress is not None:
+                on_progress(report)
+        if workers:
+            await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return report
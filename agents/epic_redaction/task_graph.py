@@ -0,0 +1,269 @@
+"""Dependency graphs between the tasks of an epic, kept up to date incrementally."""
+
+import heapq
+import re
+import weakref
+from typing import Callable, Iterable
+
+from state_store import UserStateStore
+from .tools.estimate_backlog import COMPLEXITY_DISTRIBUTIONS, task_complexity
+
+# explicit task ids, e.g. "TASK-12"
+_TASK_ID = re.compile(r"\bTASK-(\d+)\b", re.IGNORECASE)
+# positions in the analysis list: numbers after "task" or "#", with the ones listed
+# along with them ("Tasks 1, 2 and 4"), or a text that is only such a list
+_NUMBER_LIST = r"\d+(?:(?:\s*(?:,|&|\band\b|\bor\b))+\s*#?\d+)*"
+_TASK_NUMBERS = re.compile(rf"(?:\btasks?\s*#?|#)\s*({_NUMBER_LIST})", re.IGNORECASE)
+_ONLY_NUMBERS = re.compile(rf"\s*({_NUMBER_LIST})\s*\.?\s*", re.IGNORECASE)
+_NUMBER = re.compile(r"\d+")
+
+
+class CycleError(ValueError):
+    """Raised when a dependency would make a task (indirectly) depend on itself."""
+
+
+def parse_dependencies(text: str, offset: int = 0) -> list[str]:
+    """The task ids a free-text dependency list refers to.
+
+    "TASK-3" is taken as is. Numbers after "task" or "#", as in "Tasks 1 and 2" or
+    "#4", and a text that is just a list of numbers, like "1, 3", refer to a task's
+    position in the list they were written for, whose first task became
+    TASK-`offset + 1`. Other numbers, as in "needs 2 engineers", are left alone.
+    """
+    if not text or text.strip().lower() == "none":
+        return []
+    ids = [f"TASK-{n}" for n in _TASK_ID.findall(text)]
+    rest = _TASK_ID.sub(" ", text)
+    only_numbers = _ONLY_NUMBERS.fullmatch(rest)
+    lists = [only_numbers[1]] if only_numbers else _TASK_NUMBERS.findall(rest)
+    ids += [
+        f"TASK-{offset + int(n)}" for numbers in lists for n in _NUMBER.findall(numbers)
+    ]
+    return list(dict.fromkeys(ids))
+
+
+def task_points(task: dict) -> float:
+    """The expected story points of a task, from its complexity."""
+    return COMPLEXITY_DISTRIBUTIONS[task_complexity(task)][0]
+
+
+class TaskGraph:
+    """A DAG of tasks, with its topological order and schedule updated on every change.
+
+    Edges are added with the Pearce-Kelly algorithm, which only reorders the tasks
+    between the two endpoints, and finds cycles on the way. Earliest finish times (in
+    story points of remaining work) and the tasks ready to start are updated by
+    propagating from the tasks that changed, so none of the queries recompute the
+    whole graph.
+    """
+
+    def __init__(self):
+        self.order: dict[str, int] = {}
+        self.succ: dict[str, set[str]] = {}
+        self.pred: dict[str, set[str]] = {}
+        self.points: dict[str, float] = {}
+        self.done: dict[str, bool] = {}
+        # remaining work on the longest chain ending with each task, inclusive
+        self.finish: dict[str, float] = {}
+        # open predecessors per task
+        self.blockers: dict[str, int] = {}
+        self.ready: set[str] = set()
+        # dependencies that were skipped because they'd form a cycle
+        self.rejected: set[tuple[str, str]] = set()
+        self._next_order = 0
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.order
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def add_task(self, task_id: str, points: float = 1.0, done: bool = False) -> None:
+        if task_id in self.order:
+            return
+        self.order[task_id] = self._next_order
+        self._next_order += 1
+        self.succ[task_id] = set()
+        self.pred[task_id] = set()
+        self.points[task_id] = points
+        self.done[task_id] = done
+        self.finish[task_id] = self._cost(task_id)
+        self.blockers[task_id] = 0
+        if not done:
+            self.ready.add(task_id)
+
+    def add_dependency(self, task_id: str, depends_on: str) -> None:
+        """Makes `task_id` wait for `depends_on`. Raises CycleError instead of adding a cycle."""
+        u, v = depends_on, task_id
+        if v in self.succ[u]:
+            return
+        if u == v:
+            raise CycleError(f"{task_id} can't depend on itself")
+
+        lower, upper = self.order[v], self.order[u]
+        if lower < upper:
+            # v is ordered before u; reorder the tasks in between, unless v reaches u
+            forward = self._search(v, self.succ, lambda n: self.order[n] <= upper)
+            if u in forward:
+                raise CycleError(f"{depends_on} already depends on {task_id}")
+            backward = self._search(u, self.pred, lambda n: self.order[n] >= lower)
+            self._reorder(backward, forward)
+
+        self.succ[u].add(v)
+        self.pred[v].add(u)
+        if not self.done[u]:
+            self.blockers[v] += 1
+            self.ready.discard(v)
+        self._propagate([v])
+
+    def creates_cycle(self, task_id: str, depends_on: str) -> bool:
+        """Whether `task_id` depending on `depends_on` would form a cycle."""
+        if task_id == depends_on:
+            return True
+        upper = self.order[depends_on]
+        if self.order[task_id] > upper:
+            return False
+        return depends_on in self._search(
+            task_id, self.succ, lambda n: self.order[n] <= upper
+        )
+
+    def set_done(self, task_id: str, done: bool) -> None:
+        if self.done[task_id] == done:
+            return
+        self.done[task_id] = done
+        for s in self.succ[task_id]:
+            self.blockers[s] += -1 if done else 1
+            self._update_ready(s)
+        self._update_ready(task_id)
+        self._propagate([task_id])
+
+    def set_points(self, task_id: str, points: float) -> None:
+        if self.points[task_id] != points:
+            self.points[task_id] = points
+            self._propagate([task_id])
+
+    def topological_order(self) -> list[str]:
+        return sorted(self.order, key=self.order.__getitem__)
+
+    def ready_tasks(self) -> list[str]:
+        """Open tasks whose dependencies are all done, in topological order."""
+        return sorted(self.ready, key=self.order.__getitem__)
+
+    def critical_path_length(self) -> float:
+        """Story points of remaining work on the longest dependency chain."""
+        return max(self.finish.values(), default=0.0)
+
+    def critical_path(self) -> list[str]:
+        """The open tasks on the longest dependency chain, first to last."""
+        if not self.finish:
+            return []
+        task_id = max(self.finish, key=self.finish.__getitem__)
+        path = []
+        while task_id is not None:
+            if not self.done[task_id]:
+                path.append(task_id)
+            task_id = max(self.pred[task_id], key=self.finish.__getitem__, default=None)
+        return path[::-1]
+
+    def _cost(self, task_id: str) -> float:
+        return 0.0 if self.done[task_id] else self.points[task_id]
+
+    def _update_ready(self, task_id: str) -> None:
+        if not self.done[task_id] and self.blockers[task_id] == 0:
+            self.ready.add(task_id)
+        else:
+            self.ready.discard(task_id)
+
+    def _search(
+        self, start: str, edges: dict[str, set[str]], within: Callable[[str], bool]
+    ) -> set[str]:
+        seen = {start}
+        stack = [start]
+        while stack:
+            for n in edges[stack.pop()]:
+                if n not in seen and within(n):
+                    seen.add(n)
+                    stack.append(n)
+        return seen
+
+    def _reorder(self, backward: set[str], forward: set[str]) -> None:
+        # the same order slots, given to u's ancestors first and then v's descendants
+        tasks = sorted(backward, key=self.order.__getitem__) + sorted(
+            forward, key=self.order.__getitem__
+        )
+        slots = sorted(self.order[n] for n in tasks)
+        for task_id, slot in zip(tasks, slots):
+            self.order[task_id] = slot
+
+    def _propagate(self, changed: Iterable[str]) -> None:
+        # recompute finish times in topological order, stopping where nothing changes
+        changed = set(changed)
+        heap = [(self.order[n], n) for n in changed]
+        heapq.heapify(heap)
+        seen = set()
+        while heap:
+            _, n = heapq.heappop(heap)
+            if n in seen:
+                continue
+            seen.add(n)
+            finish = self._cost(n) + max(
+                (self.finish[p] for p in self.pred[n]), default=0.0
+            )
+            if finish != self.finish[n] or n in changed:
+                self.finish[n] = finish
+                for s in self.succ[n]:
+                    heapq.heappush(heap, (self.order[s], s))
+
+    def sync(self, tasks: list[dict]) -> bool:
+        """Brings the graph up to date with an epic's task list.
+
+        New tasks, dependencies, statuses and complexities are applied incrementally.
+        Returns False if tasks or dependencies were removed, which needs a new graph.
+        """
+        if len(tasks) < len(self.order):
+            return False
+        for task in tasks:
+            task_id = task["id"]
+            if task_id in self.order:
+                self.set_points(task_id, task_points(task))
+                self.set_done(task_id, task.get("status") == "Done")
+            else:
+                self.add_task(task_id, task_points(task), task.get("status") == "Done")
+        if len(self.order) != len(tasks):
+            return False
+
+        for task in tasks:
+            task_id = task["id"]
+            depends_on = [d for d in task.get("depends_on", []) if d in self.order]
+            if not self.pred[task_id] <= set(depends_on):
+                return False
+            for dependency in depends_on:
+                if (task_id, dependency) in self.rejected:
+                    continue
+                try:
+                    self.add_dependency(task_id, dependency)
+                except CycleError:
+                    self.rejected.add((task_id, dependency))
+        return True
+
+
+# graphs are rebuilt from the epics in the user state, once per store and epic
+_graphs: weakref.WeakKeyDictionary[
+    UserStateStore, dict[str, tuple[int, TaskGraph]]
+] = weakref.WeakKeyDictionary()
+
+
+def epic_graph(store: UserStateStore, epic: dict) -> TaskGraph:
+    """The task graph of an epic in `store`, synced with the latest writes to the epics."""
+    version = store.version_of("epics")
+    graphs = _graphs.setdefault(store, {})
+    cached = graphs.get(epic["id"])
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    graph = cached[1] if cached is not None else TaskGraph()
+    if not graph.sync(epic["tasks"]):
+        graph = TaskGraph()
+        graph.sync(epic["tasks"])
+    graphs[epic["id"]] = (version, graph)
+    return graph
@@ -8,17 +8,39 @@ from .list_epics import list_epics
 from .add_task import add_task_to_epic
 from .update_status import update_epic_status
 from .estimate import estimate_epic
+from .estimate_backlog import estimate_backlog
 from .deep_thinking import deep_thinking_epic_definition
 from .convert_analysis import convert_deep_analysis_to_tasks
+from .dependencies import add_task_dependency, get_ready_tasks, plan_epic_tasks
+from .import_backlog import import_backlog
+
+def epic_ids(user_state: dict, tool_kwargs: dict) -> list[str]:
+    """Ids of the existing epics."""
+    return [epic["id"] for epic in user_state.get("epics") or []]
+
+def task_ids(user_state: dict, tool_kwargs: dict) -> list[str]:
+    """Ids of the tasks of the epic the call is about."""
+    for epic in user_state.get("epics") or []:
+        if epic["id"] == tool_kwargs.get("epic_id"):
+            return [task["id"] for task in epic["tasks"]]
+    return []
+
+# near misses like "epic 3" or "task-02" are repaired to the ids that exist
+ID_CHOICES = {"epic_id": epic_ids, "task_id": task_ids, "depends_on_task_id": task_ids}
 
 def get_epic_redaction_tools() -> list[BaseTool]:
     """Return tools for the Epic Redaction Agent."""
     return [
         FunctionToolWithContext.from_defaults(async_fn=create_epic),
         FunctionToolWithContext.from_defaults(async_fn=list_epics),
-        FunctionToolWithContext.from_defaults(async_fn=add_task_to_epic),
-        FunctionToolWithContext.from_defaults(async_fn=update_epic_status),
-        FunctionToolWithContext.from_defaults(async_fn=estimate_epic),
+        FunctionToolWithContext.from_defaults(async_fn=add_task_to_epic, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=update_epic_status, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=estimate_epic, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=estimate_backlog),
         FunctionToolWithContext.from_defaults(async_fn=deep_thinking_epic_definition),
-        FunctionToolWithContext.from_defaults(async_fn=convert_deep_analysis_to_tasks)
+        FunctionToolWithContext.from_defaults(async_fn=convert_deep_analysis_to_tasks, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=add_task_dependency, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=plan_epic_tasks, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=get_ready_tasks, argument_choices=ID_CHOICES),
+        FunctionToolWithContext.from_defaults(async_fn=import_backlog),
     ]
@@ -1,6 +1,7 @@
 """Tool for adding tasks to epics."""
 
 from llama_index.core.workflow import Context
+from state_store import get_state_store
 from workflow import ProgressEvent
 
 async def add_task_to_epic(
@@ -9,19 +10,22 @@ async def add_task_to_epic(
     """Adds a task to an existing epic."""
     ctx.write_event_to_stream(ProgressEvent(msg=f"Adding task to epic {epic_id}"))
     
-    user_state = await ctx.get("user_state")
-    epics = user_state.get("epics", [])
+    store = await get_state_store(ctx)
+    if not any(epic["id"] == epic_id for epic in store.get("epics", [])):
+        return f"Epic with ID {epic_id} not found."
     
-    for epic in epics:
-        if epic["id"] == epic_id:
-            task_id = f"TASK-{len(epic['tasks']) + 1}"
-            task = {
-                "id": task_id,
-                "description": task_description,
-                "status": "To Do"
-            }
-            epic["tasks"].append(task)
-            await ctx.set("user_state", user_state)
-            return f"Added task '{task_description}' to epic {epic_id} with ID {task_id}"
+    task_id = None
+
+    def add_task(epic: dict) -> dict:
+        nonlocal task_id
+        task_id = f"TASK-{len(epic['tasks']) + 1}"
+        task = {
+            "id": task_id,
+            "description": task_description,
+            "status": "To Do"
+        }
+        epic["tasks"].append(task)
+        return epic
     
-    return f"Epic with ID {epic_id} not found."
+    await store.update_item("epics", epic_id, add_task)
+    return f"Added task '{task_description}' to epic {epic_id} with ID {task_id}"
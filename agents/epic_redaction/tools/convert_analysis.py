@@ -2,8 +2,9 @@
 
 from llama_index.core.workflow import Context
 from workflow import ProgressEvent
-from llama_index.llms.azure_openai import AzureOpenAI
-import os
+from llms import DEEP_THINKING_MODEL
+from state_store import get_state_store
+from ..task_graph import parse_dependencies
 
 async def convert_deep_analysis_to_tasks(
         ctx: Context,
@@ -16,67 +17,81 @@ async def convert_deep_analysis_to_tasks(
         """
         ctx.write_event_to_stream(ProgressEvent(msg=f"Converting deep analysis to tasks for epic {epic_id}"))
         
-        user_state = await ctx.get("user_state")
-        tasks_added = 0
+        store = await get_state_store(ctx)
+        epic = next(
+            (
+                e
+                for e in store.get("epics", [])
+                if e["id"] == epic_id and "deep_analysis" in e
+            ),
+            None,
+        )
+        if epic is None:
+            return f"Epic with ID {epic_id} not found or has no deep analysis"
         
-        for epic in user_state.get("epics", []):
-            if epic["id"] == epic_id and "deep_analysis" in epic:
-                # Use the o1-mini model to extract tasksç
-                print("Using o1-mini model to extract tasks")
-                deep_thinking_llm = AzureOpenAI(
-                    engine=os.getenv("AZURE_OPENAI_O1_MINI_ENGINE"),
-                    temperature=float(os.getenv("AZURE_OPENAI_O1_MINI_TEMPERATURE", "0.2")),
-                    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                    api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-                )
-                
-                task_extraction_prompt = f"""
-                Given this deep analysis of an epic:
-                
-                {epic['deep_analysis']}
-                
-                Extract all specific tasks that should be created, formatted as a numbered list.
-                Each task should have:
-                1. A clear, concise description
-                2. An estimated complexity (Low, Medium, High)
-                3. Any dependencies on other tasks
-                
-                Format each task as:
-                1. Description: [task description]
-                   Complexity: [complexity]
-                   Dependencies: [dependencies or "None"]
-                """
-                
-                response = await deep_thinking_llm.acomplete(task_extraction_prompt)
-                task_text = response.text
-                
-                # Parse the output to extract tasks
-                # This is a simplified parser - you might need more robust parsing
-                task_blocks = task_text.split("\n\n")
+        # Use the deep thinking model (o1-mini) to extract tasks
+        task_extraction_prompt = f"""
+        Given this deep analysis of an epic:
+        
+        {epic['deep_analysis']}
+        
+        Extract all specific tasks that should be created, formatted as a numbered list.
+        Each task should have:
+        1. A clear, concise description
+        2. An estimated complexity (Low, Medium, High)
+        3. Any dependencies on other tasks
+        
+        Format each task as:
+        1. Description: [task description]
+           Complexity: [complexity]
+           Dependencies: [dependencies or "None"]
+        """
+        
+        response = await DEEP_THINKING_MODEL.acomplete(
+            task_extraction_prompt,
+            default=await ctx.get("llm", default=None),
+            on_fallback=lambda msg: ctx.write_event_to_stream(ProgressEvent(msg=msg)),
+        )
+        task_text = response.text
+        
+        # Parse the output to extract tasks
+        # This is a simplified parser - you might need more robust parsing
+        task_blocks = task_text.split("\n\n")
+        new_tasks = []
+        
+        for block in task_blocks:
+            if "Description:" in block:
+                description = block.split("Description:")[1].split("Complexity:")[0].strip()
+                complexity_part = block.split("Complexity:")[1].split("Dependencies:")[0].strip() if "Dependencies:" in block else block.split("Complexity:")[1].strip()
                 
-                for block in task_blocks:
-                    if "Description:" in block:
-                        description = block.split("Description:")[1].split("Complexity:")[0].strip()
-                        complexity_part = block.split("Complexity:")[1].split("Dependencies:")[0].strip() if "Dependencies:" in block else block.split("Complexity:")[1].strip()
-                        
-                        task_id = f"TASK-{len(epic['tasks']) + 1}"
-                        task = {
-                            "id": task_id,
-                            "description": description,
-                            "complexity": complexity_part,
-                            "status": "To Do"
-                        }
-                        
-                        if "Dependencies:" in block:
-                            dependencies = block.split("Dependencies:")[1].strip()
-                            if dependencies and dependencies.lower() != "none":
-                                task["dependencies"] = dependencies
-                        
-                        epic["tasks"].append(task)
-                        tasks_added += 1
+                task = {
+                    "description": description,
+                    "complexity": complexity_part,
+                    "status": "To Do"
+                }
                 
-                await ctx.set("user_state", user_state)
-                return f"Added {tasks_added} structured tasks to epic {epic_id} from deep analysis"
+                if "Dependencies:" in block:
+                    dependencies = block.split("Dependencies:")[1].strip()
+                    if dependencies and dependencies.lower() != "none":
+                        task["dependencies"] = dependencies
                 
-        return f"Epic with ID {epic_id} not found or has no deep analysis"
\ No newline at end of file
+                new_tasks.append(task)
+        
+        def add_tasks(e: dict) -> dict:
+            # ids are assigned here, against the latest task list
+            # the analysis numbers its tasks from 1, after the ones already there
+            offset = len(e["tasks"])
+            for task in new_tasks:
+                task_id = f"TASK-{len(e['tasks']) + 1}"
+                task = {"id": task_id, **task}
+                if "dependencies" in task:
+                    task["depends_on"] = [
+                        d
+                        for d in parse_dependencies(task["dependencies"], offset)
+                        if d != task_id
+                    ]
+                e["tasks"].append(task)
+            return e
+        
+        await store.update_item("epics", epic_id, add_tasks)
+        return f"Added {len(new_tasks)} structured tasks to epic {epic_id} from deep analysis"
@@ -1,38 +1,39 @@
 """Tool for creating epics."""
 
+from typing import Literal
+
 from llama_index.core.workflow import Context
+from state_store import get_state_store
 from workflow import ProgressEvent
 
 async def create_epic(
     ctx: Context, 
     title: str, 
     description: str, 
-    priority: str = "Medium",
+    priority: Literal["Low", "Medium", "High", "Critical"] = "Medium",
     estimated_size: str = "Unknown"
 ) -> str:
     """Creates a new software epic with the given details."""
     ctx.write_event_to_stream(ProgressEvent(msg=f"Creating new epic: {title}"))
     
     # In a real implementation, this would store the epic in a database
-    user_state = await ctx.get("user_state")
+    store = await get_state_store(ctx)
+    epic_id = None
     
-    # Initialize epics list if it doesn't exist
-    if "epics" not in user_state:
-        user_state["epics"] = []
-        
-    # Create a new epic with a unique ID
-    epic_id = f"EPIC-{len(user_state['epics']) + 1}"
-    epic = {
-        "id": epic_id,
-        "title": title,
-        "description": description,
-        "priority": priority,
-        "estimated_size": estimated_size,
-        "status": "Draft",
-        "tasks": []
-    }
+    def new_epic(epics: list) -> dict:
+        nonlocal epic_id
+        # Create a new epic with a unique ID
+        epic_id = f"EPIC-{len(epics) + 1}"
+        return {
+            "id": epic_id,
+            "title": title,
+            "description": description,
+            "priority": priority,
+            "estimated_size": estimated_size,
+            "status": "Draft",
+            "tasks": []
+        }
     
-    user_state["epics"].append(epic)
-    await ctx.set("user_state", user_state)
+    await store.append("epics", new_epic)
     
     return f"Created new epic '{title}' with ID {epic_id}"
@@ -1,39 +1,23 @@
 """Tool for deep thinking about epic definitions."""
 
+from typing import Callable
+
+from llama_index.core.llms import LLM
 from llama_index.core.workflow import Context
-from llama_index.llms.azure_openai import AzureOpenAI
-import os
+from llms import DEEP_THINKING_MODEL
+from state_store import get_state_store
 from workflow import ProgressEvent
 
-async def deep_thinking_epic_definition(
-    ctx: Context,
+async def analyze_epic(
     epic_title: str,
     business_context: str,
     user_needs: str = "",
     constraints: str = "",
-    success_criteria: str = ""
+    success_criteria: str = "",
+    default: LLM | None = None,
+    on_fallback: Callable[[str], None] | None = None,
 ) -> str:
-    """Performs deep analysis of an epic to define comprehensive tasks and requirements.
-    
-    Args:
-        epic_title: The title of the epic to analyze
-        business_context: The business context and goals for this epic
-        user_needs: The user needs this epic addresses (optional)
-        constraints: Technical or business constraints to consider (optional)
-        success_criteria: How success will be measured (optional)
-    """
-    ctx.write_event_to_stream(ProgressEvent(msg=f"Performing deep thinking for epic: {epic_title}"))
-    
-    # First, configure and use the o1-mini model for deep thinking
-    deep_thinking_llm = AzureOpenAI(
-        engine=os.getenv("AZURE_OPENAI_O1_MINI_ENGINE"),
-        temperature=float(os.getenv("AZURE_OPENAI_O1_MINI_TEMPERATURE", 0.2)),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        max_tokens=int(os.getenv("AZURE_OPENAI_O1_MINI_MAX_TOKENS", 4096))
-    )
-    
+    """Asks the deep thinking model for an analysis of an epic, and returns its text."""
     # Prepare a comprehensive prompt for deep thinking
     deep_thinking_prompt = f"""
     # Deep Analysis of Epic: {epic_title}
@@ -67,59 +51,81 @@ async def deep_thinking_epic_definition(
     - Success Metrics
     """
     
-    # Call the deep thinking model
-    response = await deep_thinking_llm.acomplete(deep_thinking_prompt)
-    deep_analysis = response.text
+    # Call the deep thinking model (o1-mini when configured, pooled and with fallback)
+    response = await DEEP_THINKING_MODEL.acomplete(
+        deep_thinking_prompt, default=default, on_fallback=on_fallback
+    )
+    return response.text
+
+def extract_tasks(deep_analysis: str) -> list[str]:
+    """The task descriptions listed under "Key Tasks" in a deep analysis."""
+    # This is a simplified implementation - in a real system, you might want to parse
+    # the deep analysis more thoroughly
+    tasks_section = deep_analysis.split("Key Tasks")[1].split("Dependencies")[0] if "Key Tasks" in deep_analysis and "Dependencies" in deep_analysis else ""
+    tasks = [line.strip() for line in tasks_section.split("\n") if line.strip() and not line.strip().startswith('-')]
+    return [task_desc for task_desc in tasks if len(task_desc) > 5]  # Simple validation
+
+async def deep_thinking_epic_definition(
+    ctx: Context,
+    epic_title: str,
+    business_context: str,
+    user_needs: str = "",
+    constraints: str = "",
+    success_criteria: str = ""
+) -> str:
+    """Performs deep analysis of an epic to define comprehensive tasks and requirements.
     
-    # Store the deep analysis in the user state
-    user_state = await ctx.get("user_state")
+    Args:
+        epic_title: The title of the epic to analyze
+        business_context: The business context and goals for this epic
+        user_needs: The user needs this epic addresses (optional)
+        constraints: Technical or business constraints to consider (optional)
+        success_criteria: How success will be measured (optional)
+    """
+    ctx.write_event_to_stream(ProgressEvent(msg=f"Performing deep thinking for epic: {epic_title}"))
     
-    # Find the epic or create a new one
-    epic_found = False
-    for epic in user_state.get("epics", []):
-        if epic["title"] == epic_title:
-            epic["deep_analysis"] = deep_analysis
-            epic_found = True
-            break
+    deep_analysis = await analyze_epic(
+        epic_title,
+        business_context,
+        user_needs,
+        constraints,
+        success_criteria,
+        default=await ctx.get("llm", default=None),
+        on_fallback=lambda msg: ctx.write_event_to_stream(ProgressEvent(msg=msg)),
+    )
+    tasks = extract_tasks(deep_analysis)
     
-    if not epic_found:
+    def add_analysis(epic: dict) -> dict:
+        epic["deep_analysis"] = deep_analysis
+        
+        # Add extracted tasks to the epic
+        for task_desc in tasks:
+            task_id = f"TASK-{len(epic['tasks']) + 1}"
+            task = {
+                "id": task_id,
+                "description": task_desc,
+                "status": "To Do"
+            }
+            epic["tasks"].append(task)
+        return epic
+    
+    def new_epic(epics: list) -> dict:
         # Create a new epic with the deep analysis
-        epic_id = f"EPIC-{len(user_state.get('epics', [])) + 1}"
-        epic = {
-            "id": epic_id,
+        return add_analysis({
+            "id": f"EPIC-{len(epics) + 1}",
             "title": epic_title,
             "description": business_context,
-            "deep_analysis": deep_analysis,
             "priority": "Medium",  # Default values
             "status": "Draft",
             "tasks": []
-        }
-        
-        if "epics" not in user_state:
-            user_state["epics"] = []
-        user_state["epics"].append(epic)
-    
-    await ctx.set("user_state", user_state)
-    
-    # Extract tasks from the deep analysis to add as actual tasks
-    # This is a simplified implementation - in a real system, you might want to parse
-    # the deep analysis more thoroughly
-    tasks_section = deep_analysis.split("Key Tasks")[1].split("Dependencies")[0] if "Key Tasks" in deep_analysis and "Dependencies" in deep_analysis else ""
-    tasks = [line.strip() for line in tasks_section.split("\n") if line.strip() and not line.strip().startswith('-')]
-    
-    # Add extracted tasks to the epic
-    for task_desc in tasks:
-        if task_desc and len(task_desc) > 5:  # Simple validation
-            for epic in user_state.get("epics", []):
-                if epic["title"] == epic_title:
-                    task_id = f"TASK-{len(epic['tasks']) + 1}"
-                    task = {
-                        "id": task_id,
-                        "description": task_desc,
-                        "status": "To Do"
-                    }
-                    epic["tasks"].append(task)
-    
-    await ctx.set("user_state", user_state)
+        })
+    
+    # Store the deep analysis and its tasks on the epic, or on a new one, in one write
+    store = await get_state_store(ctx)
+    epic = next((e for e in store.get("epics") or [] if e["title"] == epic_title), None)
+    if epic is not None:
+        await store.update_item("epics", epic["id"], add_analysis)
+    else:
+        await store.append("epics", new_epic)
     
     return f"Completed deep thinking analysis for epic '{epic_title}'. Generated {len(tasks)} tasks from the analysis."
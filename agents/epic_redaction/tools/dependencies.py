@@ -0,0 +1,119 @@
+"""Tools for task dependencies within an epic."""
+
+from llama_index.core.workflow import Context
+from state_store import get_state_store
+from workflow import ProgressEvent
+from ..task_graph import epic_graph
+
+# tasks listed in full before a listing is shortened
+MAX_LISTED_TASKS = 50
+
+
+def _find_epic(epics: list, epic_id: str) -> dict | None:
+    return next((e for e in epics if e["id"] == epic_id), None)
+
+
+def _listing(task_ids: list[str], tasks_by_id: dict[str, dict]) -> str:
+    lines = [
+        f"- {task_id}: {tasks_by_id[task_id]['description']} ({tasks_by_id[task_id]['status']})"
+        for task_id in task_ids[:MAX_LISTED_TASKS]
+    ]
+    if len(task_ids) > MAX_LISTED_TASKS:
+        lines.append(f"... and {len(task_ids) - MAX_LISTED_TASKS} more")
+    return "\n".join(lines)
+
+
+async def add_task_dependency(
+    ctx: Context, epic_id: str, task_id: str, depends_on_task_id: str
+) -> str:
+    """Records that a task can't start until another task of the same epic is done.
+
+    Args:
+        epic_id: The ID of the epic both tasks belong to.
+        task_id: The task that has to wait.
+        depends_on_task_id: The task it waits for.
+    """
+    ctx.write_event_to_stream(
+        ProgressEvent(
+            msg=f"Making {task_id} depend on {depends_on_task_id} in epic {epic_id}"
+        )
+    )
+
+    store = await get_state_store(ctx)
+    epic = _find_epic(store.get("epics", []), epic_id)
+    if epic is None:
+        return f"Epic with ID {epic_id} not found."
+
+    graph = epic_graph(store, epic)
+    for missing in (task_id, depends_on_task_id):
+        if missing not in graph:
+            return f"Task with ID {missing} not found in epic {epic_id}."
+    if graph.creates_cycle(task_id, depends_on_task_id):
+        return f"Can't add the dependency: {depends_on_task_id} already depends on {task_id}, directly or indirectly."
+
+    def add_dependency(epic: dict) -> dict:
+        for task in epic["tasks"]:
+            if task["id"] == task_id:
+                depends_on = task.setdefault("depends_on", [])
+                if depends_on_task_id not in depends_on:
+                    depends_on.append(depends_on_task_id)
+        return epic
+
+    await store.update_item("epics", epic_id, add_dependency)
+    return f"{task_id} now depends on {depends_on_task_id} in epic {epic_id}"
+
+
+async def plan_epic_tasks(ctx: Context, epic_id: str) -> str:
+    """Orders an epic's tasks by their dependencies and finds its critical path.
+
+    Args:
+        epic_id: The ID of the epic to plan.
+    """
+    ctx.write_event_to_stream(
+        ProgressEvent(msg=f"Planning the tasks of epic {epic_id}")
+    )
+
+    store = await get_state_store(ctx)
+    epic = _find_epic(store.get("epics", []), epic_id)
+    if epic is None:
+        return f"Epic with ID {epic_id} not found."
+    if not epic["tasks"]:
+        return f"Epic {epic_id} has no tasks yet."
+
+    graph = epic_graph(store, epic)
+    tasks_by_id = {task["id"]: task for task in epic["tasks"]}
+    critical_path = graph.critical_path()
+
+    result = (
+        f"Task order for epic {epic_id}:\n{_listing(graph.topological_order(), tasks_by_id)}\n\n"
+        f"Critical path ({graph.critical_path_length():g} story points of remaining work): "
+        f"{' -> '.join(critical_path) or 'nothing left'}\n\n"
+        f"Ready to start:\n{_listing(graph.ready_tasks(), tasks_by_id) or 'none'}"
+    )
+    if graph.rejected:
+        ignored = ", ".join(f"{a} on {b}" for a, b in sorted(graph.rejected))
+        result += f"\n\nIgnored dependencies that would form a cycle: {ignored}"
+    return result
+
+
+async def get_ready_tasks(ctx: Context, epic_id: str) -> str:
+    """Lists the open tasks of an epic whose dependencies are all done.
+
+    Args:
+        epic_id: The ID of the epic.
+    """
+    ctx.write_event_to_stream(
+        ProgressEvent(msg=f"Finding tasks ready to start in epic {epic_id}")
+    )
+
+    store = await get_state_store(ctx)
+    epic = _find_epic(store.get("epics", []), epic_id)
+    if epic is None:
+        return f"Epic with ID {epic_id} not found."
+
+    graph = epic_graph(store, epic)
+    ready = graph.ready_tasks()
+    if not ready:
+        return f"No tasks of epic {epic_id} can start right now."
+    tasks_by_id = {task["id"]: task for task in epic["tasks"]}
+    return f"Tasks of epic {epic_id} ready to start:\n{_listing(ready, tasks_by_id)}"
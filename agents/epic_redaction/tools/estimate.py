@@ -1,6 +1,7 @@
 """Tool for estimating epic size."""
 
 from llama_index.core.workflow import Context
+from state_store import get_state_store
 from workflow import ProgressEvent
 
 async def estimate_epic(
@@ -20,8 +21,8 @@ async def estimate_epic(
     """
     ctx.write_event_to_stream(ProgressEvent(msg=f"Estimating epic {epic_id}"))
     
-    user_state = await ctx.get("user_state")
-    epics = user_state.get("epics", [])
+    store = await get_state_store(ctx)
+    epics = store.get("epics", [])
     
     # Find the epic
     epic = None
@@ -84,7 +85,12 @@ async def estimate_epic(
         unit = "story points"
     
     # Store the estimate in the epic
-    epic["estimated_size"] = f"{final_estimate} {unit} (range: {low_estimate}-{high_estimate})"
-    await ctx.set("user_state", user_state)
+    estimated_size = f"{final_estimate} {unit} (range: {low_estimate}-{high_estimate})"
+
+    def set_estimate(epic: dict) -> dict:
+        epic["estimated_size"] = estimated_size
+        return epic
+
+    await store.update_item("epics", epic_id, set_estimate)
     
     return f"Epic '{epic['title']}' estimated at {final_estimate} {unit} with a range of {low_estimate}-{high_estimate} {unit} ({uncertainty_level} uncertainty)"
@@ -0,0 +1,197 @@
+"""Tool for forecasting the whole backlog with a Monte Carlo simulation."""
+
+import hashlib
+import weakref
+from collections import Counter, OrderedDict
+
+import numpy as np
+from llama_index.core.workflow import Context
+from state_store import UserStateStore, get_state_store
+from workflow import ProgressEvent
+
+# story points per task, as (mean, coefficient of variation), by task complexity
+COMPLEXITY_DISTRIBUTIONS = {
+    "low": (2.0, 0.5),
+    "medium": (5.0, 0.6),
+    "high": (8.0, 0.8),
+    "unknown": (5.0, 0.9),
+}
+# epics without tasks yet are sized from their description, like estimate_epic does
+UNSCOPED_CV = 1.0
+DEFAULT_SAMPLES = 2000
+# simulated epics kept around, so unchanged epics aren't simulated again
+MAX_CACHED_EPICS = 5000
+# draws per batch, to bound memory on large backlogs
+MAX_DRAWS_PER_BATCH = 2_000_000
+
+# epic key -> samples of its remaining effort
+_samples_cache: OrderedDict[tuple, np.ndarray] = OrderedDict()
+# the last forecast of each store: its keys, their samples and the total, updated
+# with only what changed since. The samples are kept because the cache may have
+# evicted (and re-simulated) them by then.
+_last_forecasts: weakref.WeakKeyDictionary[
+    UserStateStore, tuple[Counter, dict[tuple, np.ndarray], np.ndarray]
+] = weakref.WeakKeyDictionary()
+
+
+def task_complexity(task: dict) -> str:
+    """A task's complexity level; the deep analysis writes e.g. "High (new integration)"."""
+    text = str(task.get("complexity", "")).strip().lower()
+    for level in ("low", "medium", "high"):
+        if text.startswith(level):
+            return level
+    return "unknown"
+
+
+def _epic_distribution(epic: dict) -> tuple[float, float] | None:
+    """(shape, scale) of a gamma for an epic's remaining effort; None if nothing is left.
+
+    Each open task is a gamma for its complexity. Their sum is approximated by one gamma
+    with the same mean and variance, so an epic costs a single draw per sample.
+    """
+    if epic.get("status") == "Done":
+        return None
+    tasks = epic.get("tasks", [])
+    if tasks:
+        counts = Counter(task_complexity(t) for t in tasks if t.get("status") != "Done")
+        moments = [
+            (count * mean, count * (cv * mean) ** 2)
+            for level, count in counts.items()
+            for mean, cv in [COMPLEXITY_DISTRIBUTIONS[level]]
+        ]
+    else:
+        mean = max(1.0, min(10.0, len(epic.get("description", "")) / 50))
+        moments = [(mean, (UNSCOPED_CV * mean) ** 2)]
+
+    mean = sum(m for m, _ in moments)
+    variance = sum(v for _, v in moments)
+    if mean <= 0:
+        return None
+    return (mean**2 / variance, variance / mean)
+
+
+def _simulate(distributions: np.ndarray, n_samples: int, seed: int) -> np.ndarray:
+    """Samples every epic at once; returns an (epics, samples) array."""
+    samples = np.empty((len(distributions), n_samples), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    step = max(1, MAX_DRAWS_PER_BATCH // n_samples)
+    for start in range(0, len(distributions), step):
+        batch = distributions[start : start + step]
+        samples[start : start + step] = rng.gamma(
+            batch[:, :1], batch[:, 1:], size=(len(batch), n_samples)
+        )
+    return samples
+
+
+def simulate_backlog(
+    epics: list[dict],
+    n_samples: int = DEFAULT_SAMPLES,
+    store: UserStateStore | None = None,
+) -> tuple[np.ndarray, int]:
+    """Samples of the backlog's total remaining effort, in story points.
+
+    Also returns how many epics had to be simulated; the rest were reused from
+    earlier calls because nothing that affects their estimate changed. Given the
+    `store` the epics come from, the total is updated from its last forecast.
+    """
+    keys = Counter()
+    for epic in epics:
+        distribution = _epic_distribution(epic)
+        if distribution is not None:
+            keys[(epic.get("id"), *distribution, n_samples)] += 1
+
+    last = _last_forecasts.get(store) if store is not None else None
+    if last is not None and len(last[2]) != n_samples:
+        last = None
+    # epics in the last forecast keep the samples already in its total
+    samples = {key: last[1][key] for key in keys if key in last[1]} if last else {}
+
+    missing = [key for key in keys if key not in samples and key not in _samples_cache]
+    if missing:
+        # seeded from what is simulated, so the same backlog gives the same forecast
+        seed = int.from_bytes(
+            hashlib.sha256(repr(missing).encode()).digest()[:8], "little"
+        )
+        simulated = _simulate(
+            np.array([key[1:3] for key in missing], dtype=float).reshape(-1, 2),
+            n_samples,
+            seed,
+        )
+        for key, key_samples in zip(missing, simulated):
+            _samples_cache[key] = key_samples
+    for key in keys:
+        if key not in samples:
+            samples[key] = _samples_cache[key]
+
+    # start from the last total if only a few epics changed since
+    total = np.zeros(n_samples)
+    changes = keys
+    if last is not None:
+        last_keys, last_samples, last_total = last
+        removed, added = last_keys - keys, keys - last_keys
+        if sum(removed.values()) + sum(added.values()) < sum(keys.values()):
+            total = last_total.copy()
+            changes = added
+            for key, count in removed.items():
+                total -= count * last_samples[key]
+
+    for key, count in changes.items():
+        total += count * samples[key]
+    for key in keys:
+        if key in _samples_cache:
+            _samples_cache.move_to_end(key)
+    while len(_samples_cache) > MAX_CACHED_EPICS:
+        _samples_cache.popitem(last=False)
+
+    if store is not None:
+        _last_forecasts[store] = (keys, samples, total.copy())
+    return total, len(missing)
+
+
+async def estimate_backlog(
+    ctx: Context,
+    sprint_capacity: float = 30.0,
+    n_samples: int = DEFAULT_SAMPLES,
+) -> str:
+    """Forecasts the remaining effort of all epics together, and how many sprints it takes.
+
+    Runs a Monte Carlo simulation over every open task, sized by its complexity, and
+    reports the 50th, 80th and 95th percentiles.
+
+    Args:
+        sprint_capacity: Story points the team completes per sprint.
+        n_samples: Number of simulated outcomes.
+    """
+    ctx.write_event_to_stream(ProgressEvent(msg="Forecasting the backlog"))
+
+    store = await get_state_store(ctx)
+    epics = store.get("epics", [])
+    if not epics:
+        return "No epics found."
+    if sprint_capacity <= 0:
+        return "Sprint capacity must be positive."
+
+    total, simulated = simulate_backlog(epics, max(100, n_samples), store)
+    p50, p80, p95 = np.percentile(total, [50, 80, 95])
+    s50, s80, s95 = np.percentile(np.ceil(total / sprint_capacity), [50, 80, 95])
+    open_tasks = sum(
+        1
+        for epic in epics
+        if epic.get("status") != "Done"
+        for task in epic.get("tasks", [])
+        if task.get("status") != "Done"
+    )
+
+    ctx.write_event_to_stream(
+        ProgressEvent(
+            msg=f"Simulated {simulated} of {len(epics)} epics; reused the rest"
+        )
+    )
+    return (
+        f"Backlog forecast for {len(epics)} epics ({open_tasks} open tasks):\n"
+        f"- P50: {p50:.0f} story points\n"
+        f"- P80: {p80:.0f} story points\n"
+        f"- P95: {p95:.0f} story points\n"
+        f"Sprints needed at {sprint_capacity:g} points per sprint: "
+        f"P50 {s50:.0f}, P80 {s80:.0f}, P95 {s95:.0f}"
+    )
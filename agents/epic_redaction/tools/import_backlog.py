@@ -0,0 +1,58 @@
+"""Tool for importing an existing backlog file into the epics."""
+
+from llama_index.core.workflow import Context
+from state_store import get_state_store
+from workflow import ProgressEvent
+from ..ingest import IngestReport, deep_analysis, ingest_backlog
+
+# row errors quoted back to the agent
+MAX_ERRORS_SHOWN = 5
+
+
+async def import_backlog(
+    ctx: Context, path: str, analyze: bool = False, restart: bool = False
+) -> str:
+    """Imports epics and tasks from a JSONL or CSV backlog file, continuing where an earlier import of the same file stopped.
+
+    Args:
+        path: Path of the backlog file (.jsonl, or .csv with epic and task rows)
+        analyze: Run deep analysis on the epics the file marks with `analyze`
+        restart: Read the file from the start again; epics with a key already imported are skipped, but epics without a key and task rows are added again
+    """
+    ctx.write_event_to_stream(ProgressEvent(msg=f"Importing backlog from {path}"))
+
+    def on_progress(report: IngestReport) -> None:
+        ctx.write_event_to_stream(
+            ProgressEvent(
+                msg=f"Imported {report.rows} rows: {report.epics} epics, {report.tasks} tasks, {report.invalid} invalid"
+            )
+        )
+
+    analyze_fn = None
+    if analyze:
+        analyze_fn = deep_analysis(
+            default=await ctx.get("llm", default=None),
+            on_fallback=lambda msg: ctx.write_event_to_stream(ProgressEvent(msg=msg)),
+        )
+    store = await get_state_store(ctx)
+    try:
+        report = await ingest_backlog(
+            path, store, restart=restart, analyze=analyze_fn, on_progress=on_progress
+        )
+    except OSError as e:
+        return f"Could not read {path}: {e}"
+
+    summary = f"Imported {report.epics} epics and {report.tasks} tasks from {report.rows} rows of {path}"
+    if report.duplicates:
+        summary += f", skipping {report.duplicates} epics that were already imported"
+    if analyze:
+        summary += f". Deep analysis done for {report.analyses} epics ({report.failed_analyses} failed)"
+    if report.invalid:
+        summary += (
+            f". {report.invalid} rows were invalid and not imported:\n"
+            + "\n".join(
+                f"- line {error.line}: {error.message}"
+                for error in report.errors[:MAX_ERRORS_SHOWN]
+            )
+        )
+    return summary
@@ -1,14 +1,15 @@
 """Tool for listing epics."""
 
 from llama_index.core.workflow import Context
+from state_store import get_state_store
 from workflow import ProgressEvent
 
 async def list_epics(ctx: Context) -> str:
     """Lists all available epics."""
     ctx.write_event_to_stream(ProgressEvent(msg="Listing all epics"))
     
-    user_state = await ctx.get("user_state")
-    epics = user_state.get("epics", [])
+    store = await get_state_store(ctx)
+    epics = store.get("epics", [])
     
     if not epics:
         return "No epics found."
@@ -1,25 +1,44 @@
 """Tool for updating epic status."""
 
+from typing import Literal
+
 from llama_index.core.workflow import Context
+from state_store import get_state_store
 from workflow import ProgressEvent
 
 async def update_epic_status(
-    ctx: Context, epic_id: str, new_status: str
+    ctx: Context,
+    epic_id: str,
+    new_status: Literal["Draft", "Ready", "To Do", "In Progress", "Review", "Done"],
+    task_id: str | None = None,
 ) -> str:
-    """Updates the status of an epic."""
-    ctx.write_event_to_stream(ProgressEvent(msg=f"Updating status of epic {epic_id} to {new_status}"))
+    """Updates the status of an epic, or of one of its tasks when a task ID is given."""
+    target = f"task {task_id} of epic {epic_id}" if task_id else f"epic {epic_id}"
+    ctx.write_event_to_stream(ProgressEvent(msg=f"Updating status of {target} to {new_status}"))
     
-    user_state = await ctx.get("user_state")
-    epics = user_state.get("epics", [])
+    store = await get_state_store(ctx)
     
-    valid_statuses = ["Draft", "Ready", "In Progress", "Review", "Done"]
+    valid_statuses = (
+        ["To Do", "In Progress", "Done"]
+        if task_id
+        else ["Draft", "Ready", "In Progress", "Review", "Done"]
+    )
     if new_status not in valid_statuses:
         return f"Invalid status. Please choose from: {', '.join(valid_statuses)}"
     
-    for epic in epics:
-        if epic["id"] == epic_id:
+    epic = next((e for e in store.get("epics", []) if e["id"] == epic_id), None)
+    if epic is None:
+        return f"Epic with ID {epic_id} not found."
+    if task_id and not any(task["id"] == task_id for task in epic["tasks"]):
+        return f"Task with ID {task_id} not found in epic {epic_id}."
+    
+    def set_status(epic: dict) -> dict:
+        if task_id is None:
             epic["status"] = new_status
-            await ctx.set("user_state", user_state)
-            return f"Updated status of epic {epic_id} to {new_status}"
+        for task in epic["tasks"]:
+            if task["id"] == task_id:
+                task["status"] = new_status
+        return epic
     
-    return f"Epic with ID {epic_id} not found."
+    await store.update_item("epics", epic_id, set_status)
+    return f"Updated status of {target} to {new_status}"
@@ -3,6 +3,7 @@
 from llama_index.core.workflow import Context
 from llama_index.core.tools import BaseTool
 
+from llms import FAST_MODEL
 from workflow import AgentConfig, ProgressEvent
 from utils import FunctionToolWithContext
 
@@ -37,4 +38,5 @@ so you can help them look it up by the name of the company.
 You can only look up stock symbols given to you by the search_for_stock_symbol tool, don't make them up. Trust the output of the search_for_stock_symbol tool even if it doesn't make sense to you.
         """,
         tools=get_stock_lookup_tools(),
+        llm=FAST_MODEL,
     )
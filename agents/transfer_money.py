@@ -3,64 +3,50 @@
 from llama_index.core.workflow import Context
 from llama_index.core.tools import BaseTool
 
+from approvals import ApprovalPolicy, ApprovalRule, all_of, kwarg_between, state_has
+from llms import STANDARD_MODEL
+from preconditions import Precondition
+from state_store import get_state_store
 from workflow import AgentConfig, ProgressEvent
 from utils import FunctionToolWithContext
 
 def get_transfer_money_tools() -> list[BaseTool]:
     """Return tools for the Transfer Money Agent."""
-    async def is_authenticated(ctx: Context) -> bool:
-        """Checks if the user has a session token."""
-        ctx.write_event_to_stream(ProgressEvent(msg="Checking if authenticated"))
-        user_state = await ctx.get("user_state")
-        return user_state["session_token"] is not None
-
     async def transfer_money(
         ctx: Context, from_account_id: str, to_account_id: str, amount: int
     ) -> str:
         """Useful for transferring money between accounts."""
-        is_auth = await is_authenticated(ctx)
-        if not is_auth:
-            raise ValueError("User is not authenticated!")
-
+        if amount <= 0:
+            return f"Can't transfer {amount}: the amount must be positive."
         ctx.write_event_to_stream(
             ProgressEvent(
                 msg=f"Transferring {amount} from {from_account_id} to account {to_account_id}"
             )
         )
-        return f"Transferred {amount} to account {to_account_id}"
+
+        def withdraw(balance: int | None) -> int:
+            if balance is None or balance < amount:
+                raise ValueError(f"Insufficient balance to transfer {amount}")
+            return balance - amount
+
+        # checked and debited in a single update, so parallel transfers can't overdraw
+        store = await get_state_store(ctx)
+        balance = await store.update("account_balance", withdraw)
+        return f"Transferred {amount} to account {to_account_id}. Remaining balance is ${balance}"
 
     async def balance_sufficient(ctx: Context, account_id: str, amount: int) -> bool:
         """Useful for checking if an account has enough money to transfer."""
-        is_auth = await is_authenticated(ctx)
-        if not is_auth:
-            raise ValueError("User is not authenticated!")
-
+        if amount <= 0:
+            return False
         ctx.write_event_to_stream(
             ProgressEvent(msg="Checking if balance is sufficient")
         )
-        user_state = await ctx.get("user_state")
-        return user_state["account_balance"] >= amount
-
-    async def has_balance(ctx: Context) -> bool:
-        """Useful for checking if an account has a balance."""
-        is_auth = await is_authenticated(ctx)
-        if not is_auth:
-            raise ValueError("User is not authenticated!")
-
-        ctx.write_event_to_stream(
-            ProgressEvent(msg="Checking if account has a balance")
-        )
-        user_state = await ctx.get("user_state")
-        return (
-            user_state["account_balance"] is not None
-            and user_state["account_balance"] > 0
-        )
+        store = await get_state_store(ctx)
+        return store.get("account_balance", 0) >= amount
 
     return [
         FunctionToolWithContext.from_defaults(async_fn=transfer_money),
         FunctionToolWithContext.from_defaults(async_fn=balance_sufficient),
-        FunctionToolWithContext.from_defaults(async_fn=has_balance),
-        FunctionToolWithContext.from_defaults(async_fn=is_authenticated),
     ]
 
 def get_transfer_money_agent_config() -> AgentConfig:
@@ -70,9 +56,34 @@ def get_transfer_money_agent_config() -> AgentConfig:
         description="Handles money transfers between accounts",
         system_prompt="""
 You are a helpful assistant that transfers money between accounts.
-The user can only do this if they are authenticated, which you can check with the is_authenticated tool.
-If they aren't authenticated, tell them to authenticate first and call the "RequestTransfer" tool.
+The user is already authenticated and has checked their account balance when they reach you.
         """,
         tools=get_transfer_money_tools(),
+        llm=STANDARD_MODEL,
         tools_requiring_human_confirmation=["transfer_money"],
+        preconditions=[
+            Precondition(
+                key="session_token",
+                satisfied_by="Authentication Agent",
+                description="requires the user to be logged in",
+            ),
+            Precondition(
+                key="balance_checked",
+                satisfied_by="Account Balance Agent",
+                description="requires the user to check their balance first",
+            ),
+        ],
+        approval_policy=ApprovalPolicy(
+            rules=[
+                ApprovalRule(
+                    tool_name="transfer_money",
+                    decision="approve",
+                    condition=all_of(
+                        state_has("session_token"), kwarg_between("amount", 0, 100)
+                    ),
+                    reason="small transfer by an authenticated user",
+                ),
+            ],
+            timeout=120,
+        ),
     )
@@ -0,0 +1,95 @@
+"""Rule-based approval policies for tools that require human confirmation."""
+
+from datetime import datetime, time
+from typing import Any, Callable, Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# A condition receives the tool kwargs and the current user state.
+Condition = Callable[[dict, dict], bool]
+
+
+class ApprovalRule(BaseModel):
+    """Decides a tool call without asking a human, when its condition holds."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tool_name: str  # "*" matches every tool
+    decision: Literal["approve", "deny"]
+    condition: Condition | None = None
+    # shown in the progress stream, and sent back to the agent when denying
+    reason: str | None = None
+
+    def matches(self, tool_name: str, tool_kwargs: dict, user_state: dict) -> bool:
+        if self.tool_name not in ("*", tool_name):
+            return False
+        if self.condition is None:
+            return True
+        try:
+            return bool(self.condition(tool_kwargs, user_state))
+        except Exception:
+            # a condition that can't be evaluated (missing kwarg, bad type) never matches
+            return False
+
+
+class ApprovalPolicy(BaseModel):
+    """An ordered list of rules, plus how long to wait for a human when none match."""
+
+    rules: list[ApprovalRule] = Field(default_factory=list)
+    # seconds to wait for a human decision; None waits forever
+    timeout: float | None = None
+    # outcome applied to requests still pending when the timeout expires
+    approve_on_timeout: bool = False
+
+    def evaluate(
+        self, tool_name: str, tool_kwargs: dict, user_state: dict
+    ) -> ApprovalRule | None:
+        """Returns the first matching rule, or None if a human has to decide."""
+        for rule in self.rules:
+            if rule.matches(tool_name, tool_kwargs, user_state):
+                return rule
+        return None
+
+
+# ---- Condition helpers ----
+
+
+def kwarg_between(name: str, low: float, high: float) -> Condition:
+    """Holds when the numeric tool kwarg `name` is strictly between `low` and `high`."""
+    return lambda tool_kwargs, user_state: low < float(tool_kwargs[name]) < high
+
+
+def state_has(key: str) -> Condition:
+    """Holds when `key` is set to a truthy value in the user state."""
+    return lambda tool_kwargs, user_state: bool(user_state.get(key))
+
+
+def during_hours(
+    start: time = time(9),
+    end: time = time(17),
+    weekdays_only: bool = True,
+    now: Callable[[], datetime] = datetime.now,
+) -> Condition:
+    """Holds during business hours (local time by default)."""
+
+    def condition(tool_kwargs: dict, user_state: dict) -> bool:
+        current = now()
+        if weekdays_only and current.weekday() >= 5:
+            return False
+        return start <= current.time() < end
+
+    return condition
+
+
+def all_of(*conditions: Condition) -> Condition:
+    """Holds when every condition holds."""
+    return lambda tool_kwargs, user_state: all(
+        condition(tool_kwargs, user_state) for condition in conditions
+    )
+
+
+def describe_decision(rule: ApprovalRule, tool_name: str, tool_kwargs: Any) -> str:
+    """Formats an automatic decision for the progress stream."""
+    verb = "Auto-approved" if rule.decision == "approve" else "Auto-denied"
+    reason = f" ({rule.reason})" if rule.reason else ""
+    return f"{verb} tool {tool_name} with {tool_kwargs}{reason}"
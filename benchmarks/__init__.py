@@ -0,0 +1 @@
+"""Benchmarks for the workflow machinery. Run them from the repo root with `python -m benchmarks.<name>`."""
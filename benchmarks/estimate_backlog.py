@@ -0,0 +1,76 @@
+"""Times the backlog forecast on a large synthetic backlog.
+
+Usage:
+    python -m benchmarks.estimate_backlog --epics 5000 --tasks 8
+
+The first forecast simulates every epic; the second only re-simulates the epics
+that changed in between.
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from agents.epic_redaction.tools.estimate_backlog import simulate_backlog
+from state_store import UserStateStore
+
+
+def make_backlog(n_epics: int, tasks_per_epic: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"EPIC-{i + 1}",
+            "description": "x" * rng.randint(50, 600),
+            "status": "Draft",
+            "tasks": [
+                {
+                    "id": f"TASK-{j + 1}",
+                    "complexity": rng.choice(["Low", "Medium", "High"]),
+                    "status": rng.choice(["To Do", "To Do", "Done"]),
+                }
+                for j in range(rng.randint(0, 2 * tasks_per_epic))
+            ],
+        }
+        for i in range(n_epics)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--epics", type=int, default=5000)
+    parser.add_argument("--tasks", type=int, default=8, help="average tasks per epic")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument(
+        "--changed",
+        type=float,
+        default=0.01,
+        help="share of epics changed between runs",
+    )
+    args = parser.parse_args()
+
+    epics = make_backlog(args.epics, args.tasks)
+    store = UserStateStore({"epics": epics})
+
+    start = time.perf_counter()
+    _, simulated = simulate_backlog(epics, args.samples, store)
+    cold = time.perf_counter() - start
+
+    for epic in epics[: int(len(epics) * args.changed)]:
+        epic["tasks"].append({"complexity": "High", "status": "To Do"})
+
+    start = time.perf_counter()
+    total, resimulated = simulate_backlog(epics, args.samples, store)
+    warm = time.perf_counter() - start
+
+    print(f"epics:       {len(epics)} ({sum(len(e['tasks']) for e in epics)} tasks)")
+    print(f"samples:     {args.samples}")
+    print(f"cold:        {cold * 1000:.1f}ms ({simulated} epics simulated)")
+    print(f"warm:        {warm * 1000:.1f}ms ({resimulated} epics simulated)")
+    p50, p80, p95 = np.percentile(total, [50, 80, 95])
+    print(f"P50/P80/P95: {p50:.0f} / {p80:.0f} / {p95:.0f} story points")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Times backlog ingestion on a large synthetic JSONL and CSV file.
+
+Usage:
+    python -m benchmarks.ingest_backlog --rows 100000 --batch-size 1000 --analysis-ms 200
+
+Each file holds `--rows` rows: epics, each followed by rows for its tasks, and a share
+of invalid rows. With `--nested`, the JSONL file nests the tasks in their epic's row
+instead, so it has fewer, longer rows. Every format is ingested once in full, and
+once interrupted halfway and resumed. A share of the epics asks for deep analysis,
+answered after `--analysis-ms` by a stand-in for the model, to show how analyses
+overlap with reading at `--concurrency`.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from agents.epic_redaction.ingest import ingest_backlog
+from state_store import UserStateStore
+
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+COMPLEXITIES = ["Low", "Medium", "High"]
+
+
+def make_rows(n_rows: int, invalid: float, analyze: float, seed: int = 0) -> list[dict]:
+    """Epic rows, each followed by task rows naming it, `n_rows` in all."""
+    rng = random.Random(seed)
+    rows = []
+    while len(rows) < n_rows:
+        key = f"SRC-{len(rows)}"
+        rows.append(
+            {
+                "key": key,
+                "title": f"Epic {len(rows)}",
+                "description": "x" * rng.randint(50, 400),
+                "priority": rng.choice(PRIORITIES)
+                if rng.random() > invalid
+                else "Urgent",
+                "analyze": rng.random() < analyze,
+            }
+        )
+        for i in range(rng.randint(0, 8)):
+            rows.append(
+                {
+                    "epic": key,
+                    "description": f"Task {i} of {key}",
+                    "complexity": rng.choice(COMPLEXITIES),
+                    "depends_on": f"TASK-{i}" if i else "",
+                }
+            )
+    return rows[:n_rows]
+
+
+def write_jsonl(rows: list[dict], path: str, nested: bool = False) -> None:
+    with open(path, "w") as f:
+        if not nested:
+            for row in rows:
+                f.write(json.dumps({k: v for k, v in row.items() if v != ""}) + "\n")
+            return
+        # tasks in their epic's row, as exported by most trackers
+        epic = None
+        for row in rows:
+            if "epic" in row:
+                epic.setdefault("tasks", []).append(
+                    {k: v for k, v in row.items() if k != "epic" and v}
+                )
+                continue
+            if epic is not None:
+                f.write(json.dumps(epic) + "\n")
+            epic = dict(row)
+        if epic is not None:
+            f.write(json.dumps(epic) + "\n")
+
+
+def write_csv(rows: list[dict], path: str) -> None:
+    columns = [
+        "key",
+        "title",
+        "description",
+        "priority",
+        "analyze",
+        "epic",
+        "complexity",
+        "depends_on",
+    ]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(
+                {
+                    k: ("true" if v is True else "" if v is False else v)
+                    for k, v in row.items()
+                }
+            )
+
+
+class Interrupt(Exception):
+    pass
+
+
+async def run_once(
+    path: str, batch_size: int, concurrency: int, analysis_ms: float
+) -> dict:
+    async def analyze(epic: dict) -> str:
+        await asyncio.sleep(analysis_ms / 1000)
+        return (
+            f"Key Tasks\nDesign {epic['title']}\nBuild {epic['title']}\nDependencies\n"
+        )
+
+    store = UserStateStore({"epics": []})
+    start = time.perf_counter()
+    report = await ingest_backlog(
+        path,
+        store,
+        batch_size=batch_size,
+        analyze=analyze,
+        analysis_concurrency=concurrency,
+    )
+    elapsed = time.perf_counter() - start
+
+    # the same file, stopped after half its batches and resumed from the stored offset
+    resumed = UserStateStore({"epics": []})
+    batches = report.batches // 2
+
+    def stop_halfway(progress) -> None:
+        if progress.batches == batches:
+            raise Interrupt
+
+    try:
+        await ingest_backlog(
+            path, resumed, batch_size=batch_size, on_progress=stop_halfway
+        )
+    except Interrupt:
+        pass
+    start = time.perf_counter()
+    second = await ingest_backlog(path, resumed, batch_size=batch_size)
+    resume_elapsed = time.perf_counter() - start
+    same = [e["id"] for e in store.get("epics")] == [
+        e["id"] for e in resumed.get("epics")
+    ]
+    return {
+        "report": report,
+        "elapsed": elapsed,
+        "resumed": second,
+        "resume_elapsed": resume_elapsed,
+        "same": same,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> None:
+    rows = make_rows(args.rows, args.invalid, args.analyze)
+    with tempfile.TemporaryDirectory() as directory:
+        files = {
+            "jsonl": os.path.join(directory, "backlog.jsonl"),
+            "csv": os.path.join(directory, "backlog.csv"),
+        }
+        write_jsonl(rows, files["jsonl"], args.nested)
+        write_csv(rows, files["csv"])
+        print(f"rows: {len(rows)}, batch size: {args.batch_size}")
+        for label, path in files.items():
+            outcome = await run_once(
+                path, args.batch_size, args.concurrency, args.analysis_ms
+            )
+            report, elapsed = outcome["report"], outcome["elapsed"]
+            analyses = report.analyses + report.failed_analyses
+            print(
+                f"{label} ({os.path.getsize(path) / 1024 / 1024:.1f}MB, {report.rows} rows):"
+            )
+            print(
+                f"  {elapsed:.2f}s, {report.rows / elapsed:,.0f} rows/s, {report.batches} batches; "
+                f"{report.epics} epics, {report.tasks} tasks, {report.invalid} invalid"
+            )
+            print(
+                f"  {analyses} deep analyses at {args.analysis_ms:g}ms, {args.concurrency} at a time "
+                f"(one by one: {analyses * args.analysis_ms / 1000:.1f}s)"
+            )
+            print(
+                f"  resumed after half: {outcome['resumed'].rows} rows in {outcome['resume_elapsed']:.2f}s, "
+                f"{'same epics as' if outcome['same'] else 'DIFFERENT epics from'} the full run"
+            )
+    print(
+        f"peak rss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--invalid", type=float, default=0.01, help="share of invalid epic rows"
+    )
+    parser.add_argument(
+        "--analyze", type=float, default=0.002, help="share of epics to analyze"
+    )
+    parser.add_argument("--analysis-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--nested", action="store_true", help="nest the tasks in the JSONL epic rows"
+    )
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""A scripted function-calling LLM for benchmarks, answering instantly and deterministically."""
+
+import json
+from typing import Any
+
+from llama_index.core.base.llms.types import CompletionResponse
+from llama_index.core.llms import ChatMessage, ChatResponse, LLMMetadata, MessageRole
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.tools import ToolSelection
+
+from llms import TIER_ENV_PREFIXES, LLMPool, llm_pool
+
+
+class MockLLM(FunctionCallingLLM):
+    """Plays a fixed script: the orchestrator transfers every user message to
+    `agent_name`, which calls `tool_name` (once, or once per set of arguments) and
+    then answers.
+
+    Nothing is awaited, so a benchmark using it measures the workflow's own CPU work.
+    """
+
+    agent_name: str = "Concrete Fabrication Info Agent"
+    tool_name: str = "get_mixing_ratios"
+    tool_kwargs: dict[str, Any] = {"strength_requirement": "high"}
+    # arguments of further calls to the tool, made in the same response
+    more_tool_kwargs: list[dict[str, Any]] = []
+    calls: int = 0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MockLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_function_calling_model=True, model_name="mock")
+
+    def _prepare_chat_with_tools(
+        self,
+        tools,
+        user_msg=None,
+        chat_history=None,
+        verbose=False,
+        allow_parallel_tool_calls=False,
+        **kwargs,
+    ) -> dict[str, Any]:
+        messages = list(chat_history or [])
+        if user_msg is not None:
+            messages.append(ChatMessage(role="user", content=str(user_msg)))
+        return {"messages": messages, "tools": tools}
+
+    def _respond(self, messages: list[ChatMessage], tools: list | None) -> ChatResponse:
+        self.calls += 1
+        # the prompt ends with a system message describing the current state
+        conversation = [m for m in messages if m.role != MessageRole.SYSTEM]
+        last = conversation[-1] if conversation else None
+        names = {tool.metadata.name for tool in tools or []}
+        if last is not None and last.role == MessageRole.USER:
+            if "TransferToAgent" in names:
+                return self._tool_call(
+                    "TransferToAgent", [{"agent_name": self.agent_name}], len(messages)
+                )
+            if self.tool_name in names:
+                return self._tool_call(
+                    self.tool_name,
+                    [self.tool_kwargs, *self.more_tool_kwargs],
+                    len(messages),
+                )
+        reply = last.content if last is not None and last.content else "done"
+        return ChatResponse(
+            message=ChatMessage(role="assistant", content=f"Here you go: {reply[:80]}")
+        )
+
+    def _tool_call(self, name: str, calls: list[dict], n: int) -> ChatResponse:
+        tool_calls = [
+            {
+                "id": f"call_{self.calls}_{n}_{i}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(kwargs)},
+            }
+            for i, kwargs in enumerate(calls)
+        ]
+        return ChatResponse(
+            message=ChatMessage(
+                role="assistant",
+                content=None,
+                additional_kwargs={"tool_calls": tool_calls},
+            )
+        )
+
+    def get_tool_calls_from_response(
+        self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs
+    ) -> list[ToolSelection]:
+        return [
+            ToolSelection(
+                tool_id=call["id"],
+                tool_name=call["function"]["name"],
+                tool_kwargs=json.loads(call["function"]["arguments"]),
+            )
+            for call in response.message.additional_kwargs.get("tool_calls", [])
+        ]
+
+    def chat(self, messages, **kwargs) -> ChatResponse:
+        return self._respond(list(messages), kwargs.get("tools"))
+
+    async def achat(self, messages, **kwargs) -> ChatResponse:
+        return self.chat(messages, **kwargs)
+
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs
+    ) -> CompletionResponse:
+        return CompletionResponse(text=f"Here you go: {prompt[:80]}")
+
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs
+    ) -> CompletionResponse:
+        return self.complete(prompt, formatted, **kwargs)
+
+    def stream_chat(self, messages, **kwargs):
+        raise NotImplementedError("MockLLM doesn't stream")
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        raise NotImplementedError("MockLLM doesn't stream")
+
+    async def astream_chat(self, messages, **kwargs):
+        raise NotImplementedError("MockLLM doesn't stream")
+
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        raise NotImplementedError("MockLLM doesn't stream")
+
+
+def install_mock(pool: LLMPool = llm_pool) -> MockLLM:
+    """Registers one mock for every tier of `pool`, and returns it."""
+    llm = MockLLM()
+    for tier in TIER_ENV_PREFIXES:
+        pool.register(tier, llm)
+    return llm
@@ -0,0 +1,78 @@
+"""Replays a corpus of recorded sessions concurrently to benchmark the workflow machinery.
+
+Usage:
+    python -m benchmarks.replay_sessions cassettes/ --concurrency 50 --repeat 4
+
+Every LLM call and human decision is served from the cassettes, so the numbers
+measure the workflow itself (routing, events, tools, state) rather than the LLMs.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from agents import get_agent_configs, get_initial_state
+from cassettes import Cassette, replay_session
+from llms import FAST_MODEL
+from workflow import ConciergeAgent
+
+
+async def run_benchmark(
+    paths: list[Path], concurrency: int, repeat: int, timing: str
+) -> None:
+    workflow = ConciergeAgent(timeout=None, orchestrator_llm=FAST_MODEL)
+    agent_configs = get_agent_configs()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path: Path) -> dict:
+        async with semaphore:
+            cassette = Cassette.load(path, timing=timing)
+            return await replay_session(
+                cassette, workflow, agent_configs, get_initial_state()
+            )
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(p) for p in paths * repeat])
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for r in results for t in r["turn_latencies"])
+    turns = len(latencies)
+    print(f"sessions:    {len(results)} ({len(paths)} cassettes x {repeat})")
+    print(f"concurrency: {concurrency}")
+    print(f"wall time:   {elapsed:.2f}s")
+    print(f"sessions/s:  {len(results) / elapsed:.1f}")
+    print(f"turns/s:     {turns / elapsed:.1f}")
+    if latencies:
+        p95 = latencies[min(turns - 1, int(turns * 0.95))]
+        print(f"turn p50:    {statistics.median(latencies) * 1000:.1f}ms")
+        print(f"turn p95:    {p95 * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "cassettes", type=Path, help="a cassette file or a directory of them"
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="replay each cassette N times"
+    )
+    parser.add_argument(
+        "--timing", choices=["original", "max_speed"], default="max_speed"
+    )
+    args = parser.parse_args()
+
+    if args.cassettes.is_dir():
+        paths = sorted(args.cassettes.glob("*.cassette*"))
+    else:
+        paths = [args.cassettes]
+    if not paths:
+        parser.error(f"No cassettes found in {args.cassettes}")
+
+    asyncio.run(run_benchmark(paths, args.concurrency, args.repeat, args.timing))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measures how turns/sec scale with the number of worker processes, using a mock LLM.
+
+Usage:
+    python -m benchmarks.scale_workers --max-workers 8 --sessions 200 --turns 5
+
+Every session sends `--turns` messages one after the other, all sessions at once.
+The mock answers instantly, so the numbers measure the workflow's own CPU work
+(validation, prompt building, events) and how well it spreads over cores.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from agents import get_agent_configs, get_initial_state
+from benchmarks.mock_llm import install_mock
+from workers import WorkerApp, WorkerPool
+
+
+def mock_app() -> WorkerApp:
+    return WorkerApp(
+        agent_configs=get_agent_configs(),
+        make_llm=install_mock,
+        initial_state=get_initial_state,
+    )
+
+
+async def send(pool: WorkerPool, session_id: str, user_msg: str) -> None:
+    result = await pool.send(session_id, user_msg)
+    # a worker that can't serve turns would otherwise look like a fast one
+    if "response" not in result:
+        raise RuntimeError(f"{session_id}: {result}")
+
+
+async def run_once(app: WorkerApp, workers: int, sessions: int, turns: int) -> float:
+    async with WorkerPool(app, workers=workers) as pool:
+        # one turn per worker first, so process start-up isn't measured
+        await asyncio.gather(
+            *(send(pool, f"warmup-{i}", "hi") for i in range(workers * 4))
+        )
+
+        async def conversation(session_id: str) -> None:
+            for turn in range(turns):
+                await send(
+                    pool, session_id, f"Mixing ratios for {session_id}, turn {turn}"
+                )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation(f"session-{i}") for i in range(sessions)))
+        return sessions * turns / (time.perf_counter() - start)
+
+
+async def run_benchmark(max_workers: int, sessions: int, turns: int) -> None:
+    app = mock_app()
+    counts = sorted(
+        {1, *(2**i for i in range(1, max_workers.bit_length())), max_workers}
+    )
+    print(f"cores: {os.cpu_count()}, sessions: {sessions}, turns per session: {turns}")
+    baseline = None
+    for workers in counts:
+        rate = await run_once(app, workers, sessions, turns)
+        baseline = baseline or rate
+        print(f"{workers:>3} worker(s): {rate:8.1f} turns/s ({rate / baseline:.2f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.max_workers, args.sessions, args.turns))
+
+
+if __name__ == "__main__":
+    main()
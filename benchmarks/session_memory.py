@@ -0,0 +1,128 @@
+"""Compares a worker's memory with and without a session memory quota, using a mock LLM.
+
+Usage:
+    python -m benchmarks.session_memory --sessions 2000 --analysis-kb 20 --soft-mb 16
+
+Every session starts with an epic holding a `deep_analysis` of `--analysis-kb`
+kilobytes, and sends `--turns` messages. The sessions are then revisited, so with a
+quota most of them are restored from disk. Reports the worker's resident memory,
+the accounted session memory, and turn latency for resident and spilled sessions.
+"""
+
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from agents import get_agent_configs, get_initial_state
+from benchmarks.mock_llm import install_mock
+from session_memory import MemoryQuota
+from workers import WorkerApp, WorkerPool
+
+MB = 1024 * 1024
+
+
+class AnalysisState:
+    """Initial states with an epic whose analysis is `kilobytes` of text, like a deep thinking result."""
+
+    def __init__(self, kilobytes: int):
+        words = [
+            "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+            for _ in range(2000)
+        ]
+        self.analysis = " ".join(random.choices(words, k=kilobytes * 1024 // 7))
+
+    def __call__(self) -> dict:
+        state = get_initial_state()
+        state["epics"] = [
+            {
+                "id": "EPIC-1",
+                "title": "Slab pour",
+                "tasks": [],
+                "deep_analysis": self.analysis,
+            }
+        ]
+        return state
+
+
+async def run_once(
+    quota: MemoryQuota | None, sessions: int, turns: int, analysis_kb: int
+) -> dict:
+    app = WorkerApp(
+        agent_configs=get_agent_configs(),
+        make_llm=install_mock,
+        initial_state=AnalysisState(analysis_kb),
+        memory_quota=quota,
+    )
+    async with WorkerPool(app, workers=1) as pool:
+        await pool.send("warmup", "hi")
+        [before] = await pool.stats()
+        for turn in range(turns):
+            for i in range(sessions):
+                result = await pool.send(f"session-{i}", f"Mixing ratios ({turn})")
+                if "response" not in result:
+                    raise RuntimeError(result)
+        [after] = await pool.stats()
+
+        # the oldest sessions are the ones spilled first; the newest stay resident
+        revisits = {
+            "spilled": range(min(50, sessions)),
+            "resident": range(sessions - 1, max(sessions - 51, -1), -1),
+        }
+        latency = {}
+        for label, indexes in revisits.items():
+            start = time.perf_counter()
+            for i in indexes:
+                await pool.send(f"session-{i}", "And for low strength?")
+            latency[label] = (time.perf_counter() - start) / len(indexes)
+        [final] = await pool.stats()
+    return {"before": before, "after": after, "final": final, "latency": latency}
+
+
+async def run_benchmark(
+    sessions: int, turns: int, analysis_kb: int, soft_mb: float
+) -> None:
+    print(
+        f"sessions: {sessions}, turns each: {turns}, analysis per session: {analysis_kb}KB"
+    )
+    modes = {
+        "no quota": None,
+        f"soft {soft_mb:g}MB": MemoryQuota(
+            soft_bytes=int(soft_mb * MB), hard_bytes=int(2 * soft_mb * MB)
+        ),
+    }
+    for label, quota in modes.items():
+        outcome = await run_once(quota, sessions, turns, analysis_kb)
+        before, after, final = outcome["before"], outcome["after"], outcome["final"]
+        print(f"{label}:")
+        print(
+            f"  rss {before['rss_bytes'] / MB:.0f}MB -> {after['rss_bytes'] / MB:.0f}MB, "
+            f"accounted sessions {after['memory_bytes'] / MB:.1f}MB in {after['sessions']} resident"
+        )
+        print(
+            f"  spilled {final['spilled']} session(s), {final['spilled_bytes'] / MB:.1f}MB on disk, "
+            f"{final['spills']} spill(s), {final['rehydrations']} restore(s)"
+        )
+        print(
+            "  turn latency: "
+            + ", ".join(f"{k} {v * 1000:.2f}ms" for k, v in outcome["latency"].items())
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument(
+        "--turns", type=int, default=1, help="turns per session before revisiting"
+    )
+    parser.add_argument("--analysis-kb", type=int, default=20)
+    parser.add_argument("--soft-mb", type=float, default=16)
+    args = parser.parse_args()
+    asyncio.run(
+        run_benchmark(args.sessions, args.turns, args.analysis_kb, args.soft_mb)
+    )
+
+
+if __name__ == "__main__":
+    main()
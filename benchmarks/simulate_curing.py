@@ -0,0 +1,48 @@
+"""Times the curing simulation on a project's worth of synthetic sensor data.
+
+Usage:
+    python -m benchmarks.simulate_curing --elements 5000 --days 28
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from agents.concrete_info.tools.simulate_curing import first_reaching, simulate_curing
+
+
+def make_readings(n_elements: int, hours: int, seed: int = 0) -> np.ndarray:
+    """Hourly concrete temperatures: a daily cycle around a per-element mean, plus noise."""
+    rng = np.random.default_rng(seed)
+    mean = rng.uniform(0, 30, size=(n_elements, 1))
+    phase = rng.uniform(0, 2 * np.pi, size=(n_elements, 1))
+    t = np.arange(hours)
+    daily = 6 * np.sin(2 * np.pi * t / 24 + phase)
+    return mean + daily + rng.normal(0, 1, size=(n_elements, hours))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--elements", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=28)
+    args = parser.parse_args()
+
+    temperatures = make_readings(args.elements, args.days * 24)
+    design_mpa = np.full(args.elements, 30.0)
+
+    start = time.perf_counter()
+    curing = simulate_curing(temperatures, design_mpa)
+    strip_hours = first_reaching(curing["strength"], design_mpa * 0.7)
+    elapsed = time.perf_counter() - start
+
+    stripped = strip_hours[~np.isnan(strip_hours)]
+    print(f"elements:   {args.elements} x {temperatures.shape[1]} hourly readings")
+    print(f"simulation: {elapsed * 1000:.1f}ms")
+    print(
+        f"stripped:   {stripped.size} elements, median after {np.median(stripped) / 24:.1f} days"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compares running tool calls inline in the agent's step with the event-hop path.
+
+Usage:
+    python -m benchmarks.tool_dispatch --turns 500 --tool-calls 1
+
+Every turn routes to the concrete agent, which makes `--tool-calls` calls to a tool
+that needs no approval and then answers. The mock LLM answers instantly, so the
+difference is the cost of the events, steps and context reads between the calls.
+Turns are timed in process CPU time, and the spread between blocks is printed: a
+difference smaller than that spread is noise.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from agents import get_agent_configs, get_initial_state
+from benchmarks.mock_llm import install_mock
+from sessions import ConciergeSession
+from workflow import ConciergeAgent
+
+STRENGTHS = ["low", "medium", "high", "very high"]
+SESSION_TURNS = 5
+
+
+async def run_turns(
+    fuse: bool, turns: int, tool_calls: int
+) -> tuple[float, list, list]:
+    llm = install_mock()
+    # distinct arguments, so no call is merged with another
+    llm.more_tool_kwargs = [
+        {
+            "strength_requirement": STRENGTHS[i % len(STRENGTHS)],
+            "application": f"pour {i}",
+        }
+        for i in range(1, tool_calls)
+    ]
+    workflow = ConciergeAgent(timeout=None, fast_path=False, fuse_tool_calls=fuse)
+    agent_configs = get_agent_configs()
+
+    events, history = [], []
+    elapsed = 0.0
+    for turn in range(turns):
+        # short conversations, so the growing history doesn't swamp the dispatch cost
+        if turn % SESSION_TURNS == 0:
+            session = ConciergeSession(
+                workflow, agent_configs, llm, get_initial_state()
+            )
+        start = time.process_time()
+        handler = await session.send(f"Mixing ratios please ({turn})")
+        async for event in handler.stream_events():
+            events.append(type(event).__name__)
+        await handler
+        elapsed += time.process_time() - start
+        if turn % SESSION_TURNS == SESSION_TURNS - 1 or turn == turns - 1:
+            history += [(m.role.value, m.content) for m in session.chat_history]
+    return elapsed, events, history
+
+
+async def run_benchmark(turns: int, tool_calls: int, block: int) -> None:
+    _, *hops_output = await run_turns(False, 2 * SESSION_TURNS, tool_calls)
+    _, *inline_output = await run_turns(True, 2 * SESSION_TURNS, tool_calls)
+
+    # short blocks of each path in turn, alternating which goes first, so drift in the
+    # machine's speed hits both alike; the median block is compared
+    per_turn = {False: [], True: []}
+    for i in range(max(1, turns // block)):
+        for fuse in (False, True) if i % 2 else (True, False):
+            elapsed, _, _ = await run_turns(fuse, block, tool_calls)
+            per_turn[fuse].append(elapsed / block)
+
+    print(
+        f"turns: {turns} per path, in blocks of {block}, tool calls per response: {tool_calls}"
+    )
+    medians = {}
+    for fuse, label in ((False, "event hops"), (True, "inline")):
+        times = per_turn[fuse]
+        medians[fuse] = statistics.median(times)
+        low, high = (
+            statistics.quantiles(times, n=4)[::2]
+            if len(times) > 1
+            else (medians[fuse],) * 2
+        )
+        print(
+            f"{label:>10}: {medians[fuse] * 1000:6.2f}ms per turn "
+            f"(interquartile {low * 1000:.2f}-{high * 1000:.2f}ms)"
+        )
+    saved = medians[False] - medians[True]
+    print(f"   saved: {saved * 1000:.2f}ms per turn ({saved / medians[False]:.0%})")
+    print(f"same streamed events: {inline_output[0] == hops_output[0]}")
+    print(f"same history:         {inline_output[1] == hops_output[1]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument(
+        "--tool-calls", type=int, default=1, help="tool calls per agent response"
+    )
+    parser.add_argument("--block", type=int, default=25, help="turns per timed block")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.turns, args.tool_calls, args.block))
+
+
+if __name__ == "__main__":
+    main()
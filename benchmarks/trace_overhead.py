@@ -0,0 +1,99 @@
+"""Measures what tracing costs per turn, untraced, sampled and fully traced.
+
+Usage:
+    python -m benchmarks.trace_overhead --turns 2000 --sample 0.05 --html trace.html
+
+Every turn routes to the concrete agent, which calls a tool and answers. The mock LLM
+answers instantly, so the difference is the recorder's own work. Turns are timed in
+process CPU time, and the spread between blocks is printed: a difference smaller than
+that spread is noise. With `--html`, the fully traced session is written out as a
+waterfall.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from agents import get_agent_configs, get_initial_state
+from benchmarks.mock_llm import install_mock
+from sessions import ConciergeSession
+from tracing import TraceRecorder
+from workflow import ConciergeAgent
+
+SESSION_TURNS = 5
+
+
+async def run_turns(tracer: TraceRecorder | None, turns: int) -> float:
+    llm = install_mock()
+    workflow = ConciergeAgent(timeout=None, fast_path=False, tracer=tracer)
+    agent_configs = get_agent_configs()
+
+    elapsed = 0.0
+    for turn in range(turns):
+        # short conversations, so the growing history doesn't swamp the tracing cost
+        if turn % SESSION_TURNS == 0:
+            session = ConciergeSession(
+                workflow, agent_configs, llm, get_initial_state()
+            )
+        start = time.process_time()
+        handler = await session.send(f"Mixing ratios please ({turn})")
+        async for _ in handler.stream_events():
+            pass
+        await handler
+        elapsed += time.process_time() - start
+    return elapsed
+
+
+async def run_benchmark(
+    turns: int, sample: float, block: int, html: str | None
+) -> None:
+    # one untimed round, so imports and caches don't count against the first mode
+    await run_turns(None, 5)
+
+    tracers = {
+        "off": None,
+        f"sampled {sample:.0%}": TraceRecorder(sample, seed=0),
+        "all turns": TraceRecorder(1.0, max_traces=SESSION_TURNS),
+    }
+    # short blocks of each mode in turn, in a rotating order, so drift in the machine's
+    # speed hits every mode alike; the median block is compared
+    per_turn = {label: [] for label in tracers}
+    labels = list(tracers)
+    for i in range(max(1, turns // block)):
+        for label in labels[i % 3 :] + labels[: i % 3]:
+            per_turn[label].append(await run_turns(tracers[label], block) / block)
+
+    print(f"turns: {turns} per mode, in blocks of {block}")
+    baseline = statistics.median(per_turn["off"])
+    for label, times in per_turn.items():
+        median = statistics.median(times)
+        low, high = (
+            statistics.quantiles(times, n=4)[::2]
+            if len(times) > 1
+            else (median, median)
+        )
+        print(
+            f"{label:>12}: {median * 1000:6.3f}ms per turn "
+            f"(interquartile {low * 1000:.3f}-{high * 1000:.3f}ms, {median / baseline - 1:+.1%})"
+        )
+    if html:
+        tracer = tracers["all turns"]
+        tracer.write_html(html, list(tracer.traces)[:SESSION_TURNS])
+        print(f"waterfall of the last fully traced session written to {html}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument(
+        "--sample", type=float, default=0.05, help="share of turns traced"
+    )
+    parser.add_argument("--block", type=int, default=25, help="turns per timed block")
+    parser.add_argument("--html", help="write the traced turns' waterfall here")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.turns, args.sample, args.block, args.html))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,690 @@
+"""Record/replay cassettes for LLM interactions and human decisions.
+
+A cassette captures everything non-deterministic about a session: every LLM request
+and response (tool calls and streaming chunks included), every approval decision (made
+by the human or by a timeout) and every user message. Replaying a cassette drives the workflow without touching any
+external service, either at the original pace or as fast as possible.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, AsyncGenerator, Literal, Sequence
+
+from pydantic import PrivateAttr
+
+from llama_index.core.base.llms.types import (
+    ChatResponseAsyncGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+)
+from llama_index.core.llms import ChatMessage, ChatResponse, LLM, LLMMetadata
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.tools import BaseTool, ToolSelection
+
+from session_log import SessionLog
+from llms import TIER_ENV_PREFIXES, LLMPool, llm_pool, use_pool
+from workflow import (
+    ConciergeAgent,
+    ToolApprovedEvent,
+    ToolBatchApprovedEvent,
+    ToolBatchRequestEvent,
+)
+
+CASSETTE_VERSION = 3
+
+EXIT_WORDS = ("exit", "quit", "bye")
+
+CassetteMode = Literal["record", "replay"]
+ReplayTiming = Literal["original", "max_speed"]
+
+
+class CassetteMismatchError(Exception):
+    """Raised when a replayed request has no matching recording."""
+
+
+class Cassette:
+    """An ordered, compact recording of one session."""
+
+    def __init__(
+        self,
+        mode: CassetteMode = "record",
+        timing: ReplayTiming = "max_speed",
+        strict: bool = True,
+    ) -> None:
+        self.mode = mode
+        self.timing = timing
+        self.strict = strict
+        self.header: dict[str, Any] = {"version": CASSETTE_VERSION, "llms": {}}
+        self.entries: list[dict[str, Any]] = []
+        self._start = time.monotonic()
+        # replay indexes: llm entries by request key, human entries in order
+        self._llm_by_key: dict[str, deque[dict]] = defaultdict(deque)
+        self._llm_by_name: dict[str, deque[dict]] = defaultdict(deque)
+        self._human: dict[str, deque[dict]] = defaultdict(deque)
+        self._consumed: set[int] = set()
+
+    # ---- persistence ----
+
+    def save(self, path: str | Path) -> None:
+        """Writes the cassette as gzipped JSON lines: a header, then one entry per line."""
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(self.header, separators=(",", ":")) + "\n")
+            for entry in self.entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(
+        cls,
+        path: str | Path,
+        timing: ReplayTiming = "max_speed",
+        strict: bool = True,
+    ) -> "Cassette":
+        """Loads a cassette for replay."""
+        cassette = cls(mode="replay", timing=timing, strict=strict)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            cassette.header = json.loads(f.readline())
+            if cassette.header.get("version") != CASSETTE_VERSION:
+                raise ValueError(
+                    f"Unsupported cassette version {cassette.header.get('version')}"
+                )
+            for i, line in enumerate(f):
+                entry = json.loads(line)
+                entry["index"] = i
+                cassette.entries.append(entry)
+                if entry["kind"] == "llm":
+                    cassette._llm_by_key[entry["key"]].append(entry)
+                    cassette._llm_by_name[entry["llm"]].append(entry)
+                else:
+                    cassette._human[entry["kind"]].append(entry)
+        return cassette
+
+    # ---- recording ----
+
+    def _now(self) -> float:
+        return round(time.monotonic() - self._start, 4)
+
+    def record_llm(
+        self,
+        llm_name: str,
+        op: str,
+        key: str,
+        request: dict,
+        response: dict,
+        elapsed: float,
+    ) -> None:
+        self.entries.append(
+            {
+                "kind": "llm",
+                "llm": llm_name,
+                "op": op,
+                "key": key,
+                "t": self._now(),
+                "elapsed": round(elapsed, 4),
+                "request": request,
+                "response": response,
+            }
+        )
+
+    def record_user_message(self, content: str, wait: float = 0.0) -> None:
+        """Records a message typed by the user, and how long they took to type it."""
+        self.entries.append(
+            {
+                "kind": "user_message",
+                "t": self._now(),
+                "wait": round(wait, 4),
+                "content": content,
+            }
+        )
+
+    def record_approval(
+        self,
+        tool_id: str,
+        tool_name: str,
+        tool_kwargs: dict,
+        approved: bool,
+        reason: str | None = None,
+        wait: float = 0.0,
+        timed_out: bool = False,
+    ) -> None:
+        """Records the decision on a tool call, the human's or the one its timeout made."""
+        self.entries.append(
+            {
+                "kind": "approval",
+                "t": self._now(),
+                "wait": round(wait, 4),
+                "tool_id": tool_id,
+                "tool_name": tool_name,
+                "tool_kwargs": _jsonable(tool_kwargs),
+                "approved": approved,
+                "reason": reason,
+                "timed_out": timed_out,
+            }
+        )
+
+    # ---- replay ----
+
+    async def next_llm(
+        self, llm_name: str, op: str, key: str, wait: bool = True
+    ) -> dict:
+        """Returns the recorded response for a request, honoring the replay timing."""
+        entry = self._take(self._llm_by_key[key])
+        if entry is None:
+            if self.strict:
+                raise CassetteMismatchError(
+                    f"No recorded {op} call on {llm_name} matches request {key[:12]}"
+                )
+            entry = self._take(self._llm_by_name[llm_name])
+            if entry is None:
+                raise CassetteMismatchError(f"Cassette exhausted for {llm_name}")
+        if wait and self.timing == "original":
+            await asyncio.sleep(entry["elapsed"])
+        return entry
+
+    async def next_user_message(self) -> str | None:
+        """Returns the next recorded user message, or None when the session is over."""
+        entry = self._take(self._human["user_message"])
+        if entry is None:
+            return None
+        if self.timing == "original":
+            await asyncio.sleep(entry["wait"])
+        return entry["content"]
+
+    async def next_approval(
+        self, tool_id: str, tool_name: str, tool_kwargs: dict
+    ) -> dict:
+        """Returns the recorded decision on a tool call.
+
+        Decisions are found by the call's id, which replayed LLM responses keep, or
+        else by its tool and arguments, so the order requests are shown in doesn't
+        matter. A decision a timeout made is replayed like any other.
+        """
+        queue = self._human["approval"]
+        kwargs = _jsonable(tool_kwargs)
+        entry = next((e for e in queue if e["tool_id"] == tool_id), None) or next(
+            (
+                e
+                for e in queue
+                if e["tool_name"] == tool_name and e["tool_kwargs"] == kwargs
+            ),
+            None,
+        )
+        if entry is None:
+            raise CassetteMismatchError(
+                f"No recorded approval for {tool_name} with {kwargs}"
+            )
+        queue.remove(entry)
+        self._consumed.add(entry["index"])
+        if self.timing == "original":
+            await asyncio.sleep(entry["wait"])
+        return entry
+
+    def _take(self, queue: deque) -> dict | None:
+        # entries are indexed twice (by key and by name), so skip ones already served
+        while queue:
+            entry = queue.popleft()
+            if entry["index"] not in self._consumed:
+                self._consumed.add(entry["index"])
+                return entry
+        return None
+
+    # ---- wiring ----
+
+    def wrap(self, name: str, llm: LLM | None) -> "CassetteLLM":
+        """Wraps an LLM so its calls are recorded to (or replayed from) this cassette."""
+        if self.mode == "record":
+            if llm is None:
+                raise ValueError("Recording requires a real LLM to wrap")
+            self.header["llms"][name] = {
+                "model_name": llm.metadata.model_name,
+                "context_window": llm.metadata.context_window,
+                "is_function_calling_model": llm.metadata.is_function_calling_model,
+            }
+        elif name not in self.header["llms"]:
+            raise ValueError(f"LLM {name} was not recorded on this cassette")
+        return CassetteLLM(name=name, inner=llm, cassette=self)
+
+    def install(self, source: LLMPool, tiers: Sequence[str] | None = None) -> LLMPool:
+        """Returns a pool whose tiers are wrapped by this cassette.
+
+        When recording, every tier configured in `source` is wrapped. When replaying,
+        every tier recorded on the cassette is served from it.
+        """
+        pool = LLMPool()
+        if self.mode == "record":
+            for tier in tiers or TIER_ENV_PREFIXES:
+                llm = source.get(tier)
+                if llm is not None:
+                    pool.register(tier, self.wrap(tier, llm))
+        else:
+            for tier in self.header["llms"]:
+                pool.register(tier, self.wrap(tier, None))
+        return pool
+
+
+class CassetteLLM(FunctionCallingLLM):
+    """A function calling LLM that records to, or replays from, a cassette."""
+
+    name: str
+    _inner: LLM | None = PrivateAttr(default=None)
+    _cassette: Cassette = PrivateAttr()
+
+    def __init__(self, name: str, inner: LLM | None, cassette: Cassette) -> None:
+        super().__init__(name=name)
+        self._inner = inner
+        self._cassette = cassette
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CassetteLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        if self._inner is not None:
+            return self._inner.metadata
+        recorded = self._cassette.header["llms"][self.name]
+        return LLMMetadata(
+            model_name=recorded["model_name"],
+            context_window=recorded["context_window"],
+            is_function_calling_model=recorded["is_function_calling_model"],
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self._cassette.mode == "replay"
+
+    def _prepare_chat_with_tools(
+        self,
+        tools: Sequence[BaseTool],
+        user_msg: str | ChatMessage | None = None,
+        chat_history: list[ChatMessage] | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        messages = list(chat_history or [])
+        if isinstance(user_msg, str):
+            messages.append(ChatMessage(role="user", content=user_msg))
+        elif user_msg is not None:
+            messages.append(user_msg)
+        return {"messages": messages, "tools": tools, **kwargs}
+
+    # ---- chat ----
+
+    async def achat_with_tools(
+        self,
+        tools: Sequence[BaseTool],
+        user_msg: str | ChatMessage | None = None,
+        chat_history: list[ChatMessage] | None = None,
+        **kwargs: Any,
+    ) -> ChatResponse:
+        messages = self._prepare_chat_with_tools(tools, user_msg, chat_history)[
+            "messages"
+        ]
+        key = _request_key(self.name, "chat_with_tools", messages, tools)
+        if self.replaying:
+            entry = await self._cassette.next_llm(self.name, "chat_with_tools", key)
+            return _chat_response(entry["response"])
+
+        start = time.monotonic()
+        response = await self._inner.achat_with_tools(
+            tools, user_msg=user_msg, chat_history=chat_history, **kwargs
+        )
+        tool_calls = self._inner.get_tool_calls_from_response(
+            response, error_on_no_tool_call=False
+        )
+        self._cassette.record_llm(
+            self.name,
+            "chat_with_tools",
+            key,
+            _request_summary(messages, tools),
+            {
+                "message": _serialize_message(response.message),
+                "tool_calls": [_jsonable(tc) for tc in tool_calls],
+            },
+            time.monotonic() - start,
+        )
+        return response
+
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponse:
+        key = _request_key(self.name, "chat", messages, kwargs.get("tools"))
+        if self.replaying:
+            entry = await self._cassette.next_llm(self.name, "chat", key)
+            return _chat_response(entry["response"])
+
+        start = time.monotonic()
+        response = await self._inner.achat(messages, **kwargs)
+        self._cassette.record_llm(
+            self.name,
+            "chat",
+            key,
+            _request_summary(messages, kwargs.get("tools")),
+            {"message": _serialize_message(response.message), "tool_calls": []},
+            time.monotonic() - start,
+        )
+        return response
+
+    def get_tool_calls_from_response(
+        self,
+        response: ChatResponse,
+        error_on_no_tool_call: bool = True,
+        **kwargs: Any,
+    ) -> list[ToolSelection]:
+        if not self.replaying:
+            return self._inner.get_tool_calls_from_response(
+                response, error_on_no_tool_call=error_on_no_tool_call, **kwargs
+            )
+        tool_calls = [
+            ToolSelection(**tc) for tc in (response.raw or {}).get("tool_calls", [])
+        ]
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call, but got 0 tool calls.")
+        return tool_calls
+
+    # ---- streaming ----
+
+    async def astream_chat_with_tools(
+        self,
+        tools: Sequence[BaseTool],
+        user_msg: str | ChatMessage | None = None,
+        chat_history: list[ChatMessage] | None = None,
+        **kwargs: Any,
+    ) -> ChatResponseAsyncGen:
+        messages = self._prepare_chat_with_tools(tools, user_msg, chat_history)[
+            "messages"
+        ]
+        key = _request_key(self.name, "stream_chat_with_tools", messages, tools)
+        if self.replaying:
+            return self._replay_chat_stream("stream_chat_with_tools", key)
+        stream = await self._inner.astream_chat_with_tools(
+            tools, user_msg=user_msg, chat_history=chat_history, **kwargs
+        )
+        return self._record_chat_stream(
+            stream, "stream_chat_with_tools", key, _request_summary(messages, tools)
+        )
+
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        key = _request_key(self.name, "stream_chat", messages, kwargs.get("tools"))
+        if self.replaying:
+            return self._replay_chat_stream("stream_chat", key)
+        stream = await self._inner.astream_chat(messages, **kwargs)
+        return self._record_chat_stream(
+            stream, "stream_chat", key, _request_summary(messages, kwargs.get("tools"))
+        )
+
+    async def _record_chat_stream(
+        self, stream: ChatResponseAsyncGen, op: str, key: str, request: dict
+    ) -> AsyncGenerator[ChatResponse, None]:
+        start = time.monotonic()
+        chunks = []
+        last = None
+        async for chunk in stream:
+            chunks.append([round(time.monotonic() - start, 4), chunk.delta or ""])
+            last = chunk
+            yield chunk
+        tool_calls = []
+        if last is not None and op == "stream_chat_with_tools":
+            tool_calls = self._inner.get_tool_calls_from_response(
+                last, error_on_no_tool_call=False
+            )
+        self._cassette.record_llm(
+            self.name,
+            op,
+            key,
+            request,
+            {
+                "message": _serialize_message(last.message) if last else None,
+                "tool_calls": [_jsonable(tc) for tc in tool_calls],
+                "chunks": chunks,
+            },
+            time.monotonic() - start,
+        )
+
+    async def _replay_chat_stream(
+        self, op: str, key: str
+    ) -> AsyncGenerator[ChatResponse, None]:
+        # the per-chunk offsets carry the timing, so fetch the entry without waiting
+        entry = await self._cassette.next_llm(self.name, op, key, wait=False)
+        timing = self._cassette.timing
+        response = entry["response"]
+        final = _chat_response(response)
+        content = ""
+        elapsed = 0.0
+        for i, (offset, delta) in enumerate(response["chunks"]):
+            if timing == "original":
+                await asyncio.sleep(max(0.0, offset - elapsed))
+                elapsed = offset
+            content += delta
+            if i == len(response["chunks"]) - 1:
+                yield final.model_copy(update={"delta": delta})
+            else:
+                yield ChatResponse(
+                    message=ChatMessage(role=final.message.role, content=content),
+                    delta=delta,
+                )
+
+    # ---- completion ----
+
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        key = _hash({"llm": self.name, "op": "complete", "prompt": prompt})
+        if self.replaying:
+            entry = await self._cassette.next_llm(self.name, "complete", key)
+            return CompletionResponse(text=entry["response"]["text"])
+
+        start = time.monotonic()
+        response = await self._inner.acomplete(prompt, formatted=formatted, **kwargs)
+        self._cassette.record_llm(
+            self.name,
+            "complete",
+            key,
+            {"prompt_chars": len(prompt)},
+            {"text": response.text},
+            time.monotonic() - start,
+        )
+        return response
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        key = _hash({"llm": self.name, "op": "stream_complete", "prompt": prompt})
+        if self.replaying:
+            return self._replay_completion_stream(key)
+        stream = await self._inner.astream_complete(
+            prompt, formatted=formatted, **kwargs
+        )
+        return self._record_completion_stream(stream, key, len(prompt))
+
+    async def _record_completion_stream(
+        self, stream: CompletionResponseAsyncGen, key: str, prompt_chars: int
+    ) -> AsyncGenerator[CompletionResponse, None]:
+        start = time.monotonic()
+        chunks = []
+        text = ""
+        async for chunk in stream:
+            chunks.append([round(time.monotonic() - start, 4), chunk.delta or ""])
+            text = chunk.text
+            yield chunk
+        self._cassette.record_llm(
+            self.name,
+            "stream_complete",
+            key,
+            {"prompt_chars": prompt_chars},
+            {"text": text, "chunks": chunks},
+            time.monotonic() - start,
+        )
+
+    async def _replay_completion_stream(
+        self, key: str
+    ) -> AsyncGenerator[CompletionResponse, None]:
+        entry = await self._cassette.next_llm(
+            self.name, "stream_complete", key, wait=False
+        )
+        timing = self._cassette.timing
+        text = ""
+        elapsed = 0.0
+        for offset, delta in entry["response"]["chunks"]:
+            if timing == "original":
+                await asyncio.sleep(max(0.0, offset - elapsed))
+                elapsed = offset
+            text += delta
+            yield CompletionResponse(text=text, delta=delta)
+
+    # ---- sync API (unused by the workflow) ----
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        raise NotImplementedError("Cassettes only support the async API.")
+
+    def complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        raise NotImplementedError("Cassettes only support the async API.")
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> Any:
+        raise NotImplementedError("Cassettes only support the async API.")
+
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> Any:
+        raise NotImplementedError("Cassettes only support the async API.")
+
+
+# ---- serialization helpers ----
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return _jsonable(value.model_dump())
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _serialize_message(message: ChatMessage) -> dict:
+    return {
+        "role": message.role.value,
+        "content": message.content,
+        "additional_kwargs": _jsonable(message.additional_kwargs),
+    }
+
+
+def _chat_response(response: dict) -> ChatResponse:
+    return ChatResponse(
+        message=ChatMessage(**response["message"]),
+        raw={"tool_calls": response["tool_calls"]},
+    )
+
+
+def _hash(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _request_key(
+    llm_name: str,
+    op: str,
+    messages: Sequence[ChatMessage],
+    tools: Sequence[BaseTool] | None,
+) -> str:
+    return _hash(
+        {
+            "llm": llm_name,
+            "op": op,
+            "messages": [
+                [m.role.value, m.content, _tool_calls_key(m)] for m in messages
+            ],
+            "tools": [t.metadata.get_name() for t in tools or []],
+        }
+    )
+
+
+def _tool_calls_key(message: ChatMessage) -> list:
+    # what was called and with which arguments; ids can be generated locally (e.g. for
+    # fast-path commands), so they would never match on replay
+    calls = _jsonable(message.additional_kwargs.get("tool_calls") or [])
+    return [
+        call.get("function", call) if isinstance(call, dict) else call for call in calls
+    ]
+
+
+def _request_summary(
+    messages: Sequence[ChatMessage], tools: Sequence[BaseTool] | None
+) -> dict:
+    # the key already pins the full request; only keep enough to read the cassette
+    return {
+        "num_messages": len(messages),
+        "last_message": _serialize_message(messages[-1]) if messages else None,
+        "tools": [t.metadata.get_name() for t in tools or []],
+    }
+
+
+# ---- session replay ----
+
+
+async def replay_session(
+    cassette: Cassette,
+    workflow: ConciergeAgent,
+    agent_configs: list,
+    initial_state: dict,
+) -> dict[str, Any]:
+    """Drives a whole recorded session through `workflow`, the way main.py's loop would.
+
+    Returns the number of turns replayed and the wall-clock latency of each turn.
+    """
+    pool = cassette.install(llm_pool)
+    with use_pool(pool):
+        llm = pool.get("standard")
+        ctx = None
+        session_log = SessionLog()
+        turn_latencies = []
+
+        user_msg = await cassette.next_user_message()
+        while user_msg is not None and user_msg.strip().lower() not in EXIT_WORDS:
+            start = time.monotonic()
+            handler = workflow.run(
+                ctx=ctx,
+                user_msg=user_msg,
+                agent_configs=agent_configs,
+                llm=llm,
+                session_log=session_log,
+                initial_state=initial_state,
+            )
+            async for event in handler.stream_events():
+                if isinstance(event, ToolBatchRequestEvent):
+                    decisions = []
+                    for request in event.requests:
+                        decision = await cassette.next_approval(
+                            request.tool_id, request.tool_name, request.tool_kwargs
+                        )
+                        decisions.append(
+                            ToolApprovedEvent(
+                                tool_id=request.tool_id,
+                                tool_name=request.tool_name,
+                                tool_kwargs=request.tool_kwargs,
+                                approved=decision["approved"],
+                                response=decision["reason"],
+                            )
+                        )
+                    handler.ctx.send_event(
+                        ToolBatchApprovedEvent(
+                            batch_id=event.batch_id, decisions=decisions
+                        )
+                    )
+            await handler
+            turn_latencies.append(time.monotonic() - start)
+
+            ctx = await workflow.continue_from(handler.ctx)
+            user_msg = await cassette.next_user_message()
+
+    return {"turns": len(turn_latencies), "turn_latencies": turn_latencies}
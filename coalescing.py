@@ -0,0 +1,96 @@
+"""Single-flight coalescing: identical requests in flight at the same time share one call."""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+from llama_index.core.tools import ToolSelection
+
+T = TypeVar("T")
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return repr(value)
+
+
+def canonical_hash(value: Any) -> str:
+    """A hash of `value` that doesn't depend on dict key order."""
+    encoded = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), default=_jsonable
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def tool_call_key(tool_call: ToolSelection) -> str:
+    """Identifies a tool call by what it does, ignoring its id."""
+    return canonical_hash([tool_call.tool_name, tool_call.tool_kwargs])
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one call per key at a time and hands its outcome to everyone who asked.
+
+    A request whose key is already in flight waits for that call instead of making its
+    own, and gets the same result (or exception), so results should be treated as
+    read-only. The call runs in a task of its own: it survives any one waiter being
+    cancelled, and is only cancelled once every waiter has gone away. Keys are
+    forgotten as soon as their call finishes, so nothing is cached.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        # calls made, and requests that shared another request's call
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Returns the result of `fn()`, sharing a call already in flight for `key`."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # the last one waiting went away
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def report(self) -> str:
+        requests = self.calls + self.shared
+        share = self.shared / requests if requests else 0.0
+        return f"{requests} request(s), {self.calls} call(s) made, {self.shared} shared ({share:.0%})"
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.task.done() and not flight.task.cancelled():
+            # retrieved here too, so a failure nobody waited for isn't logged as unhandled
+            flight.task.exception()
+
+
+# shared by every session in the process
+llm_flights = SingleFlight()
+tool_flights = SingleFlight()
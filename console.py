@@ -0,0 +1,46 @@
+"""Non-blocking console input for the interactive CLI."""
+
+import asyncio
+import sys
+import threading
+
+
+class AsyncConsole:
+    """Reads stdin on a daemon thread, so the event loop keeps running while the user types.
+
+    Lines are handed to the loop through a queue; `readline` returns None on EOF or
+    after `close()`.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._lines: asyncio.Queue[str | None] = asyncio.Queue()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self) -> None:
+        for line in sys.stdin:
+            if not self._put(line.rstrip("\n")):
+                return
+        self._put(None)
+
+    def _put(self, line: str | None) -> bool:
+        try:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+            return True
+        except RuntimeError:
+            # the loop has been closed; nobody is listening anymore
+            return False
+
+    async def readline(self) -> str | None:
+        """Waits for the next line typed by the user."""
+        return await self._lines.get()
+
+    def close(self) -> None:
+        """Unblocks any pending `readline` with None."""
+        self._lines.put_nowait(None)
+
+    @staticmethod
+    def prompt(text: str) -> None:
+        """Prints a prompt without a trailing newline."""
+        print(text, end="", flush=True)
@@ -0,0 +1,289 @@
+"""Compact storage for chat histories, materializing `ChatMessage`s only when asked for."""
+
+import bisect
+import itertools
+import sys
+from array import array
+from typing import Any, Iterable, Iterator
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.base.llms.types import TextBlock
+from llama_index.core.utils import get_tokenizer
+
+# roles are stored as an index into this list; the high bit marks a message without content
+_ROLES = list(MessageRole)
+_ROLE_INDEX = {role: i for i, role in enumerate(_ROLES)}
+_NO_CONTENT = 0x80
+# not yet counted, in the token cache
+_UNCOUNTED = -1
+
+# message ids are unique across stores, so copies of a history can't be confused
+_message_ids = itertools.count()
+
+
+def count_tokens(text: str | None, tool_calls: Any = None) -> int:
+    """Roughly how many prompt tokens a message costs: its text and any tool calls."""
+    text = text or ""
+    if tool_calls:
+        text += str(tool_calls)
+    return len(get_tokenizer()(text))
+
+
+def count_message_tokens(message: ChatMessage) -> int:
+    return count_tokens(message.content, message.additional_kwargs.get("tool_calls"))
+
+
+class _Meta:
+    """The `additional_kwargs` of a message, for the few messages that have any."""
+
+    __slots__ = ("tool_call_id", "name", "tool_calls", "extra", "message")
+
+    def __init__(self, message: ChatMessage, keep_message: bool):
+        kwargs = dict(message.additional_kwargs)
+        self.tool_call_id = kwargs.pop("tool_call_id", None)
+        name = kwargs.pop("name", None)
+        # tool names repeat across a history
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        tool_calls = kwargs.pop("tool_calls", None)
+        # copied in and out, so neither the caller's list nor a reader's aliases ours
+        self.tool_calls = list(tool_calls) if tool_calls is not None else None
+        self.extra = kwargs or None
+        # messages with images and other non-text blocks are kept as they are
+        self.message = message if keep_message else None
+
+    def kwargs(self) -> dict[str, Any]:
+        kwargs = {}
+        if self.tool_call_id is not None:
+            kwargs["tool_call_id"] = self.tool_call_id
+        if self.name is not None:
+            kwargs["name"] = self.name
+        if self.tool_calls is not None:
+            kwargs["tool_calls"] = list(self.tool_calls)
+        if self.extra:
+            kwargs.update(self.extra)
+        return kwargs
+
+
+def _is_plain_text(message: ChatMessage) -> bool:
+    return len(message.blocks) <= 1 and all(
+        isinstance(block, TextBlock) for block in message.blocks
+    )
+
+
+class ConversationStore:
+    """A chat history kept in a few flat buffers instead of one pydantic object per message.
+
+    Roles are interned in a byte array, the text of all messages shares one UTF-8
+    buffer, and tool call metadata lives in slotted records for the messages that have
+    any. Token counts are computed once per message and cached. Indexing materializes
+    a fresh `ChatMessage`, so messages are values: changing one that was read back
+    doesn't change the store.
+
+    Supports the list operations the workflow uses (`len`, indexing, iteration,
+    `append`, `extend`, and deleting a contiguous range). Slicing returns a
+    `ConversationSlice` that reads through to the store instead of copying it.
+    """
+
+    def __init__(self, messages: Iterable[ChatMessage] = ()):
+        self._roles = array("B")
+        self._ends = array("Q")
+        self._content = bytearray()
+        self._meta: list[_Meta | None] = []
+        self._ids = array("Q")
+        self._tokens = array("i")
+        self.extend(messages)
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        for i in range(len(self)):
+            yield self.message(i)
+
+    def __getitem__(self, key: int | slice) -> "ChatMessage | ConversationSlice":
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Conversation slices can't have a step")
+            return ConversationSlice(self, self._id_at(start), self._id_at(stop))
+        return self.message(self._position(key))
+
+    def __delitem__(self, key: int | slice) -> None:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Conversation slices can't have a step")
+        else:
+            start = self._position(key)
+            stop = start + 1
+        if start >= stop:
+            return
+
+        first, last = self._start(start), self._ends[stop - 1]
+        del self._content[first:last]
+        for buffer in (self._roles, self._ends, self._meta, self._ids, self._tokens):
+            del buffer[start:stop]
+        shift = last - first
+        for i in range(start, len(self._ends)):
+            self._ends[i] -= shift
+
+    def __repr__(self) -> str:
+        return f"ConversationStore({len(self)} messages, {len(self._content)} bytes of text)"
+
+    def append(self, message: ChatMessage) -> None:
+        plain = _is_plain_text(message)
+        content = message.content if plain else None
+        role = _ROLE_INDEX[MessageRole(message.role)]
+        if content is None:
+            role |= _NO_CONTENT
+        else:
+            self._content += content.encode()
+        self._roles.append(role)
+        self._ends.append(len(self._content))
+        self._meta.append(
+            _Meta(message, keep_message=not plain)
+            if message.additional_kwargs or not plain
+            else None
+        )
+        self._ids.append(next(_message_ids))
+        self._tokens.append(_UNCOUNTED)
+
+    def extend(self, messages: Iterable[ChatMessage]) -> None:
+        if isinstance(messages, (ConversationStore, ConversationSlice)):
+            messages = list(messages)
+        for message in messages:
+            self.append(message)
+
+    def copy(self) -> "ConversationStore":
+        """An independent copy that shares the ids, so views of one carry over to the other."""
+        other = ConversationStore()
+        other._roles = array("B", self._roles)
+        other._ends = array("Q", self._ends)
+        other._content = bytearray(self._content)
+        other._meta = list(self._meta)
+        other._ids = array("Q", self._ids)
+        other._tokens = array("i", self._tokens)
+        return other
+
+    def message(self, i: int) -> ChatMessage:
+        """Materializes the message at position `i`."""
+        meta = self._meta[i]
+        if meta is not None and meta.message is not None:
+            # kept whole (e.g. images), so callers get a copy rather than the stored one
+            return meta.message.model_copy(deep=True)
+        return ChatMessage(
+            role=self.role(i),
+            content=self.content(i),
+            additional_kwargs=meta.kwargs() if meta is not None else {},
+        )
+
+    def role(self, i: int) -> MessageRole:
+        return _ROLES[self._roles[i] & ~_NO_CONTENT]
+
+    def content(self, i: int) -> str | None:
+        meta = self._meta[i]
+        if meta is not None and meta.message is not None:
+            return meta.message.content
+        if self._roles[i] & _NO_CONTENT:
+            return None
+        return self._content[self._start(i) : self._ends[i]].decode()
+
+    def tool_name(self, i: int) -> str | None:
+        meta = self._meta[i]
+        return meta.name if meta is not None else None
+
+    def tokens(self, i: int) -> int:
+        """Prompt tokens of the message at position `i`, counted on first use."""
+        tokens = self._tokens[i]
+        if tokens == _UNCOUNTED:
+            meta = self._meta[i]
+            tokens = count_tokens(
+                self.content(i), meta.tool_calls if meta is not None else None
+            )
+            self._tokens[i] = tokens
+        return tokens
+
+    def message_id(self, i: int) -> int:
+        """A stable id for the message at position `i`, kept when messages before it are removed."""
+        return self._ids[i]
+
+    def position(self, message_id: int) -> int | None:
+        """Where the message with `message_id` is now, or None if it's gone."""
+        i = bisect.bisect_left(self._ids, message_id)
+        if i < len(self._ids) and self._ids[i] == message_id:
+            return i
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the buffers, not counting tool call metadata."""
+        return sum(
+            buffer.itemsize * len(buffer)
+            for buffer in (self._roles, self._ends, self._ids, self._tokens)
+        ) + len(self._content)
+
+    def _start(self, i: int) -> int:
+        return self._ends[i - 1] if i else 0
+
+    def _position(self, i: int) -> int:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("conversation index out of range")
+        return i
+
+    def _id_at(self, i: int) -> int:
+        # the id a slice boundary at position `i` stands for; past the end means "open"
+        return self._ids[i] if i < len(self._ids) else sys.maxsize
+
+
+class ConversationSlice:
+    """A window onto a `ConversationStore`, e.g. its last few messages, without copying it.
+
+    The window is bounded by message ids, so it keeps covering the same messages when
+    older ones are trimmed from the store, and an open-ended one takes in new messages.
+    """
+
+    def __init__(self, store: ConversationStore, start_id: int, stop_id: int):
+        self.store = store
+        self.start_id = start_id
+        self.stop_id = stop_id
+
+    def _range(self) -> range:
+        ids = self.store._ids
+        return range(
+            bisect.bisect_left(ids, self.start_id),
+            bisect.bisect_left(ids, self.stop_id),
+        )
+
+    def __len__(self) -> int:
+        return len(self._range())
+
+    def __repr__(self) -> str:
+        return f"ConversationSlice({len(self)} messages)"
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        for i in self._range():
+            yield self.store.message(i)
+
+    def __getitem__(self, key: int | slice) -> "ChatMessage | ConversationSlice":
+        window = self._range()
+        positions = window[key]
+        if isinstance(key, slice):
+            if positions.step != 1:
+                raise ValueError("Conversation slices can't have a step")
+            if not positions:
+                return ConversationSlice(self.store, self.stop_id, self.stop_id)
+            stop = positions[-1] + 1
+            return ConversationSlice(
+                self.store,
+                self.store.message_id(positions[0]),
+                # a window that runs to the end of this one stays as open as it is
+                self.store._id_at(stop) if stop < window.stop else self.stop_id,
+            )
+        return self.store.message(positions)
+
+    def tokens(self) -> int:
+        """Prompt tokens of the messages in the window."""
+        return sum(self.store.tokens(i) for i in self._range())
@@ -0,0 +1,205 @@
+"""Per-agent views of the chat history, so each agent only pays for what it needs to see."""
+
+import bisect
+from array import array
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic import Field
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.llms import ChatMessage
+
+from conversation_store import ConversationStore, count_message_tokens
+
+dispatcher = get_dispatcher(__name__)
+
+# how much of another agent's last answer a handoff note keeps
+DEFAULT_NOTE_CHARS = 300
+
+
+class ConversationViewEvent(BaseEvent):
+    """Dispatched whenever an agent's view is handed to its LLM."""
+
+    agent_name: str
+    history_tokens: int
+    view_tokens: int
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ConversationViewEvent"
+
+
+class ViewSavingsHandler(BaseEventHandler):
+    """Adds up `ConversationViewEvent`s into a per-agent token savings report."""
+
+    # agent name -> [calls, history tokens, view tokens]
+    totals: dict[str, list[int]] = Field(default_factory=dict)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ViewSavingsHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        if isinstance(event, ConversationViewEvent):
+            totals = self.totals.setdefault(event.agent_name, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += event.history_tokens
+            totals[2] += event.view_tokens
+
+    def report(self) -> str:
+        lines = []
+        for agent_name, (calls, history_tokens, view_tokens) in self.totals.items():
+            saved = history_tokens - view_tokens
+            share = saved / history_tokens if history_tokens else 0.0
+            lines.append(
+                f"{agent_name}: {calls} call(s), {view_tokens}/{history_tokens} history tokens sent, {saved} saved ({share:.0%})"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class _Handoff:
+    """A run of another agent's messages, collapsed into one note."""
+
+    agent_name: str
+    tools: list[str] = field(default_factory=list)
+    answer: str = ""
+
+    def to_message(self, max_chars: int) -> ChatMessage:
+        note = f"[{self.agent_name} handled this"
+        if self.tools:
+            note += f" using {', '.join(self.tools)}"
+        note += "]"
+        if self.answer:
+            answer = self.answer
+            if len(answer) > max_chars:
+                answer = answer[:max_chars].rstrip() + "..."
+            note += f" {answer}"
+        return ChatMessage(role="assistant", content=note)
+
+
+@dataclass
+class _View:
+    # positions of history messages, and handoff notes
+    messages: list[int | ChatMessage] = field(default_factory=list)
+    tokens: int = 0
+    # how many history messages have been folded into this view
+    cursor: int = 0
+    # the note at the end of `messages`, while it can still grow
+    handoff: _Handoff | None = None
+
+
+class ConversationViews:
+    """Keeps one view of the chat history per agent, extended as messages are appended.
+
+    An agent sees the user's messages, shared assistant messages (e.g. from the
+    orchestrator) and its own messages and tool traffic in full. Everything another
+    agent did in between is collapsed into a short handoff note naming the agent, the
+    tools it used and the start of its last answer.
+
+    Messages an agent produces are attributed to it with `record` right after they're
+    appended to the history; any message that isn't is shared with every agent. Views
+    only fold in the messages added since they were last read; if the history was
+    rewound or trimmed from the front, they're rebuilt once from what's left.
+
+    Views refer to history messages by their id in the `ConversationStore`, so the
+    messages are only materialized when a view is handed out.
+    """
+
+    def __init__(self, max_note_chars: int = DEFAULT_NOTE_CHARS):
+        self.max_note_chars = max_note_chars
+        self.history_tokens = 0
+        self._ids = array("Q")
+        self._owners: list[str | None] = []
+        self._tokens = array("i")
+        self._views: dict[str, _View] = {}
+
+    def record(self, chat_history: ConversationStore, owner: str | None) -> None:
+        """Attributes the messages appended since the last call to `owner`.
+
+        `owner` is the agent that produced them; None shares them with every agent.
+        """
+        self._sync(chat_history)
+        for i in range(len(self._ids), len(chat_history)):
+            tokens = chat_history.tokens(i)
+            self._ids.append(chat_history.message_id(i))
+            self._owners.append(owner)
+            self._tokens.append(tokens)
+            self.history_tokens += tokens
+
+    def view(
+        self, agent_name: str, chat_history: ConversationStore
+    ) -> list[ChatMessage]:
+        """The history as `agent_name` should see it, reporting the tokens it saves."""
+        self.record(chat_history, None)
+        view = self._views.setdefault(agent_name, _View())
+        for i in range(view.cursor, len(self._ids)):
+            self._fold(view, agent_name, chat_history, i)
+        view.cursor = len(self._ids)
+
+        dispatcher.event(
+            ConversationViewEvent(
+                agent_name=agent_name,
+                history_tokens=self.history_tokens,
+                view_tokens=view.tokens,
+            )
+        )
+        return [
+            chat_history.message(m) if isinstance(m, int) else m for m in view.messages
+        ]
+
+    def _fold(
+        self, view: _View, agent_name: str, chat_history: ConversationStore, i: int
+    ) -> None:
+        owner = self._owners[i]
+        if owner is None or owner == agent_name:
+            view.handoff = None
+            view.messages.append(i)
+            view.tokens += self._tokens[i]
+            return
+
+        if view.handoff is None or view.handoff.agent_name != owner:
+            view.handoff = _Handoff(agent_name=owner)
+        else:
+            # replace the note that's still growing
+            view.tokens -= count_message_tokens(view.messages.pop())
+
+        role, tool_name = chat_history.role(i), chat_history.tool_name(i)
+        if role == "tool" and tool_name and tool_name not in view.handoff.tools:
+            view.handoff.tools.append(tool_name)
+        elif role == "assistant" and (content := chat_history.content(i)):
+            view.handoff.answer = content
+
+        note = view.handoff.to_message(self.max_note_chars)
+        view.messages.append(note)
+        view.tokens += count_message_tokens(note)
+
+    def _sync(self, chat_history: ConversationStore) -> None:
+        # while the recorded ids match the history position by position, views can
+        # refer to history messages by position
+        n = len(self._ids)
+        if n == 0 or (
+            len(chat_history) >= n and chat_history.message_id(n - 1) == self._ids[-1]
+        ):
+            return
+
+        # the history was rewound (e.g. a cancelled turn) or trimmed from the front
+        # (e.g. a memory token limit); keep what still lines up and rebuild the views
+        start = n
+        if len(chat_history):
+            start = bisect.bisect_left(self._ids, chat_history.message_id(0))
+        end = start
+        while (
+            end < n
+            and end - start < len(chat_history)
+            and chat_history.message_id(end - start) == self._ids[end]
+        ):
+            end += 1
+
+        self._ids = self._ids[start:end]
+        self._owners = self._owners[start:end]
+        self._tokens = self._tokens[start:end]
+        self.history_tokens = sum(self._tokens)
+        self._views.clear()
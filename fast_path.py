@@ -0,0 +1,97 @@
+"""Command grammars that let obvious requests run their tool without any LLM call."""
+
+import re
+from typing import Any, Callable, Iterable, NamedTuple
+
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+# politeness around a command doesn't change what it means
+_POLITE = re.compile(r"^(?:please|can you|could you)\s+|\s+please$", re.IGNORECASE)
+
+
+def normalize_utterance(text: str) -> str:
+    """`text` with whitespace collapsed and trailing punctuation and "please"s dropped."""
+    text = " ".join(text.split()).strip(" .!?")
+    return _POLITE.sub("", text).strip(" ,.!?")
+
+
+class Command(BaseModel):
+    """A request an agent can answer by running one tool, without its LLM.
+
+    `patterns` are regular expressions matched against the whole (normalized)
+    message, ignoring case; their named groups become the tool's arguments, on top
+    of the fixed `arguments`. An argument listed in `choices` has to be one of them
+    (in any case) and is passed in the spelling given there; `convert` turns the text
+    of the others into what the tool expects. The answer is `template`, formatted
+    with the tool's output as `result` and the arguments.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tool_name: str
+    patterns: list[str]
+    arguments: dict[str, Any] = Field(default_factory=dict)
+    choices: dict[str, list[str]] = Field(default_factory=dict)
+    convert: dict[str, Callable[[str], Any]] = Field(default_factory=dict)
+    template: str = "{result}"
+
+    _compiled: list[re.Pattern] = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._compiled = [re.compile(p, re.IGNORECASE) for p in self.patterns]
+
+    def parse(self, text: str) -> list[dict[str, Any]]:
+        """The tool arguments of every pattern `text` matches, which may disagree."""
+        parsed = []
+        for pattern in self._compiled:
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            kwargs = dict(self.arguments)
+            for name, value in match.groupdict().items():
+                if value is None:
+                    continue
+                value = " ".join(value.split())
+                if name in self.choices:
+                    value = next(
+                        (c for c in self.choices[name] if c.lower() == value.lower()),
+                        None,
+                    )
+                    if value is None:
+                        break
+                elif name in self.convert:
+                    value = self.convert[name](value)
+                kwargs[name] = value
+            else:
+                if kwargs not in parsed:
+                    parsed.append(kwargs)
+        return parsed
+
+    def render(self, result: str, tool_kwargs: dict[str, Any]) -> str:
+        return self.template.format(result=result, **tool_kwargs)
+
+
+class CommandMatch(NamedTuple):
+    agent_name: str
+    command: Command
+    tool_kwargs: dict[str, Any]
+
+
+def match_command(
+    user_msg: str, commands: dict[str, Iterable[Command]]
+) -> CommandMatch | None:
+    """The one command `user_msg` parses as, from the commands of each agent.
+
+    Returns None when it parses as no command, or as several (different tools, or the
+    same tool with different arguments), so anything ambiguous is left to the LLMs.
+    """
+    text = normalize_utterance(user_msg)
+    if not text:
+        return None
+    matches = [
+        CommandMatch(agent_name, command, kwargs)
+        for agent_name, agent_commands in commands.items()
+        for command in agent_commands
+        for kwargs in command.parse(text)
+    ]
+    return matches[0] if len(matches) == 1 else None
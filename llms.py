@@ -0,0 +1,241 @@
+"""Model tiers, fallback chains, and the pooled LLM clients they resolve to."""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from llama_index.core.base.llms.types import CompletionResponse
+from llama_index.core.llms import ChatMessage, ChatResponse, LLM
+from llama_index.core.tools import BaseTool, ToolSelection
+
+from coalescing import canonical_hash, llm_flights
+from tracing import traced
+
+# Each tier is configured through environment variables sharing a common prefix,
+# e.g. AZURE_OPENAI_FAST_ENGINE / AZURE_OPENAI_FAST_TEMPERATURE.
+# The endpoint, API key, and API version are shared by every tier.
+TIER_ENV_PREFIXES = {
+    "fast": "AZURE_OPENAI_FAST",
+    "standard": "AZURE_OPENAI",
+    "deep": "AZURE_OPENAI_O1_MINI",
+}
+DEFAULT_TEMPERATURES = {"fast": 0.4, "standard": 0.4, "deep": 0.2}
+
+
+class LLMPool:
+    """Lazily builds and caches one LLM client per tier, so every caller shares connections."""
+
+    def __init__(self) -> None:
+        self._llms: dict[str, LLM] = {}
+
+    def register(self, tier: str, llm: LLM) -> None:
+        """Registers (or replaces) the client used for a tier."""
+        self._llms[tier] = llm
+
+    def get(self, tier: str) -> LLM | None:
+        """Returns the pooled client for a tier, or None if the tier isn't configured."""
+        if tier not in self._llms:
+            llm = self._build(tier)
+            if llm is None:
+                return None
+            self._llms[tier] = llm
+        return self._llms[tier]
+
+    def _build(self, tier: str) -> LLM | None:
+        prefix = TIER_ENV_PREFIXES.get(tier)
+        if prefix is None or not os.getenv(f"{prefix}_ENGINE"):
+            return None
+
+        from llama_index.llms.azure_openai import AzureOpenAI
+
+        kwargs: dict[str, Any] = {
+            "engine": os.getenv(f"{prefix}_ENGINE"),
+            "temperature": float(
+                os.getenv(f"{prefix}_TEMPERATURE", DEFAULT_TEMPERATURES[tier])
+            ),
+            "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+            "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+            "api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+        }
+        if os.getenv(f"{prefix}_MAX_TOKENS"):
+            kwargs["max_tokens"] = int(os.getenv(f"{prefix}_MAX_TOKENS"))
+        return AzureOpenAI(**kwargs)
+
+
+llm_pool = LLMPool()
+
+# JSON schemas of tool arguments by their pydantic model, which is slow to render
+_tool_schemas: dict[Any, str] = {}
+
+
+def _tool_spec(tool: BaseTool) -> list[str]:
+    """What identifies a tool to the model: its name, description and argument schema."""
+    metadata = tool.metadata
+    schema = _tool_schemas.get(metadata.fn_schema)
+    if schema is None:
+        schema = _tool_schemas[metadata.fn_schema] = metadata.fn_schema_str
+    return [metadata.get_name(), metadata.description, schema]
+
+
+_active_pool: ContextVar[LLMPool | None] = ContextVar("active_llm_pool", default=None)
+
+
+@contextmanager
+def use_pool(pool: LLMPool) -> Iterator[LLMPool]:
+    """Resolves tier names through `pool` for everything started inside the block.
+
+    Workflows copy the current context when they start their step tasks, so a
+    `workflow.run(...)` issued inside the block keeps using `pool` for its whole run.
+    """
+    token = _active_pool.set(pool)
+    try:
+        yield pool
+    finally:
+        _active_pool.reset(token)
+
+
+def get_active_pool() -> LLMPool:
+    """Returns the pool installed by `use_pool`, or the process-wide default."""
+    return _active_pool.get() or llm_pool
+
+
+class ModelSpec(BaseModel):
+    """An ordered fallback chain of models.
+
+    Entries are either LLM instances or tier names resolved through the pool.
+    A later entry is tried when an earlier one raises or exceeds the latency budget.
+    The last available entry is never cut off by the budget. Identical requests to the
+    same model that are in flight at the same time share one call, unless `coalesce`
+    is off.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    chain: list[LLM | str]
+    latency_budget: float | None = None
+    coalesce: bool = True
+    # pins the spec to a pool; by default the active pool (see `use_pool`) is used
+    pool: LLMPool | None = Field(default=None, exclude=True)
+
+    @classmethod
+    def coerce(cls, llm: "LLM | ModelSpec") -> "ModelSpec":
+        """Wraps a bare LLM into a single-entry spec."""
+        if isinstance(llm, ModelSpec):
+            return llm
+        return cls(chain=[llm])
+
+    def resolve(self, default: LLM | None = None) -> list[LLM]:
+        """Returns the available LLMs in order, falling back to `default` if none are configured."""
+        pool = self.pool or get_active_pool()
+        llms = []
+        for entry in self.chain:
+            llm = pool.get(entry) if isinstance(entry, str) else entry
+            if llm is not None and all(llm is not other for other in llms):
+                llms.append(llm)
+        if not llms and default is not None:
+            llms.append(default)
+        if not llms:
+            raise ValueError(f"No LLM available for model chain {self.chain}")
+        return llms
+
+    async def achat_with_tool_calls(
+        self,
+        tools: list[BaseTool],
+        chat_history: list[ChatMessage],
+        default: LLM | None = None,
+        on_fallback: Callable[[str], None] | None = None,
+        **kwargs: Any,
+    ) -> tuple[ChatResponse, list[ToolSelection]]:
+        """Chats with tools and parses the tool calls with whichever model answered."""
+
+        async def call(llm: LLM) -> tuple[ChatResponse, list[ToolSelection]]:
+            response = await llm.achat_with_tools(
+                tools, chat_history=chat_history, **kwargs
+            )
+            tool_calls = llm.get_tool_calls_from_response(
+                response, error_on_no_tool_call=False
+            )
+            return response, tool_calls
+
+        key = None
+        if self.coalesce:
+            key = [
+                "chat_with_tools",
+                [_tool_spec(t) for t in tools],
+                chat_history,
+                kwargs,
+            ]
+
+        return await self._with_fallback(call, default, on_fallback, key)
+
+    async def acomplete(
+        self,
+        prompt: str,
+        default: LLM | None = None,
+        on_fallback: Callable[[str], None] | None = None,
+        **kwargs: Any,
+    ) -> CompletionResponse:
+        """Completes a prompt, falling back along the chain."""
+
+        async def call(llm: LLM) -> CompletionResponse:
+            return await llm.acomplete(prompt, **kwargs)
+
+        key = ["complete", prompt, kwargs] if self.coalesce else None
+        return await self._with_fallback(call, default, on_fallback, key)
+
+    async def _with_fallback(
+        self,
+        call: Callable[[LLM], Any],
+        default: LLM | None,
+        on_fallback: Callable[[str], None] | None,
+        key: Any = None,
+    ) -> Any:
+        """Tries `call` along the chain; with a `key`, identical requests in flight are shared."""
+        llms = self.resolve(default)
+        digest = canonical_hash(key) if key is not None else None
+        for i, llm in enumerate(llms):
+            is_last = i == len(llms) - 1
+            timeout = None if is_last else self.latency_budget
+            start = time.monotonic()
+            if digest is None:
+                request = call(llm)
+            else:
+                # the same client object means the same deployment and settings
+                request = llm_flights.do(
+                    f"{id(llm)}:{digest}", lambda llm=llm: call(llm)
+                )
+            try:
+                with traced("llm", _model_name(llm), "fallback" if i else ""):
+                    return await asyncio.wait_for(request, timeout=timeout)
+            except Exception as e:
+                if is_last:
+                    raise
+                if isinstance(e, asyncio.TimeoutError):
+                    reason = f"exceeded latency budget of {self.latency_budget}s"
+                else:
+                    reason = f"failed after {time.monotonic() - start:.1f}s: {e}"
+                if on_fallback is not None:
+                    on_fallback(
+                        f"Model {_model_name(llm)} {reason}; falling back to {_model_name(llms[i + 1])}"
+                    )
+
+
+def _model_name(llm: LLM) -> str:
+    return llm.metadata.model_name or type(llm).__name__
+
+
+# ---- Presets used by the agents ----
+
+# Routing and simple lookups: small, low-latency deployment first.
+FAST_MODEL = ModelSpec(chain=["fast", "standard"], latency_budget=10.0)
+
+# Reasoning-heavy agents: the main deployment, degrading to the fast one on errors.
+STANDARD_MODEL = ModelSpec(chain=["standard", "fast"], latency_budget=45.0)
+
+# Long-form analysis used by the deep thinking tools.
+DEEP_THINKING_MODEL = ModelSpec(chain=["deep", "standard"])
@@ -1,15 +1,29 @@
+import argparse
 import asyncio
+import itertools
 import os
+import signal
+import time
+from collections import deque
 from dotenv import load_dotenv
 
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.llms.azure_openai import AzureOpenAI
+from llama_index.core.workflow.errors import WorkflowCancelledByUser
 
+from cassettes import Cassette
+from console import AsyncConsole
+from llms import FAST_MODEL, get_active_pool, llm_pool, use_pool
+from session_log import SessionLog
+from tracing import TraceRecorder
 from workflow import (
+    AgentTimingEvent,
+    ApprovalsExpiredEvent,
     ConciergeAgent,
     ProgressEvent,
-    ToolRequestEvent,
     ToolApprovedEvent,
+    ToolBatchApprovedEvent,
+    ToolBatchRequestEvent,
+    ToolRequestEvent,
+    TurnCancelledEvent,
 )
 
 # Import agent-related functions from the new agents module
@@ -19,81 +33,210 @@ from agents import (
 )
 
 
-async def main():
-    """Main function to run the workflow."""
-    # Load environment variables from .env file
-    load_dotenv()
+EXIT_WORDS = ("exit", "quit", "bye")
+
+APPROVAL_HELP = (
+    "Answer with 'y' or 'n [reason]' (prefix with a number, or 'all', when several are pending)"
+)
+
+
+def parse_approval(line: str, pending: list[int]) -> tuple[list[int], bool, str | None] | None:
+    """Parses an approval answer like 'y', '2 n too risky' or 'all y'.
+
+    Returns (numbers, approved, reason), or None if the line isn't an approval answer.
+    """
+    words = line.split(maxsplit=2)
+    if not words:
+        return None
+    if words[0].lower() == "all":
+        numbers = list(pending)
+        words = words[1:]
+    elif words[0].isdigit():
+        if int(words[0]) not in pending:
+            return None
+        numbers = [int(words[0])]
+        words = words[1:]
+    elif len(pending) == 1:
+        numbers = list(pending)
+    else:
+        return None
 
+    if not words or words[0].lower() not in ("y", "yes", "n", "no"):
+        return None
+    approved = words[0].lower() in ("y", "yes")
+    reason = " ".join(words[1:]) or None
+    return numbers, approved, reason
+
+
+async def main(cassette: Cassette | None = None, tracer: TraceRecorder | None = None):
+    """Main function to run the workflow.
+
+    Input is read without blocking the event loop, so the user can type while a turn
+    streams, answer several pending approvals in any order, and press Ctrl-C to cancel
+    the turn in flight. Messages typed mid-turn are sent once the turn finishes.
+
+    With a recording cassette, every LLM call, approval, and user message is captured.
+    With a replaying cassette, they are all served from the recording instead.
+    With a tracer, sampled turns are recorded as traces of their steps, LLM and tool calls.
+    """
     from colorama import Fore, Style
 
-    
+    replaying = cassette is not None and cassette.mode == "replay"
+
     # Check if O1-mini configuration exists
     if os.getenv("AZURE_OPENAI_O1_MINI_ENGINE"):
         print(f"O1-MINI Configuration found ({os.getenv('AZURE_OPENAI_O1_MINI_ENGINE')}). Deep thinking capabilities enabled.")
     else:
         print(f"WARNING: O1-MINI Configuration not found. Deep thinking will use standard model: {os.getenv('AZURE_OPENAI_ENGINE')}")
+
+    # Check if a fast tier exists for routing and simple lookups
+    if os.getenv("AZURE_OPENAI_FAST_ENGINE"):
+        print(f"Fast model configuration found ({os.getenv('AZURE_OPENAI_FAST_ENGINE')}). Routing and lookups will use it.")
+
+    # Initialize primary LLM (pooled, shared with the agents' model chains)
+    llm = get_active_pool().get("standard")
+    if llm is None:
+        # the workflow and the session log both need it
+        raise SystemExit(
+            "The standard model tier is not configured: set AZURE_OPENAI_ENGINE "
+            "(or replay a cassette recorded with it)."
+        )
     
-    # Initialize primary LLM
-    llm = AzureOpenAI(
-        engine=os.getenv("AZURE_OPENAI_ENGINE"),
-        temperature=float(os.getenv("AZURE_OPENAI_TEMPERATURE", "0.4")),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-    )
-    
-    memory = ChatMemoryBuffer.from_defaults(llm=llm)
+    # the workflow appends each turn to the log and commits it when the turn finishes
+    session_log = SessionLog.from_llm(llm)
     initial_state = get_initial_state()
     agent_configs = get_agent_configs()
-    workflow = ConciergeAgent(timeout=None)
-
-    # Interactive chat loop
-    handler = workflow.run(
-        user_msg="Hello!",
-        agent_configs=agent_configs,
-        llm=llm,
-        chat_history=[],
-        initial_state=initial_state,
-    )
+    workflow = ConciergeAgent(timeout=None, orchestrator_llm=FAST_MODEL, tracer=tracer)
 
-    while True:
-        async for event in handler.stream_events():
-            if isinstance(event, ToolRequestEvent):
-                print(
-                    Fore.GREEN
-                    + "SYSTEM >> I need approval for the following tool call:"
-                    + Style.RESET_ALL
-                )
-                print(event.tool_name)
-                print(event.tool_kwargs)
-                
-                # Special handling for deep thinking operations
-                if event.tool_name == "deep_thinking_epic_definition":
-                    print(Fore.YELLOW + "\nThis is a deep thinking operation using the o1-mini model." + Style.RESET_ALL)
-                    print(Fore.YELLOW + "It will perform extensive analysis on the epic requirements." + Style.RESET_ALL)
-                print()
-
-                approved = input("Do you approve? (y/n): ")
-                if "y" in approved.lower():
-                    handler.ctx.send_event(
-                        ToolApprovedEvent(
-                            tool_id=event.tool_id,
-                            tool_name=event.tool_name,
-                            tool_kwargs=event.tool_kwargs,
-                            approved=True,
-                        )
+    ctx = None
+    handler = None
+    turn: asyncio.Task | None = None
+    cancelling: asyncio.Task | None = None
+    # approvals waiting on the user: number -> (batch id, request, time shown)
+    pending: dict[int, tuple[str, ToolRequestEvent, float]] = {}
+    numbers = itertools.count(1)
+    # messages typed while a turn was running
+    queued: deque[str] = deque()
+    idle_since = time.monotonic()
+
+    def show_prompt() -> None:
+        if pending:
+            AsyncConsole.prompt(f"Approve {', '.join(f'#{n}' for n in pending)}? ")
+        else:
+            AsyncConsole.prompt("USER >> ")
+
+    def record_approval(
+        request: ToolRequestEvent,
+        shown_at: float,
+        approved: bool,
+        reason: str | None,
+        timed_out: bool = False,
+    ) -> None:
+        if cassette is not None and not replaying:
+            cassette.record_approval(
+                request.tool_id,
+                request.tool_name,
+                request.tool_kwargs,
+                approved=approved,
+                reason=reason,
+                wait=time.monotonic() - shown_at,
+                timed_out=timed_out,
+            )
+
+    def decide(number: int, approved: bool, reason: str | None) -> None:
+        batch_id, request, shown_at = pending.pop(number)
+        record_approval(request, shown_at, approved, reason)
+        # decisions are sent one by one, so each approved tool starts right away
+        handler.ctx.send_event(
+            ToolBatchApprovedEvent(
+                batch_id=batch_id,
+                decisions=[
+                    ToolApprovedEvent(
+                        tool_id=request.tool_id,
+                        tool_name=request.tool_name,
+                        tool_kwargs=request.tool_kwargs,
+                        approved=approved,
+                        response=reason,
                     )
-                else:
-                    reason = input("Why not? (reason): ")
-                    handler.ctx.send_event(
-                        ToolApprovedEvent(
-                            tool_name=event.tool_name,
-                            tool_id=event.tool_id,
-                            tool_kwargs=event.tool_kwargs,
-                            approved=False,
-                            response=reason,
-                        )
+                ],
+            )
+        )
+
+    async def show_approvals(event: ToolBatchRequestEvent) -> None:
+        print(
+            Fore.GREEN
+            + f"SYSTEM >> I need approval for the following {len(event.requests)} tool call(s):"
+            + Style.RESET_ALL
+        )
+        if event.timeout is not None:
+            print(f"(pending calls are decided automatically after {event.timeout}s)")
+
+        for request in event.requests:
+            number = next(numbers)
+            pending[number] = (event.batch_id, request, time.monotonic())
+            print(f"#{number} {request.tool_name}")
+            print(request.tool_kwargs)
+
+            # Special handling for deep thinking operations
+            if request.tool_name == "deep_thinking_epic_definition":
+                print(Fore.YELLOW + "\nThis is a deep thinking operation using the o1-mini model." + Style.RESET_ALL)
+                print(Fore.YELLOW + "It will perform extensive analysis on the epic requirements." + Style.RESET_ALL)
+            print()
+
+        if replaying:
+            for number, (_, request, _) in list(pending.items()):
+                decision = await cassette.next_approval(
+                    request.tool_id, request.tool_name, request.tool_kwargs
+                )
+                # the replayed timeout may have decided it first, the same way
+                if number in pending:
+                    print(f"Approve #{number}? {'y' if decision['approved'] else 'n'} (replayed)")
+                    decide(number, decision["approved"], decision["reason"])
+        else:
+            print(APPROVAL_HELP)
+            show_prompt()
+
+    def expire_approvals(event: ApprovalsExpiredEvent) -> None:
+        # the timeout decided these, so they're recorded to be replayed the same way
+        for decision in event.decisions:
+            for number, (_, request, shown_at) in list(pending.items()):
+                if request.tool_id == decision.tool_id:
+                    del pending[number]
+                    record_approval(
+                        request,
+                        shown_at,
+                        decision.approved,
+                        decision.response,
+                        timed_out=True,
                     )
+        if not replaying:
+            show_prompt()
+
+    async def run_turn(user_msg: str) -> None:
+        nonlocal ctx, handler
+        if ctx is not None:
+            # nothing a finished (or cancelled) run left in its context reaches this one
+            ctx = await workflow.continue_from(ctx)
+        handler = workflow.run(
+            ctx=ctx,
+            user_msg=user_msg,
+            agent_configs=agent_configs,
+            llm=llm,
+            session_log=session_log,
+            initial_state=initial_state,
+        )
+        ctx = handler.ctx
+
+        async for event in handler.stream_events():
+            if isinstance(event, ToolBatchRequestEvent):
+                await show_approvals(event)
+            elif isinstance(event, AgentTimingEvent):
+                print(Fore.GREEN + f"SYSTEM >> {event.agent_name} answered in {event.duration:.1f}s" + Style.RESET_ALL)
+            elif isinstance(event, ApprovalsExpiredEvent):
+                print(Fore.GREEN + f"SYSTEM >> {event.msg}" + Style.RESET_ALL)
+                expire_approvals(event)
+            elif isinstance(event, TurnCancelledEvent):
+                print(Fore.GREEN + f"SYSTEM >> Turn cancelled: {event.reason}" + Style.RESET_ALL)
             elif isinstance(event, ProgressEvent):
                 # Special handling for deep thinking progress events
                 if "deep thinking" in event.msg.lower():
@@ -101,28 +244,158 @@ async def main():
                 else:
                     print(Fore.GREEN + f"SYSTEM >> {event.msg}" + Style.RESET_ALL)
 
-        result = await handler
+        try:
+            result = await handler
+        except WorkflowCancelledByUser:
+            # the next turn has to start from the rolled back state
+            if cancelling is not None:
+                await cancelling
+            return
+        finally:
+            # approvals of a finished (or cancelled) turn can't be answered anymore
+            pending.clear()
+
         print(Fore.BLUE + f"AGENT >> {result['response']}" + Style.RESET_ALL)
 
-        # update the memory with only the new chat history
-        for i, msg in enumerate(result["chat_history"]):
-            if i >= len(memory.get()):
-                memory.put(msg)
+    def start_turn(user_msg: str) -> None:
+        nonlocal turn
+        # recorded when its turn starts, so messages dropped by a cancel are never replayed
+        if cassette is not None and not replaying:
+            cassette.record_user_message(user_msg, wait=time.monotonic() - idle_since)
+        turn = asyncio.create_task(run_turn(user_msg))
+        turn.add_done_callback(on_turn_done)
 
-        user_msg = input("USER >> ")
-        if user_msg.strip().lower() in ["exit", "quit", "bye"]:
-            break
+    def on_turn_done(task: asyncio.Task) -> None:
+        nonlocal idle_since
+        if not task.cancelled() and task.exception() is not None:
+            print(Fore.RED + f"SYSTEM >> Turn failed: {task.exception()}" + Style.RESET_ALL)
+        idle_since = time.monotonic()
+        if queued:
+            user_msg = queued.popleft()
+            print(f"USER >> {user_msg}")
+            start_turn(user_msg)
+        elif not replaying:
+            show_prompt()
 
-        # pass in the existing context and continue the conversation
-        handler = workflow.run(
-            ctx=handler.ctx,
-            user_msg=user_msg,
-            agent_configs=agent_configs,
-            llm=llm,
-            chat_history=memory.get(),
-            initial_state=initial_state,
-        )
+    if replaying:
+        user_msg = await cassette.next_user_message()
+        while user_msg is not None and user_msg.strip().lower() not in EXIT_WORDS:
+            start_turn(user_msg)
+            await turn
+            user_msg = await cassette.next_user_message()
+            if user_msg is not None:
+                print(f"USER >> {user_msg}")
+        workflow.tool_outputs.close()
+        return
+
+    console = AsyncConsole()
+
+    def cancel_turn() -> asyncio.Task:
+        nonlocal cancelling
+        queued.clear()
+        cancelling = asyncio.ensure_future(workflow.cancel_turn(handler))
+        return cancelling
+
+    def on_interrupt() -> None:
+        if turn is not None and not turn.done():
+            # cancel the turn in flight; the chat itself keeps going
+            print()
+            cancel_turn()
+        else:
+            console.close()
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+    except NotImplementedError:
+        # e.g. on Windows, where Ctrl-C keeps raising KeyboardInterrupt
+        pass
+
+    start_turn("Hello!")
+
+    try:
+        while True:
+            line = await console.readline()
+            if line is None:
+                break
+            line = line.strip()
+            if not line:
+                continue
+
+            if pending:
+                answer = parse_approval(line, list(pending))
+                if answer is not None:
+                    approval_numbers, approved, reason = answer
+                    for number in approval_numbers:
+                        decide(number, approved, reason)
+                    continue
+
+            if line.lower() in EXIT_WORDS:
+                break
+
+            if turn is not None and not turn.done():
+                queued.append(line)
+                print("(queued, it will be sent when the current turn finishes)")
+            else:
+                start_turn(line)
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except NotImplementedError:
+            pass
+        if turn is not None and not turn.done():
+            await cancel_turn()
+            await asyncio.gather(turn, return_exceptions=True)
+        workflow.tool_outputs.close()
+
+
+async def run(args: argparse.Namespace):
+    """Wires up the optional cassette and runs the chat loop."""
+    # Load environment variables from .env file
+    load_dotenv()
+
+    cassette = None
+    if args.replay:
+        cassette = Cassette.load(args.replay, timing=args.timing)
+    elif args.record:
+        cassette = Cassette(mode="record")
+
+    tracer = TraceRecorder(sample_rate=args.trace_sample) if args.trace else None
+
+    pool = cassette.install(llm_pool) if cassette is not None else llm_pool
+    try:
+        with use_pool(pool):
+            await main(cassette, tracer)
+    finally:
+        if args.record:
+            cassette.save(args.record)
+            print(f"Session recorded to {args.record}")
+        if tracer is not None:
+            tracer.write_html(args.trace)
+            print(f"Trace of {len(tracer.traces)} turn(s) written to {args.trace}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Multi-agent concierge chat")
+    parser.add_argument(
+        "--record", metavar="PATH", help="record the session to a cassette file"
+    )
+    parser.add_argument(
+        "--replay", metavar="PATH", help="replay a recorded cassette offline"
+    )
+    parser.add_argument(
+        "--timing",
+        choices=["original", "max_speed"],
+        default="max_speed",
+        help="replay pacing: as recorded, or as fast as possible",
+    )
+    parser.add_argument(
+        "--trace", metavar="PATH", help="write a waterfall of the session's turns, e.g. trace.html"
+    )
+    parser.add_argument(
+        "--trace-sample",
+        type=float,
+        default=1.0,
+        help="share of turns to trace (default: all)",
+    )
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,58 @@
+"""Declarative preconditions on the user state, checked in code before agents and tools run."""
+
+from pydantic import BaseModel, ConfigDict
+
+from approvals import Condition
+
+
+class Precondition(BaseModel):
+    """Something the user state must satisfy, and the agent that can satisfy it."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # user state key that must be set to a truthy value
+    key: str
+    # agent to redirect to while the precondition doesn't hold
+    satisfied_by: str | None = None
+    # only checked before these tools run; None guards routing to the whole agent
+    tools: list[str] | None = None
+    # replaces the default check on `key`; called with (tool_kwargs, user_state)
+    condition: Condition | None = None
+    description: str | None = None
+
+    def holds(self, user_state: dict, tool_kwargs: dict | None = None) -> bool:
+        if self.condition is None:
+            return bool(user_state.get(self.key))
+        try:
+            return bool(self.condition(tool_kwargs or {}, user_state))
+        except Exception:
+            # a condition that can't be evaluated never holds
+            return False
+
+    def describe(self) -> str:
+        text = self.description or f"requires {self.key}"
+        if self.satisfied_by:
+            text += f" (handled by {self.satisfied_by})"
+        return text
+
+
+def unmet_preconditions(
+    preconditions: list[Precondition],
+    user_state: dict,
+    tool_name: str | None = None,
+    tool_kwargs: dict | None = None,
+) -> list[Precondition]:
+    """Returns the preconditions that don't hold.
+
+    Without a tool name, only the agent-wide preconditions are checked (for routing).
+    With one, the agent-wide ones and those scoped to that tool are.
+    """
+    return [
+        precondition
+        for precondition in preconditions
+        if (
+            precondition.tools is None
+            or (tool_name is not None and tool_name in precondition.tools)
+        )
+        and not precondition.holds(user_state, tool_kwargs)
+    ]
@@ -0,0 +1,190 @@
+"""Prompt layout that keeps the cacheable part of every LLM request stable."""
+
+import json
+import weakref
+from typing import Any, Iterable
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.llms import ChatMessage, ChatResponse
+
+from state_store import UserStateStore
+
+dispatcher = get_dispatcher(__name__)
+
+# caps on the rendered user state, in characters
+DEFAULT_MAX_VALUE_CHARS = 400
+DEFAULT_MAX_STATE_CHARS = 2000
+# strings nested in lists and dicts are shortened to this before a value is capped
+MAX_NESTED_STR_CHARS = 80
+STATE_HEADER = "Here is the current user state:"
+# stands in for the state in prompt templates that still have a {user_state_str} slot
+STATE_PLACEHOLDER = "(the current user state is given at the end of the conversation)"
+
+
+class PromptCacheEvent(BaseEvent):
+    """Dispatched for each LLM response that reports how much of its prompt was cached."""
+
+    agent_name: str
+    prompt_tokens: int
+    cached_tokens: int
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "PromptCacheEvent"
+
+
+def _usage_field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def prompt_cache_usage(response: ChatResponse) -> tuple[int, int] | None:
+    """(prompt tokens, cached prompt tokens) for a response, if the provider reports them."""
+    usage = _usage_field(response.raw, "usage")
+    prompt_tokens = _usage_field(usage, "prompt_tokens")
+    cached_tokens = _usage_field(
+        _usage_field(usage, "prompt_tokens_details"), "cached_tokens"
+    )
+    if prompt_tokens is None or cached_tokens is None:
+        return None
+    return prompt_tokens, cached_tokens
+
+
+def _compact(value: Any) -> Any:
+    # shortens long strings nested in containers, e.g. analyses stored on epics
+    if isinstance(value, str) and len(value) > MAX_NESTED_STR_CHARS:
+        return value[:MAX_NESTED_STR_CHARS].rstrip() + "..."
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(v) for v in value]
+    return value
+
+
+def _cap(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + f"... [{len(text) - max_chars} more characters]"
+
+
+class StateRenderer:
+    """Renders one store's user state a key at a time, re-rendering only changed keys.
+
+    A key's rendering is reused until its version in the store changes (or its value
+    is replaced without going through the store).
+    """
+
+    def __init__(self, max_value_chars: int):
+        self.max_value_chars = max_value_chars
+        # key -> (version, value, rendered line)
+        self._lines: dict[str, tuple[int, Any, str]] = {}
+        self.renders = 0
+
+    def line(self, store: UserStateStore, key: str) -> str:
+        value = store.data.get(key)
+        version = store.version_of(key)
+        cached = self._lines.get(key)
+        if cached is not None and cached[0] == version and cached[1] is value:
+            return cached[2]
+
+        self.renders += 1
+        if isinstance(value, (dict, list, tuple)):
+            text = json.dumps(_compact(value), default=str, ensure_ascii=False)
+        else:
+            text = str(value)
+        line = f"{key}: {_cap(text, self.max_value_chars)}"
+        self._lines[key] = (version, value, line)
+        return line
+
+    def render(
+        self, store: UserStateStore, keys: list[str] | None, max_chars: int
+    ) -> str:
+        """The state lines for `keys` (all keys when None), capped at `max_chars`."""
+        keys = list(store.data) if keys is None else keys
+        lines = [self.line(store, key) for key in keys if key in store.data]
+        return _cap("\n".join(lines), max_chars)
+
+
+class PromptBuilder:
+    """Lays out LLM input as a static system prompt, the history, then the user state.
+
+    The system prompt only holds what is fixed for an agent (its instructions, or the
+    orchestrator's agent roster), so the prompt prefix a provider caches survives
+    state changes. The state goes in a trailing system message, limited to the keys an
+    agent asks for and capped in size.
+    """
+
+    def __init__(
+        self,
+        max_value_chars: int = DEFAULT_MAX_VALUE_CHARS,
+        max_state_chars: int = DEFAULT_MAX_STATE_CHARS,
+    ):
+        self.max_value_chars = max_value_chars
+        self.max_state_chars = max_state_chars
+        # agent name -> [responses with usage, prompt tokens, cached prompt tokens]
+        self.cache_usage: dict[str, list[int]] = {}
+        # dropped along with their store, e.g. the branches of a fan-out
+        self._renderers: weakref.WeakKeyDictionary[
+            UserStateStore, StateRenderer
+        ] = weakref.WeakKeyDictionary()
+
+    def messages(
+        self,
+        system_prompt: str,
+        chat_history: Iterable[ChatMessage],
+        store: UserStateStore,
+        state_keys: list[str] | None = None,
+    ) -> list[ChatMessage]:
+        """The full LLM input: static prefix, history, and the state section if any."""
+        # materializes the history, if it's a ConversationStore
+        llm_input = [ChatMessage(role="system", content=system_prompt), *chat_history]
+        state_str = self.renderer(store).render(store, state_keys, self.max_state_chars)
+        if state_str:
+            llm_input.append(
+                ChatMessage(role="system", content=f"{STATE_HEADER}\n{state_str}")
+            )
+        return llm_input
+
+    def renderer(self, store: UserStateStore) -> StateRenderer:
+        """The renderer (and so the render cache) for a store."""
+        renderer = self._renderers.get(store)
+        if renderer is None:
+            renderer = StateRenderer(self.max_value_chars)
+            self._renderers[store] = renderer
+        return renderer
+
+    def record_usage(self, agent_name: str, response: ChatResponse) -> None:
+        """Counts how much of a response's prompt the provider served from its cache."""
+        usage = prompt_cache_usage(response)
+        if usage is None:
+            return
+        prompt_tokens, cached_tokens = usage
+        totals = self.cache_usage.setdefault(agent_name, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += prompt_tokens
+        totals[2] += cached_tokens
+        dispatcher.event(
+            PromptCacheEvent(
+                agent_name=agent_name,
+                prompt_tokens=prompt_tokens,
+                cached_tokens=cached_tokens,
+            )
+        )
+
+    def cache_report(self) -> str:
+        """Cached-prefix hit rates per agent, for providers that report them."""
+        lines = []
+        for agent_name, (
+            calls,
+            prompt_tokens,
+            cached_tokens,
+        ) in self.cache_usage.items():
+            rate = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+            lines.append(
+                f"{agent_name}: {cached_tokens}/{prompt_tokens} prompt tokens cached over {calls} call(s) ({rate:.0%})"
+            )
+        return "\n".join(lines)
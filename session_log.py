@@ -0,0 +1,89 @@
+"""An append-only log of one session's messages, which the workflow writes to directly."""
+
+import sys
+
+from llama_index.core.llms import LLM, MessageRole
+
+from conversation_store import ConversationSlice, ConversationStore
+
+# share of the model's context window the retained history may take, as ChatMemoryBuffer does
+DEFAULT_TOKEN_LIMIT_RATIO = 0.75
+
+
+class SessionLog:
+    """A session's chat history as an append-only log with committed offsets.
+
+    Pass it to `workflow.run(session_log=...)` instead of a `chat_history`: the turn
+    appends its messages to `history` as it goes, and they're committed when the turn
+    finishes. A cancelled or failed turn's messages are never committed and are
+    dropped again. Offsets count every message ever appended, so readers can keep
+    the offset they've read up to and fetch only what's new with `read(offset)`.
+
+    With a `token_limit`, the oldest messages are dropped on commit until the
+    rest fits, without changing the offsets of the ones that are kept.
+    """
+
+    def __init__(self, token_limit: int | None = None):
+        self.token_limit = token_limit
+        self.history = ConversationStore()
+        # offset of history[0]; everything before it was dropped
+        self.start_offset = 0
+        self.committed_offset = 0
+        self._committed_tokens = 0
+
+    @classmethod
+    def from_llm(cls, llm: LLM) -> "SessionLog":
+        """A log that keeps as much history as fits in a share of the llm's context window."""
+        return cls(
+            token_limit=int(llm.metadata.context_window * DEFAULT_TOKEN_LIMIT_RATIO)
+        )
+
+    @property
+    def end_offset(self) -> int:
+        """Offset after the last message, committed or not."""
+        return self.start_offset + len(self.history)
+
+    def commit(self) -> int:
+        """Commits everything appended so far and returns the new committed offset."""
+        for i in range(self.committed_offset - self.start_offset, len(self.history)):
+            self._committed_tokens += self.history.tokens(i)
+        self.committed_offset = self.end_offset
+        if self.token_limit is not None:
+            self._trim(self.token_limit)
+        return self.committed_offset
+
+    def rollback(self) -> None:
+        """Drops the messages appended since the last commit."""
+        del self.history[self.committed_offset - self.start_offset :]
+
+    def read(self, offset: int = 0) -> ConversationSlice:
+        """The committed messages from `offset` on, or from the oldest one still kept."""
+        start = max(offset, self.start_offset) - self.start_offset
+        stop = self.committed_offset - self.start_offset
+        if start >= stop:
+            return ConversationSlice(self.history, sys.maxsize, sys.maxsize)
+        # bounded by the last committed message, so later appends don't show up in it
+        return ConversationSlice(
+            self.history,
+            self.history.message_id(start),
+            self.history.message_id(stop - 1) + 1,
+        )
+
+    def _trim(self, token_limit: int) -> None:
+        # like ChatMemoryBuffer, never start on an assistant or tool message, since
+        # those answer something that was dropped
+        n = len(self.history)
+        drop, tokens = 0, self._committed_tokens
+        while tokens > token_limit and drop < n - 1:
+            tokens -= self.history.tokens(drop)
+            drop += 1
+            while drop < n - 1 and self.history.role(drop) in (
+                MessageRole.ASSISTANT,
+                MessageRole.TOOL,
+            ):
+                tokens -= self.history.tokens(drop)
+                drop += 1
+        if drop:
+            del self.history[:drop]
+            self.start_offset += drop
+            self._committed_tokens = tokens
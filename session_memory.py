@@ -0,0 +1,173 @@
+"""Memory accounting for sessions, quotas, and spilling idle sessions to disk."""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Iterable, NamedTuple
+
+from pydantic import BaseModel
+
+from sessions import ConciergeSession
+from workflow import SESSION_KEYS
+
+# counted as themselves: a pending future or task mostly holds on to things it shares
+_LEAVES = (str, bytes, bytearray, int, float, bool, type(None), asyncio.Future)
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+
+def approx_bytes(
+    value: Any, exclude: Iterable[Any] = (), seen: set[int] | None = None
+) -> int:
+    """Roughly how much memory `value` holds, following containers, models and objects.
+
+    Objects in `exclude` (and everything only reachable through them) aren't counted,
+    and neither is anything already in `seen`, so several calls sharing `seen` count
+    shared objects once. Functions and methods count as themselves only.
+    """
+    if seen is None:
+        seen = set()
+    seen.update(id(obj) for obj in exclude)
+    total = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, _LEAVES) or callable(obj):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _CONTAINERS):
+            stack.extend(obj)
+        elif isinstance(obj, BaseModel):
+            stack.extend(obj.__dict__.values())
+            stack.extend((obj.__pydantic_private__ or {}).values())
+        else:
+            stack.extend(getattr(obj, "__dict__", {}).values())
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return total
+
+
+class SessionUsage(NamedTuple):
+    """The bytes a session holds, by where they are."""
+
+    history: int
+    user_state: int
+    # the rest of what its context carries between turns, e.g. agent views and the
+    # state store's snapshots
+    context: int
+
+    @property
+    def total(self) -> int:
+        return self.history + self.user_state + self.context
+
+
+async def measure_session(session: ConciergeSession) -> SessionUsage:
+    """Accounts a session's memory, leaving out what it shares with other sessions."""
+    shared = [session.workflow, session.llm, session.agent_configs]
+    seen: set[int] = set()
+    history = approx_bytes(session.log, exclude=shared, seen=seen)
+    user_state = approx_bytes(session.user_state, seen=seen)
+    context = 0
+    if session.ctx is not None:
+        for key in SESSION_KEYS:
+            value = await session.ctx.get(key, default=None)
+            context += approx_bytes(value, exclude=shared, seen=seen)
+    return SessionUsage(history, user_state, context)
+
+
+@dataclass
+class MemoryQuota:
+    """Bounds on the memory of the sessions one process serves.
+
+    Above `soft_bytes`, idle sessions are spilled to disk, least recently used first,
+    until the rest fit. A turn that would start above `hard_bytes`, with nothing left
+    to spill, is refused. Sessions idle for `idle_seconds` are spilled whatever their
+    size. Any of them can be left unset.
+    """
+
+    soft_bytes: int | None = None
+    hard_bytes: int | None = None
+    idle_seconds: float | None = None
+
+
+class SpillStore:
+    """Checkpoints of idle sessions, kept on disk as gzipped pickles until they're needed.
+
+    Without a directory, a temporary one is created on the first write and removed
+    again by `close()`.
+    """
+
+    def __init__(self, directory: str | None = None, compresslevel: int = 6):
+        self._owns_directory = directory is None
+        self.directory = directory
+        self.compresslevel = compresslevel
+        # session id -> bytes on disk
+        self._sizes: dict[str, int] = {}
+        if directory is not None and os.path.isdir(directory):
+            # checkpoints left by an earlier process serving the same sessions
+            for name in os.listdir(directory):
+                if name.endswith(".pkl.gz"):
+                    path = os.path.join(directory, name)
+                    with gzip.open(path, "rb") as f:
+                        session_id = pickle.load(f)
+                    self._sizes[session_id] = os.path.getsize(path)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sizes
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    @property
+    def nbytes(self) -> int:
+        """Disk taken by the spilled checkpoints."""
+        return sum(self._sizes.values())
+
+    def put(self, session_id: str, checkpoint: dict[str, Any]) -> int:
+        """Writes a session's checkpoint and returns its size on disk."""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="spilled-sessions-")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id)
+        with gzip.open(path, "wb", compresslevel=self.compresslevel) as f:
+            pickle.dump(session_id, f)
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._sizes[session_id] = os.path.getsize(path)
+        return self._sizes[session_id]
+
+    def take(self, session_id: str) -> dict[str, Any] | None:
+        """Reads a session's checkpoint and removes it from disk, or None if it isn't here."""
+        if session_id not in self._sizes:
+            return None
+        path = self._path(session_id)
+        with gzip.open(path, "rb") as f:
+            pickle.load(f)
+            checkpoint = pickle.load(f)
+        os.remove(path)
+        del self._sizes[session_id]
+        return checkpoint
+
+    def close(self) -> None:
+        """Removes the spilled checkpoints, if the store created their directory."""
+        if self._owns_directory and self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._sizes.clear()
+
+    def _path(self, session_id: str) -> str:
+        name = hashlib.sha256(session_id.encode()).hexdigest()[:24]
+        return os.path.join(self.directory or "", f"{name}.pkl.gz")
@@ -0,0 +1,117 @@
+"""Long-lived conversations on top of the concierge workflow."""
+
+import asyncio
+from typing import Any, Literal
+
+from llama_index.core.llms import LLM, ChatMessage
+from llama_index.core.workflow import Context
+from llama_index.core.workflow.handler import WorkflowHandler
+
+from conversation_store import ConversationSlice
+from session_log import SessionLog
+from workflow import DEFAULT_CANCEL_STR, AgentConfig, ConciergeAgent
+
+PREEMPTED_STR = "Preempted by a newer message."
+
+
+class ConciergeSession:
+    """One user's conversation: the workflow context, chat history and state across turns.
+
+    `policy` decides what happens when a message arrives while a turn is still running:
+    "preempt" cancels that turn (rolling it back) so the newest message is answered,
+    "queue" lets it finish first.
+    """
+
+    def __init__(
+        self,
+        workflow: ConciergeAgent,
+        agent_configs: list[AgentConfig],
+        llm: LLM,
+        initial_state: dict | None = None,
+        policy: Literal["preempt", "queue"] = "preempt",
+    ):
+        self.workflow = workflow
+        self.agent_configs = agent_configs
+        self.llm = llm
+        # shared with every run, so tool updates carry over between turns
+        self.user_state = initial_state if initial_state is not None else {}
+        self.policy = policy
+        # turns append to the log and are committed when they finish
+        self.log = SessionLog()
+        self.ctx: Context | None = None
+        self.handler: WorkflowHandler | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a turn is currently running."""
+        return self.handler is not None and not self.handler.done()
+
+    async def send(self, user_msg: str) -> WorkflowHandler:
+        """Starts a turn for `user_msg`, applying the session policy to a running one."""
+        async with self._lock:
+            if self.handler is not None:
+                if self.policy == "preempt":
+                    await self.workflow.cancel_turn(self.handler, reason=PREEMPTED_STR)
+                else:
+                    await asyncio.gather(self.handler, return_exceptions=True)
+            if self.ctx is not None:
+                # nothing a finished run left in its context reaches the new one
+                self.ctx = await self.workflow.continue_from(self.ctx)
+
+            handler = self.workflow.run(
+                ctx=self.ctx,
+                user_msg=user_msg,
+                agent_configs=self.agent_configs,
+                llm=self.llm,
+                session_log=self.log,
+                initial_state=self.user_state,
+            )
+            self.ctx = handler.ctx
+            self.handler = handler
+            return handler
+
+    async def cancel(self, reason: str = DEFAULT_CANCEL_STR) -> bool:
+        """Cancels the running turn, if any, e.g. when the user walks away."""
+        async with self._lock:
+            if self.handler is None:
+                return False
+            return await self.workflow.cancel_turn(self.handler, reason=reason)
+
+    @property
+    def chat_history(self) -> ConversationSlice:
+        """The committed messages of the conversation."""
+        return self.log.read()
+
+    async def checkpoint(self) -> dict[str, Any]:
+        """What it takes to resume the conversation: the committed history, the user
+        state and the active speaker. Call it between turns."""
+        return {
+            "messages": [m.model_dump() for m in self.log.read()],
+            "user_state": self.user_state,
+            "active_speaker": (
+                await self.ctx.get("active_speaker", default=None)
+                if self.ctx is not None
+                else None
+            ),
+        }
+
+    @classmethod
+    async def restore(
+        cls,
+        checkpoint: dict[str, Any],
+        workflow: ConciergeAgent,
+        agent_configs: list[AgentConfig],
+        llm: LLM,
+        policy: Literal["preempt", "queue"] = "preempt",
+    ) -> "ConciergeSession":
+        """Resumes a conversation from `checkpoint`."""
+        session = cls(workflow, agent_configs, llm, checkpoint["user_state"], policy)
+        session.log.history.extend(
+            ChatMessage.model_validate(m) for m in checkpoint["messages"]
+        )
+        session.log.commit()
+        if checkpoint["active_speaker"] is not None:
+            session.ctx = Context(workflow)
+            await session.ctx.set("active_speaker", checkpoint["active_speaker"])
+        return session
@@ -0,0 +1,220 @@
+"""Versioned user state, safe to update from tools running in parallel."""
+
+import copy
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator
+
+from pydantic import BaseModel
+from llama_index.core.workflow import Context
+
+Path = str | tuple[str, ...]
+Updater = Callable[[Any], Any | Awaitable[Any]]
+
+
+class StateConflictError(Exception):
+    """Raised when an update keeps losing to concurrent writes."""
+
+
+class StateChange(BaseModel):
+    """One committed write: the path written and the new version of its top-level key."""
+
+    path: str
+    version: int
+    old: Any = None
+    new: Any = None
+
+
+def _split(path: Path) -> tuple[str, ...]:
+    return tuple(path.split(".")) if isinstance(path, str) else tuple(path)
+
+
+class UserStateStore:
+    """Wraps the user state dict with per-key versions and atomic updates.
+
+    Writes never mutate stored values in place: the value being updated is copied
+    before it's handed to the updater, and nested writes copy the containers along the
+    path. That keeps `snapshot()` a cheap shallow copy. The wrapped dict itself is
+    updated in place, so code reading `ctx.get("user_state")` sees every write.
+    """
+
+    def __init__(self, data: dict | None = None):
+        self.data = data if data is not None else {}
+        self.version = 0
+        self._versions: dict[str, int] = {}
+        self._listeners: list[Callable[[StateChange], None]] = []
+
+    def get(self, path: Path, default: Any = None) -> Any:
+        """Reads the value at a dotted path. Treat the result as read-only."""
+        value = self.data
+        for part in _split(path):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+    def version_of(self, key: str) -> int:
+        """The number of committed writes to a top-level key."""
+        return self._versions.get(key, 0)
+
+    async def update(self, path: Path, fn: Updater, max_retries: int = 5) -> Any:
+        """Atomically replaces the value at `path` with `fn(value)`.
+
+        `fn` gets a private copy it may mutate and return, and may be async. If another
+        write lands on the same top-level key while an async `fn` is awaiting, the
+        update is retried on the fresh value, so `fn` must be safe to run again.
+        The whole value is deep-copied: for one item of a long list, such as an epic,
+        use `update_item` or `append`.
+        """
+        parts = _split(path)
+        key = parts[0]
+        for _ in range(max_retries + 1):
+            version = self.version_of(key)
+            current = copy.deepcopy(self.get(parts))
+            new = fn(current)
+            if inspect.isawaitable(new):
+                new = await new
+            if self.version_of(key) == version:
+                self._commit(parts, new)
+                return new
+        raise StateConflictError(
+            f"Gave up updating {'.'.join(parts)} after {max_retries} conflicting writes"
+        )
+
+    async def update_item(
+        self,
+        path: Path,
+        item_id: str,
+        fn: Updater,
+        id_key: str = "id",
+        max_retries: int = 5,
+    ) -> Any:
+        """Atomically replaces the item of the list at `path` whose `id_key` is `item_id`.
+
+        Like `update`, but only that item is copied for `fn`, and the list is copied
+        shallowly around the result, so one write to a long list of epics doesn't copy
+        the others. Returns the new item, or None (writing nothing) if there's no such item.
+        """
+        parts = _split(path)
+        key = parts[0]
+        for _ in range(max_retries + 1):
+            version = self.version_of(key)
+            items = self.get(parts) or []
+            index = next(
+                (i for i, item in enumerate(items) if item.get(id_key) == item_id), None
+            )
+            if index is None:
+                return None
+            new = fn(copy.deepcopy(items[index]))
+            if inspect.isawaitable(new):
+                new = await new
+            if self.version_of(key) == version:
+                items = list(items)
+                items[index] = new
+                self._commit(parts, items)
+                return new
+        raise StateConflictError(
+            f"Gave up updating {item_id} in {'.'.join(parts)} after {max_retries} conflicting writes"
+        )
+
+    async def append(self, path: Path, make: Callable[[list], Any]) -> Any:
+        """Appends `make(items)` to the list at `path`, and returns it.
+
+        `make` sees the current items read-only (e.g. to number the new one) and must
+        not await, so nothing can be appended in between.
+        """
+        parts = _split(path)
+        items = self.get(parts) or []
+        new = make(items)
+        self._commit(parts, [*items, new])
+        return new
+
+    async def set(self, path: Path, value: Any) -> None:
+        """Writes a value at a dotted path."""
+        self._commit(_split(path), value)
+
+    async def merge(self, values: dict[str, Any]) -> None:
+        """Writes several top-level keys together, with no other write in between."""
+        for key, value in values.items():
+            self._commit((key,), value)
+
+    def snapshot(self) -> dict:
+        """A point-in-time copy of the state, cheap because values are never mutated."""
+        return dict(self.data)
+
+    def branch(self) -> "UserStateStore":
+        """A store over a snapshot of this one, whose writes can be merged back later."""
+        return UserStateStore(self.snapshot())
+
+    def written_keys(self) -> list[str]:
+        """The top-level keys written since this store was created."""
+        return list(self._versions)
+
+    def restore(self, snapshot: dict) -> None:
+        """Puts the state back to a snapshot, bumping the version of every changed key."""
+        for key in set(self.data) | set(snapshot):
+            if key not in snapshot:
+                self._commit((key,), None, delete=True)
+            elif self.data.get(key) is not snapshot[key]:
+                self._commit((key,), snapshot[key])
+
+    def subscribe(self, listener: Callable[[StateChange], None]) -> Callable[[], None]:
+        """Calls `listener` after every committed write. Returns an unsubscribe function."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def _commit(self, parts: tuple[str, ...], value: Any, delete: bool = False) -> None:
+        key = parts[0]
+        old = self.get(parts)
+        if delete:
+            self.data.pop(key, None)
+        else:
+            self.data[key] = self._assign(self.data.get(key), parts[1:], value)
+        self._versions[key] = self.version_of(key) + 1
+        self.version += 1
+
+        change = StateChange(
+            path=".".join(parts), version=self._versions[key], old=old, new=value
+        )
+        for listener in list(self._listeners):
+            listener(change)
+
+    def _assign(self, container: Any, parts: tuple[str, ...], value: Any) -> Any:
+        # copies each dict along the path instead of writing into it
+        if not parts:
+            return value
+        container = dict(container) if isinstance(container, dict) else {}
+        container[parts[0]] = self._assign(container.get(parts[0]), parts[1:], value)
+        return container
+
+
+# set while an agent runs on its own branch of the state (see `ConciergeAgent` fan-out)
+_branch_store: ContextVar[UserStateStore | None] = ContextVar(
+    "branch_store", default=None
+)
+
+
+@contextmanager
+def use_branch(store: UserStateStore) -> Iterator[UserStateStore]:
+    """Makes `get_state_store` return `store` within the block (and tasks started in it)."""
+    token = _branch_store.set(store)
+    try:
+        yield store
+    finally:
+        _branch_store.reset(token)
+
+
+async def get_state_store(ctx: Context) -> UserStateStore:
+    """Returns the store for a workflow's user state, for use inside tools."""
+    store = _branch_store.get()
+    if store is not None:
+        return store
+
+    store = await ctx.get("state_store", default=None)
+    if store is None:
+        # e.g. a tool called outside of ConciergeAgent
+        store = UserStateStore(await ctx.get("user_state", default={}))
+        await ctx.set("state_store", store)
+        await ctx.set("user_state", store.data)
+    return store
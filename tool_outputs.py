@@ -0,0 +1,130 @@
+"""Out-of-band storage for large tool outputs, referenced from the chat history by handle."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+from llama_index.core.workflow import Context
+
+from utils import FunctionToolWithContext
+
+# outputs longer than this (in characters) are stored and replaced by a preview
+DEFAULT_THRESHOLD = 2000
+DEFAULT_PREVIEW_CHARS = 500
+# longest page `read_tool_output` returns at once
+MAX_PAGE_CHARS = 2000
+
+
+def preview(text: str, max_chars: int = 200) -> str:
+    """The start of `text`, marked as cut if it's longer than `max_chars`."""
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + f"... [{len(text) - max_chars} more characters]"
+
+
+class ToolOutputStore:
+    """Keeps tool outputs above a size threshold on disk instead of in the history.
+
+    Outputs are stored under a handle derived from their content, so an output that
+    comes back twice is stored once. Without a directory, a temporary one is created
+    on the first write and removed again by `close()`.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        threshold: int = DEFAULT_THRESHOLD,
+        preview_chars: int = DEFAULT_PREVIEW_CHARS,
+    ):
+        self._owns_directory = directory is None
+        self.directory = directory
+        self.threshold = threshold
+        self.preview_chars = preview_chars
+        self._sizes: dict[str, int] = {}
+
+    def put(self, content: str) -> str:
+        """Stores an output and returns its handle."""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="tool-outputs-")
+        os.makedirs(self.directory, exist_ok=True)
+        handle = hashlib.sha256(content.encode()).hexdigest()[:16]
+        path = self._path(handle)
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        self._sizes[handle] = len(content)
+        return handle
+
+    def read(self, handle: str, offset: int = 0, length: int = MAX_PAGE_CHARS) -> str:
+        """Returns `length` characters of a stored output, starting at `offset`."""
+        path = self._path(handle)
+        if self.directory is None or not os.path.exists(path):
+            raise ValueError(f"No stored tool output with handle {handle}")
+        with open(path, encoding="utf-8") as f:
+            f.read(max(offset, 0))
+            return f.read(max(length, 0))
+
+    def path(self, handle: str) -> str:
+        """Where a stored output is on disk, e.g. to hand a saved artifact to the user."""
+        return self._path(handle)
+
+    def size(self, handle: str) -> int:
+        """The length of a stored output, in characters."""
+        if handle not in self._sizes:
+            with open(self._path(handle), encoding="utf-8") as f:
+                self._sizes[handle] = len(f.read())
+        return self._sizes[handle]
+
+    def wrap(self, content: str) -> str:
+        """`content` itself if it's short; otherwise a preview plus the handle to the rest."""
+        if len(content) <= self.threshold:
+            return content
+        handle = self.put(content)
+        return (
+            content[: self.preview_chars]
+            + f"\n[Output truncated: showing {self.preview_chars} of {len(content)} characters. "
+            + f'Call read_tool_output(handle="{handle}", offset={self.preview_chars}) to read more.]'
+        )
+
+    def close(self) -> None:
+        """Removes the stored outputs, if the store created their directory."""
+        if self._owns_directory and self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._sizes.clear()
+
+    def _path(self, handle: str) -> str:
+        if not handle.isalnum():
+            raise ValueError(f"Invalid tool output handle {handle!r}")
+        return os.path.join(self.directory or "", f"{handle}.txt")
+
+
+async def get_tool_output_store(ctx: Context) -> ToolOutputStore:
+    """Returns the workflow's tool output store, e.g. for tools that save artifacts."""
+    store = await ctx.get("tool_outputs", default=None)
+    if store is None:
+        # e.g. a tool called outside of ConciergeAgent
+        store = ToolOutputStore()
+        await ctx.set("tool_outputs", store)
+    return store
+
+
+async def read_tool_output(
+    ctx: Context, handle: str, offset: int = 0, length: int = MAX_PAGE_CHARS
+) -> str:
+    """Reads part of a tool output that was too long to show in full.
+
+    Pass the handle from the truncated output, and the offset to continue from.
+    """
+    store = await get_tool_output_store(ctx)
+    length = min(length, MAX_PAGE_CHARS)
+    page = store.read(handle, offset, length)
+    total = store.size(handle)
+    end = offset + len(page)
+    if end < total:
+        page += f'\n[Characters {offset}-{end} of {total}. Call read_tool_output(handle="{handle}", offset={end}) for more.]'
+    return page
+
+
+read_tool_output_tool = FunctionToolWithContext.from_defaults(async_fn=read_tool_output)
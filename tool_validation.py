@@ -0,0 +1,234 @@
+"""Checks tool arguments before a tool runs, repairing the mistakes that have one obvious fix."""
+
+import difflib
+import re
+import types
+from typing import Any, Callable, Literal, NamedTuple, Union, get_args, get_origin
+
+from pydantic import ValidationError
+from llama_index.core.tools import BaseTool
+
+# the allowed values of an argument, from the user state and the call's other arguments
+ChoicesFn = Callable[[dict, dict], list[str]]
+
+# how close a misspelled argument name or value has to be to count as a typo
+NAME_CUTOFF = 0.75
+CHOICE_CUTOFF = 0.8
+# allowed values listed in an error
+MAX_LISTED_CHOICES = 10
+
+# currency signs and spaces in numbers written as text
+_NUMBER_NOISE = re.compile(r"[\s$€£]")
+# commas are only dropped as thousands separators; "1,5" could mean 1.5 or 15
+_THOUSANDS = re.compile(r"^-?\d{1,3}(,\d{3})+(\.\d+)?$")
+
+
+def _normalize(value: str) -> str:
+    return re.sub(r"[\W_]+", "", value).lower()
+
+
+def _digits(value: str) -> str:
+    return re.sub(r"\D", "", value).lstrip("0")
+
+
+def match_choice(value: str, choices: list[str]) -> str | None:
+    """The choice `value` unambiguously stands for, ignoring case and punctuation.
+
+    "in progress" matches "In Progress", "epic 3" and "3" match "EPIC-3", and a
+    close misspelling matches if no other choice is as close. Misspellings never
+    change the digits, so "EPIC-12" doesn't match "EPIC-1". Returns None otherwise.
+    """
+    if value in choices:
+        return value
+    key = _normalize(value)
+    by_key = {_normalize(choice): choice for choice in choices}
+    if key in by_key:
+        return by_key[key]
+    if key.isdigit():
+        # a bare number, for ids like EPIC-3
+        numbered = [c for c in choices if _digits(c) == _digits(key)]
+        if len(numbered) == 1:
+            return numbered[0]
+        return None
+    # an id with other digits is another id, however close it's spelled
+    same_digits = [k for k in by_key if _digits(k) == _digits(key)]
+    close = difflib.get_close_matches(key, same_digits, n=2, cutoff=CHOICE_CUTOFF)
+    if len(close) == 1 or (
+        len(close) == 2
+        and difflib.SequenceMatcher(None, key, close[0]).ratio()
+        > difflib.SequenceMatcher(None, key, close[1]).ratio()
+    ):
+        return by_key[close[0]]
+    return None
+
+
+def _literal_choices(annotation: Any) -> list[str] | None:
+    # Literal["a", "b"], possibly optional
+    if get_origin(annotation) in (Union, types.UnionType):
+        for arg in get_args(annotation):
+            choices = _literal_choices(arg)
+            if choices is not None:
+                return choices
+        return None
+    if get_origin(annotation) is Literal:
+        return [arg for arg in get_args(annotation) if isinstance(arg, str)]
+    return None
+
+
+def _accepts(annotation: Any, kind: type) -> bool:
+    if get_origin(annotation) in (Union, types.UnionType):
+        return any(_accepts(arg, kind) for arg in get_args(annotation))
+    return annotation is kind
+
+
+def _is_number(annotation: Any) -> bool:
+    return _accepts(annotation, int) or _accepts(annotation, float)
+
+
+def _listed(choices: list[str]) -> str:
+    listed = ", ".join(choices[:MAX_LISTED_CHOICES])
+    if len(choices) > MAX_LISTED_CHOICES:
+        listed += f" (and {len(choices) - MAX_LISTED_CHOICES} more)"
+    return listed
+
+
+class CheckedArguments(NamedTuple):
+    kwargs: dict[str, Any]
+    # what was changed, e.g. "new_status: 'done' -> 'Done'"
+    repairs: list[str]
+    # what couldn't be fixed; the tool shouldn't run
+    errors: list[str]
+
+    def error_message(self, tool_name: str) -> str:
+        return (
+            f"Invalid arguments for {tool_name}:\n"
+            + "\n".join(f"- {error}" for error in self.errors)
+            + "\nFix them and call the tool again."
+        )
+
+
+class ArgumentValidator:
+    """Checks tool arguments against the tool's `fn_schema` before it runs.
+
+    Mistakes with one obvious fix are repaired: misspelled argument names, the case
+    or spelling of a `Literal` value, numbers sent as text (including "$1,000", but
+    not "1,5"), and values of arguments a tool lists in `argument_choices` (e.g. epic
+    ids taken from the user state). Anything else is reported argument by argument, so the model
+    can fix all of it in one go. Counts are kept for `report`.
+    """
+
+    def __init__(self):
+        self.checked = 0
+        self.repaired = 0
+        self.rejected = 0
+
+    def check(
+        self, tool: BaseTool, kwargs: dict[str, Any], user_state: dict
+    ) -> CheckedArguments:
+        """Returns the (repaired) arguments to call `tool` with, or what's wrong with them."""
+        fn_schema = tool.metadata.fn_schema
+        if fn_schema is None:
+            return CheckedArguments(kwargs, [], [])
+        self.checked += 1
+        fields = fn_schema.model_fields
+        kwargs = dict(kwargs)
+        renames: list[str] = []
+        # argument -> (value sent, repaired value)
+        changed: dict[str, tuple[Any, Any]] = {}
+        errors: list[str] = []
+
+        def repair(name: str, value: Any) -> None:
+            changed[name] = (changed.get(name, (kwargs[name],))[0], value)
+            kwargs[name] = value
+
+        for name in [name for name in kwargs if name not in fields]:
+            unused = [field for field in fields if field not in kwargs]
+            close = difflib.get_close_matches(name, unused, n=1, cutoff=NAME_CUTOFF)
+            if close:
+                kwargs[close[0]] = kwargs.pop(name)
+                renames.append(f"{name} -> {close[0]}")
+            else:
+                kwargs.pop(name)
+                errors.append(
+                    f"{name}: not an argument; expected {_listed(list(fields))}"
+                )
+
+        for name, value in list(kwargs.items()):
+            annotation = fields[name].annotation
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # e.g. an id sent as a number
+                if _accepts(annotation, str) and not _is_number(annotation):
+                    repair(name, str(value))
+                continue
+            if not isinstance(value, str):
+                continue
+            choices = _literal_choices(annotation)
+            if choices is not None and value not in choices:
+                match = match_choice(value, choices)
+                if match is None:
+                    errors.append(f"{name}: {value!r} is not one of {_listed(choices)}")
+                else:
+                    repair(name, match)
+            elif _is_number(annotation):
+                number = _NUMBER_NOISE.sub("", value)
+                if "," in number:
+                    if not _THOUSANDS.match(number):
+                        errors.append(
+                            f"{name}: {value!r} is ambiguous; send a plain number like 1500 or 1.5"
+                        )
+                        continue
+                    number = number.replace(",", "")
+                if number != value:
+                    repair(name, number)
+
+        # everything wrong is reported at once, without repeating the arguments found above
+        reported = {error.split(":", 1)[0] for error in errors}
+        try:
+            model = fn_schema.model_validate(kwargs)
+        except ValidationError as e:
+            for error in e.errors():
+                location = ".".join(str(part) for part in error["loc"]) or "arguments"
+                if error["loc"] and str(error["loc"][0]) in reported:
+                    continue
+                got = f" (got {error['input']!r})" if error["type"] != "missing" else ""
+                errors.append(f"{location}: {error['msg']}{got}")
+        else:
+            for name, value in list(kwargs.items()):
+                coerced = getattr(model, name)
+                # only plain values are replaced; nested models are checked, not converted
+                if isinstance(coerced, (str, int, float, bool)) and coerced != value:
+                    repair(name, coerced)
+
+        # allowed values that depend on the state, once the other arguments are sound
+        argument_choices: dict[str, ChoicesFn] = (
+            getattr(tool, "argument_choices", None) or {}
+        )
+        for name, choices_fn in argument_choices.items():
+            value = kwargs.get(name)
+            if errors or not isinstance(value, str):
+                continue
+            choices = choices_fn(user_state, kwargs)
+            if not choices or value in choices:
+                continue
+            match = match_choice(value, choices)
+            if match is None:
+                errors.append(f"{name}: {value!r} is not one of {_listed(choices)}")
+            else:
+                repair(name, match)
+
+        repairs = renames + [
+            f"{name}: {sent!r} -> {value!r}" for name, (sent, value) in changed.items()
+        ]
+        if errors:
+            self.rejected += 1
+        elif repairs:
+            self.repaired += 1
+        return CheckedArguments(kwargs, repairs, errors)
+
+    def report(self) -> str:
+        invalid = self.repaired + self.rejected
+        rate = self.repaired / invalid if invalid else 0.0
+        return (
+            f"{self.checked} tool call(s) checked, {self.checked - invalid} valid, "
+            f"{self.repaired} repaired, {self.rejected} rejected (repair rate {rate:.0%})"
+        )
@@ -0,0 +1,386 @@
+"""Per-turn execution traces of the workflow, rendered as a self-contained HTML waterfall."""
+
+import html
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Iterable, Iterator
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.span import BaseSpan
+from llama_index.core.instrumentation.span_handlers import BaseSpanHandler
+from llama_index.core.workflow import Event, Workflow
+from llama_index.core.workflow.utils import get_steps_from_class
+
+# spans kept per trace; a runaway turn stops recording instead of growing without bound
+MAX_SPANS = 2000
+# spans taking at least this share of their turn are highlighted as slow
+SLOW_SHARE = 0.25
+
+KIND_COLORS = {
+    "step": "#4e79a7",
+    "llm": "#f28e2b",
+    "tool": "#59a14f",
+    "approval": "#bab0ac",
+}
+
+
+class Span:
+    __slots__ = ("kind", "name", "start", "end", "detail")
+
+    def __init__(self, kind: str, name: str, start: float, detail: str = ""):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end: float | None = None
+        self.detail = detail
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+
+class Trace:
+    """What happened during one turn: timed spans and instant marks, on the monotonic clock."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.spans: list[Span] = []
+        # (time, kind, name, detail) of things without a duration, e.g. events sent
+        self.marks: list[tuple[float, str, str, str]] = []
+        self.dropped = 0
+        # spans started in one step and finished in another, e.g. approval waits
+        self._open: dict[str, Span] = {}
+
+    def begin(
+        self, kind: str, name: str, detail: str = "", key: str | None = None
+    ) -> Span | None:
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = Span(kind, name, time.perf_counter(), detail)
+        self.spans.append(span)
+        if key is not None:
+            self._open[key] = span
+        return span
+
+    def finish(self, key: str, detail: str | None = None) -> None:
+        span = self._open.pop(key, None)
+        if span is not None:
+            span.end = time.perf_counter()
+            if detail is not None:
+                span.detail = detail
+
+    def mark(self, kind: str, name: str, detail: str = "") -> None:
+        if len(self.marks) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.marks.append((time.perf_counter(), kind, name, detail))
+
+    def close(self) -> None:
+        self.end = time.perf_counter()
+        for span in self.spans:
+            if span.end is None:
+                span.end = self.end
+                span.detail = f"{span.detail} (unfinished)".strip()
+        self._open.clear()
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+# the trace of the turn the current task belongs to; workflow steps inherit it
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def traced(kind: str, name: str, detail: str = "") -> Iterator[None]:
+    """Records the block as a span of the current turn's trace, if it's being traced."""
+    trace = _current_trace.get()
+    span = trace.begin(kind, name, detail) if trace is not None else None
+    try:
+        yield
+    except BaseException as e:
+        if span is not None:
+            span.detail = f"{span.detail} ({type(e).__name__})".strip()
+        raise
+    finally:
+        if span is not None:
+            span.end = time.perf_counter()
+
+
+def mark(kind: str, name: str, detail: str = "") -> None:
+    """Records an instant in the current turn's trace, if it's being traced."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(kind, name, detail)
+
+
+def begin(kind: str, name: str, key: str, detail: str = "") -> None:
+    """Starts a span another step will finish with `finish(key)`."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.begin(kind, name, detail, key=key)
+
+
+def finish(key: str, detail: str | None = None) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.finish(key, detail)
+
+
+@lru_cache(maxsize=None)
+def _step_names(workflow_class: type) -> frozenset[str]:
+    return frozenset(
+        name for name in get_steps_from_class(workflow_class) if name != "_done"
+    )
+
+
+class StepSpanHandler(BaseSpanHandler[BaseSpan]):
+    """Records workflow step runs into the current trace, from llama-index's step spans.
+
+    Every step already runs inside a dispatcher span; this handler only looks at the
+    ones of traced turns, so untraced turns cost one context variable lookup per step.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StepSpanHandler"
+
+    def span_enter(
+        self,
+        id_: str,
+        bound_args: Any,
+        instance: Any = None,
+        parent_id: str | None = None,
+        tags: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        trace = _current_trace.get()
+        if trace is None or not isinstance(instance, Workflow):
+            return
+        # ids are "<qualname>-<uuid4>"
+        name = id_[:-37].rsplit(".", 1)[-1]
+        if name not in _step_names(type(instance)):
+            return
+        arguments = bound_args.arguments.values() if bound_args is not None else ()
+        event = next((value for value in arguments if isinstance(value, Event)), None)
+        detail = type(event).__name__ if event is not None else ""
+        trace.begin("step", name, detail, key=id_)
+
+    def span_exit(
+        self,
+        id_: str,
+        bound_args: Any,
+        instance: Any = None,
+        result: Any = None,
+        **kwargs: Any,
+    ) -> None:
+        trace = _current_trace.get()
+        if trace is None or id_ not in trace._open:
+            return
+        detail = trace._open[id_].detail
+        if result is not None:
+            detail = f"{detail} -> {type(result).__name__}"
+        trace.finish(id_, detail)
+
+    def span_drop(
+        self,
+        id_: str,
+        bound_args: Any,
+        instance: Any = None,
+        err: BaseException | None = None,
+        **kwargs: Any,
+    ) -> None:
+        trace = _current_trace.get()
+        if trace is None or id_ not in trace._open:
+            return
+        trace.finish(id_, f"{trace._open[id_].detail} ({type(err).__name__})")
+
+    def new_span(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def prepare_to_exit_span(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def prepare_to_drop_span(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+_step_handler: StepSpanHandler | None = None
+
+
+def _instrument() -> None:
+    """Attaches the step handler to the root dispatcher, once per process."""
+    global _step_handler
+    if _step_handler is None:
+        _step_handler = StepSpanHandler()
+        get_dispatcher().add_span_handler(_step_handler)
+
+
+class TraceRecorder:
+    """Samples turns for tracing and keeps the most recent traces.
+
+    A turn is traced with probability `sample_rate`; untraced turns only pay for a
+    context variable lookup at each step, LLM call and tool call. The last
+    `max_traces` traces are kept for `write_html`.
+    """
+
+    def __init__(
+        self, sample_rate: float = 1.0, max_traces: int = 100, seed: int | None = None
+    ):
+        self.sample_rate = sample_rate
+        self.traces: deque[Trace] = deque(maxlen=max_traces)
+        self._random = random.Random(seed)
+        _instrument()
+
+    @contextmanager
+    def turn(self, label: str = "") -> Iterator[Trace | None]:
+        """Makes everything started inside the block part of one sampled trace.
+
+        Workflow steps are tasks created when a run starts, so starting the run
+        inside the block is enough. The caller closes the trace with `Trace.close()`
+        when the run is done, as `ConciergeAgent.run` does.
+        """
+        trace = None
+        if self.sample_rate >= 1.0 or self._random.random() < self.sample_rate:
+            trace = Trace(label)
+            self.traces.append(trace)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def write_html(self, path: str, traces: Iterable[Trace] | None = None) -> None:
+        """Writes a waterfall of `traces` (all the kept ones by default) to `path`."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_html(list(self.traces if traces is None else traces)))
+
+
+def _peak_concurrency(spans: list[Span]) -> int:
+    edges = sorted(
+        [(span.start, 1) for span in spans] + [(span.end, -1) for span in spans],
+        key=lambda edge: (edge[0], edge[1]),
+    )
+    peak = running = 0
+    for _, delta in edges:
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def _render_trace(index: int, trace: Trace) -> str:
+    total = trace.duration or 1e-9
+
+    def left(t: float) -> float:
+        return max(0.0, (t - trace.start) / total * 100)
+
+    summary = []
+    by_name: dict[tuple[str, str], list[Span]] = {}
+    for span in trace.spans:
+        by_name.setdefault((span.kind, span.name), []).append(span)
+    for kind in KIND_COLORS:
+        spans = [span for span in trace.spans if span.kind == kind]
+        if spans:
+            busy = sum(span.duration for span in spans)
+            summary.append(f"{len(spans)} {kind}(s), {_ms(busy)}")
+    for (kind, name), spans in by_name.items():
+        peak = _peak_concurrency(spans) if len(spans) > 1 else 1
+        if peak > 1:
+            summary.append(f"<b>{html.escape(name)} &times;{peak} in parallel</b>")
+    if trace.dropped:
+        summary.append(f"{trace.dropped} span(s) not recorded")
+
+    rows = []
+    for span in sorted(trace.spans, key=lambda span: span.start):
+        width = max(span.duration / total * 100, 0.15)
+        slow = span.kind != "approval" and span.duration >= SLOW_SHARE * total
+        title = html.escape(
+            f"{span.kind} {span.name} {span.detail} {_ms(span.duration)}"
+        )
+        rows.append(
+            f'<div class="row{" slow" if slow else ""}" title="{title}">'
+            f'<div class="label {span.kind}">{html.escape(span.name)}'
+            f' <span class="detail">{html.escape(span.detail)}</span></div>'
+            f'<div class="lane"><div class="bar {span.kind}" style="left:{left(span.start):.3f}%;'
+            f'width:{width:.3f}%"></div><span class="time" style="left:{left(span.start) + width:.3f}%">'
+            f"{_ms(span.duration)}</span></div></div>"
+        )
+    marks = "".join(
+        f'<div class="mark" style="left:{left(t):.3f}%" '
+        f'title="{html.escape(f"{kind} {name} {detail} at {_ms(t - trace.start)}")}"></div>'
+        for t, kind, name, detail in trace.marks
+    )
+    ticks = "".join(
+        f'<span class="tick" style="left:{i * 10}%">{_ms(total * i / 10)}</span>'
+        for i in range(11)
+    )
+    return (
+        f'<section><h2>Turn {index}: {html.escape(trace.label[:120])} '
+        f'<small>{_ms(trace.duration)}</small></h2>'
+        f'<p class="summary">{" &middot; ".join(summary)}</p>'
+        f'<div class="row axis"><div class="label"></div><div class="lane">{ticks}</div></div>'
+        f'<div class="row"><div class="label">events</div><div class="lane">{marks}</div></div>'
+        f'{"".join(rows)}</section>'
+    )
+
+
+_STYLE = """
+body { font: 13px system-ui, sans-serif; margin: 1em 2em; color: #222; }
+h2 { font-size: 15px; margin: 1.5em 0 0.2em; } h2 small { color: #777; font-weight: normal; }
+.summary { color: #555; margin: 0 0 0.5em; }
+.row { display: flex; height: 18px; align-items: center; }
+.row:hover { background: #f3f3f3; }
+.label { width: 34%; overflow: hidden; white-space: nowrap; text-overflow: ellipsis; padding-right: 8px; }
+.label.llm, .label.tool, .label.approval { padding-left: 16px; }
+.detail { color: #888; }
+.lane { position: relative; flex: 1; height: 100%; border-left: 1px solid #ddd; }
+.bar { position: absolute; top: 3px; height: 12px; border-radius: 2px; }
+.bar.approval { background: repeating-linear-gradient(45deg, #bab0ac, #bab0ac 4px, #ddd 4px, #ddd 8px); }
+.slow .bar { outline: 2px solid #e15759; } .slow .time { color: #e15759; font-weight: bold; }
+.time { position: absolute; padding-left: 4px; font-size: 11px; color: #666; white-space: nowrap; }
+.mark { position: absolute; top: 4px; width: 2px; height: 10px; background: #9c755f; }
+.axis { color: #999; font-size: 11px; } .tick { position: absolute; transform: translateX(-50%); }
+.legend span { display: inline-block; margin-right: 1em; }
+.legend i { display: inline-block; width: 10px; height: 10px; margin-right: 4px; }
+"""
+
+
+def render_html(traces: list[Trace]) -> str:
+    """A self-contained HTML page with one waterfall per trace."""
+    colors = "".join(
+        f".bar.{kind} {{ background: {color}; }}"
+        for kind, color in KIND_COLORS.items()
+        if kind != "approval"
+    )
+    legend = "".join(
+        f'<span><i class="bar {kind}" style="position:static"></i>{kind}</span>'
+        for kind in KIND_COLORS
+    )
+    sections = "".join(
+        _render_trace(i, trace) for i, trace in enumerate(traces, start=1)
+    )
+    total = sum(trace.duration for trace in traces)
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Workflow trace</title>"
+        f"<style>{_STYLE}{colors}</style></head><body>"
+        f"<h1>Workflow trace</h1><p>{len(traces)} turn(s), {_ms(total)} in total. "
+        f"Spans taking {SLOW_SHARE:.0%} or more of their turn are outlined in red; "
+        "hover a row for details.</p>"
+        f'<p class="legend">{legend}</p>{sections}</body></html>'
+    )
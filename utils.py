@@ -1,3 +1,4 @@
+import os
 from inspect import signature
 from pydantic import BaseModel, create_model
 from pydantic.fields import FieldInfo
@@ -12,8 +13,13 @@ from llama_index.core.workflow import (
     Context,
 )
 
+from coalescing import canonical_hash, tool_flights
+
 AsyncCallable = Callable[..., Awaitable[Any]]
 
+# where tools may read the files an LLM names, set through the DATA_DIR variable
+DEFAULT_DATA_DIR = "data"
+
 
 def create_schema_from_function(
     name: str,
@@ -69,9 +75,19 @@ class FunctionToolWithContext(FunctionTool):
     """
     A function tool that also includes passing in workflow context.
 
-    Only overrides the call methods to include the context.
+    Only overrides the call methods to include the context. A `pure` tool's result
+    depends on its arguments alone, so identical calls in flight at the same time, from
+    any session, share one run; only the context of the call that started it sees its
+    progress events.
+
+    `argument_choices` maps arguments to a function giving their allowed values from
+    the user state and the call's other arguments, e.g. the ids of existing epics, so
+    a near miss can be repaired before the tool runs (see `tool_validation`).
     """
 
+    pure: bool = False
+    argument_choices: dict[str, Callable[[dict, dict], list[str]]] | None = None
+
     @classmethod
     def from_defaults(
         cls,
@@ -82,6 +98,8 @@ class FunctionToolWithContext(FunctionTool):
         fn_schema: Optional[Type[BaseModel]] = None,
         async_fn: Optional[AsyncCallable] = None,
         tool_metadata: Optional[ToolMetadata] = None,
+        pure: bool = False,
+        argument_choices: Optional[dict[str, Callable[[dict, dict], list[str]]]] = None,
     ) -> "FunctionTool":
         if tool_metadata is None:
             fn_to_parse = fn or async_fn
@@ -105,7 +123,10 @@ class FunctionToolWithContext(FunctionTool):
                 fn_schema=fn_schema,
                 return_direct=return_direct,
             )
-        return cls(fn=fn, metadata=tool_metadata, async_fn=async_fn)
+        tool = cls(fn=fn, metadata=tool_metadata, async_fn=async_fn)
+        tool.pure = pure
+        tool.argument_choices = argument_choices
+        return tool
 
     def call(self, ctx: Context, *args: Any, **kwargs: Any) -> ToolOutput:
         """Call."""
@@ -119,10 +140,29 @@ class FunctionToolWithContext(FunctionTool):
 
     async def acall(self, ctx: Context, *args: Any, **kwargs: Any) -> ToolOutput:
         """Call."""
-        tool_output = await self._async_fn(ctx, *args, **kwargs)
+        if self.pure:
+            tool_output = await tool_flights.do(
+                canonical_hash([self.metadata.name, args, kwargs]),
+                lambda: self._async_fn(ctx, *args, **kwargs),
+            )
+        else:
+            tool_output = await self._async_fn(ctx, *args, **kwargs)
         return ToolOutput(
             content=str(tool_output),
             tool_name=self.metadata.name,
             raw_input={"args": args, "kwargs": kwargs},
             raw_output=tool_output,
         )
+
+
+def resolve_data_file(path: str) -> str | None:
+    """The real path of a file named in a tool argument, or None if it's outside DATA_DIR.
+
+    The path is relative to DATA_DIR (./data by default). Tools that read the files an
+    LLM names go through this, so a prompt can't make them read anything else.
+    """
+    root = os.path.realpath(os.getenv("DATA_DIR", DEFAULT_DATA_DIR))
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        return None
+    return resolved
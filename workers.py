@@ -0,0 +1,615 @@
+"""Pre-forked worker processes serving concierge sessions, with sticky session routing."""
+
+import asyncio
+import gc
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from llama_index.core.llms import LLM
+
+from session_memory import MemoryQuota, SessionUsage, SpillStore, measure_session
+from sessions import ConciergeSession
+from workflow import (
+    AgentConfig,
+    ConciergeAgent,
+    ProgressEvent,
+    ToolApprovedEvent,
+    ToolBatchApprovedEvent,
+    ToolBatchRequestEvent,
+    ToolRequestEvent,
+)
+
+RECYCLED_STR = "The worker serving this conversation was restarted."
+OUT_OF_MEMORY_STR = "This conversation can't continue right now: the worker serving it is out of memory."
+
+# sessions listed as the top memory consumers in each worker's stats
+TOP_SESSIONS = 10
+
+# ends a turn's event stream in a worker
+_DONE = object()
+
+
+class WorkerError(RuntimeError):
+    """A request failed inside a worker process."""
+
+
+@dataclass
+class WorkerApp:
+    """Everything a worker needs to serve sessions.
+
+    It's built once in the supervisor, before the workers are forked, so the imports
+    and agent configs it holds are shared with every worker copy-on-write. The LLM
+    holds network connections, so each worker makes its own with `make_llm`.
+    """
+
+    agent_configs: list[AgentConfig]
+    make_llm: Callable[[], LLM]
+    initial_state: Callable[[], dict] = dict
+    make_workflow: Callable[[], ConciergeAgent] = field(
+        default=lambda: ConciergeAgent(timeout=None)
+    )
+    # bounds on the memory of each worker's sessions; idle ones are spilled to disk
+    memory_quota: MemoryQuota | None = None
+
+
+def concierge_app() -> WorkerApp:
+    """The app `main.py` runs: every agent, the standard tier, the fast tier for routing."""
+    from agents import get_agent_configs, get_initial_state
+    from llms import FAST_MODEL, get_active_pool
+
+    return WorkerApp(
+        agent_configs=get_agent_configs(),
+        make_llm=lambda: get_active_pool().get("standard"),
+        initial_state=get_initial_state,
+        make_workflow=lambda: ConciergeAgent(timeout=None, orchestrator_llm=FAST_MODEL),
+    )
+
+
+class _Conversation:
+    """A session in a worker, and the turn it's in the middle of, if any."""
+
+    def __init__(self, session: ConciergeSession):
+        self.session = session
+        self.lock = asyncio.Lock()
+        self.events: asyncio.Queue | None = None
+        self.pump: asyncio.Task | None = None
+        # requests waiting on approval: tool id -> (batch id, request)
+        self.pending: dict[str, tuple[str, ToolRequestEvent]] = {}
+        self.last_active = time.monotonic()
+        # measured when the worker's memory is needed, until a request changes it
+        self.usage: SessionUsage | None = None
+        # set once it's on disk; a request that was waiting on it has to restore it
+        self.spilled = False
+
+    @property
+    def idle(self) -> bool:
+        return not (self.session.busy or self.pending or self.lock.locked())
+
+
+class _Worker:
+    """The event loop of one worker process, serving the sessions routed to it."""
+
+    def __init__(
+        self,
+        app: WorkerApp,
+        index: int,
+        results: multiprocessing.Queue,
+        spill_directory: str | None = None,
+    ):
+        self.app = app
+        self.index = index
+        self.results = results
+        self.llm = app.make_llm()
+        self.workflow = app.make_workflow()
+        self.conversations: dict[str, _Conversation] = {}
+        self.quota = app.memory_quota or MemoryQuota()
+        self.spill = SpillStore(spill_directory)
+        self.spills = 0
+        self.rehydrations = 0
+        self.refused = 0
+        # a session being restored from disk isn't in `conversations` yet
+        self._lookup = asyncio.Lock()
+
+    async def serve(self, requests: multiprocessing.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        inbox: asyncio.Queue = asyncio.Queue()
+
+        def pump() -> None:
+            # Queue.get blocks, so requests are read on a thread and handed to the loop
+            while True:
+                request = requests.get()
+                loop.call_soon_threadsafe(inbox.put_nowait, request)
+                if request is None:
+                    return
+
+        threading.Thread(target=pump, daemon=True).start()
+        sweeper = None
+        if self.quota.idle_seconds is not None:
+            sweeper = asyncio.create_task(self._spill_idle_sessions())
+        tasks: set[asyncio.Task] = set()
+        while (request := await inbox.get()) is not None:
+            task = asyncio.create_task(self._handle(*request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if sweeper is not None:
+            sweeper.cancel()
+
+    async def _handle(self, request_id: int, op: str, args: tuple) -> None:
+        try:
+            result = await getattr(self, f"op_{op}")(*args)
+            self.results.put((request_id, True, result))
+        except Exception as e:
+            self.results.put((request_id, False, f"{type(e).__name__}: {e}"))
+
+    async def _conversation(self, session_id: str) -> _Conversation:
+        async with self._lookup:
+            conversation = self.conversations.get(session_id)
+            if conversation is None:
+                checkpoint = self.spill.take(session_id)
+                if checkpoint is not None:
+                    session = await ConciergeSession.restore(
+                        checkpoint, self.workflow, self.app.agent_configs, self.llm
+                    )
+                    self.rehydrations += 1
+                else:
+                    session = ConciergeSession(
+                        self.workflow,
+                        self.app.agent_configs,
+                        self.llm,
+                        self.app.initial_state(),
+                    )
+                conversation = self.conversations[session_id] = _Conversation(session)
+            conversation.last_active = time.monotonic()
+            return conversation
+
+    async def op_turn(self, session_id: str, user_msg: str) -> dict[str, Any]:
+        if not await self._make_room(session_id):
+            self.refused += 1
+            return {"error": OUT_OF_MEMORY_STR, "progress": []}
+        while True:
+            conversation = await self._conversation(session_id)
+            async with conversation.lock:
+                if conversation.spilled:
+                    continue
+                handler = await conversation.session.send(user_msg)
+                conversation.pending.clear()
+                conversation.events = asyncio.Queue()
+                conversation.pump = asyncio.create_task(
+                    self._pump_events(handler, conversation.events)
+                )
+                result = await self._until_input(conversation)
+            await self._account(conversation)
+            return result
+
+    async def op_decide(
+        self, session_id: str, decisions: list[tuple[str, bool, str | None]]
+    ) -> dict[str, Any]:
+        conversation = self.conversations.get(session_id)
+        if conversation is None or not conversation.pending:
+            raise ValueError(
+                f"No tool calls of session {session_id} are waiting on approval"
+            )
+        unknown = [
+            tool_id
+            for tool_id, _, _ in decisions
+            if tool_id not in conversation.pending
+        ]
+        if unknown:
+            raise ValueError(
+                f"Tool calls {', '.join(unknown)} aren't waiting on approval"
+            )
+        async with conversation.lock:
+            handler = conversation.session.handler
+            for tool_id, approved, reason in decisions:
+                batch_id, request = conversation.pending.pop(tool_id)
+                handler.ctx.send_event(
+                    ToolBatchApprovedEvent(
+                        batch_id=batch_id,
+                        decisions=[
+                            ToolApprovedEvent(
+                                tool_id=tool_id,
+                                tool_name=request.tool_name,
+                                tool_kwargs=request.tool_kwargs,
+                                approved=approved,
+                                response=reason,
+                            )
+                        ],
+                    )
+                )
+            if conversation.pending:
+                return {"approvals": self._approvals(conversation), "progress": []}
+            result = await self._until_input(conversation)
+        await self._account(conversation)
+        return result
+
+    async def op_checkpoint(self) -> dict[str, dict[str, Any]]:
+        """Snapshots every session, cancelling turns still waiting on approval."""
+        checkpoints = {}
+        for session_id, conversation in self.conversations.items():
+            session = conversation.session
+            if session.busy:
+                await session.cancel(RECYCLED_STR)
+            if conversation.pump is not None:
+                await asyncio.gather(conversation.pump, return_exceptions=True)
+            checkpoints[session_id] = await session.checkpoint()
+        return checkpoints
+
+    async def op_restore(self, checkpoints: dict[str, dict[str, Any]]) -> int:
+        for session_id, checkpoint in checkpoints.items():
+            session = await ConciergeSession.restore(
+                checkpoint, self.workflow, self.app.agent_configs, self.llm
+            )
+            self.conversations[session_id] = _Conversation(session)
+        return len(checkpoints)
+
+    async def op_stats(self, top: int = TOP_SESSIONS) -> dict[str, Any]:
+        measured = [
+            (session_id, await self._usage(c))
+            for session_id, c in list(self.conversations.items())
+        ]
+        measured.sort(key=lambda item: item[1].total, reverse=True)
+        return {
+            "worker": self.index,
+            "pid": os.getpid(),
+            "sessions": len(self.conversations),
+            "busy": sum(c.session.busy for c in self.conversations.values()),
+            "rss_bytes": _rss_bytes(),
+            "memory_bytes": await self._memory(),
+            "spilled": len(self.spill),
+            "spilled_bytes": self.spill.nbytes,
+            "spills": self.spills,
+            "rehydrations": self.rehydrations,
+            "refused": self.refused,
+            "top_sessions": [
+                {"session_id": session_id, "bytes": usage.total, **usage._asdict()}
+                for session_id, usage in measured[:top]
+            ],
+        }
+
+    async def _usage(self, conversation: _Conversation) -> SessionUsage:
+        if conversation.usage is None:
+            conversation.usage = await measure_session(conversation.session)
+        return conversation.usage
+
+    async def _memory(self) -> int:
+        """The memory of the worker's sessions, measuring those changed since last time."""
+        return sum(
+            [(await self._usage(c)).total for c in list(self.conversations.values())]
+        )
+
+    async def _account(self, conversation: _Conversation) -> None:
+        """Notes a request of a session and spills others if the worker is over quota."""
+        # measured again only once a quota or the stats ask for it
+        conversation.usage = None
+        conversation.last_active = time.monotonic()
+        soft = self.quota.soft_bytes
+        if soft is not None and await self._memory() > soft:
+            await self._spill_until(soft, keep=conversation)
+
+    async def _make_room(self, session_id: str) -> bool:
+        """Whether a turn of `session_id` can start without going over the hard quota."""
+        hard = self.quota.hard_bytes
+        if hard is None or await self._memory() <= hard:
+            return True
+        keep = self.conversations.get(session_id)
+        await self._spill_until(min(hard, self.quota.soft_bytes or hard), keep=keep)
+        return await self._memory() <= hard
+
+    async def _spill_until(self, limit: int, keep: _Conversation | None = None) -> None:
+        """Spills idle sessions, least recently used first, until the rest fit in `limit`."""
+        by_age = sorted(
+            self.conversations.items(), key=lambda item: item[1].last_active
+        )
+        for session_id, conversation in by_age:
+            if await self._memory() <= limit:
+                return
+            if conversation is not keep:
+                await self._spill(session_id, conversation)
+
+    async def _spill_idle_sessions(self) -> None:
+        idle_seconds = self.quota.idle_seconds
+        while True:
+            await asyncio.sleep(max(idle_seconds / 2, 0.1))
+            cutoff = time.monotonic() - idle_seconds
+            for session_id, conversation in list(self.conversations.items()):
+                if conversation.last_active <= cutoff:
+                    await self._spill(session_id, conversation)
+
+    async def _spill(self, session_id: str, conversation: _Conversation) -> bool:
+        """Moves an idle session to disk; it's restored on its next message."""
+        if (
+            self.conversations.get(session_id) is not conversation
+            or not conversation.idle
+        ):
+            return False
+        async with conversation.lock:
+            if conversation.pump is not None:
+                await asyncio.gather(conversation.pump, return_exceptions=True)
+            self.spill.put(session_id, await conversation.session.checkpoint())
+            conversation.spilled = True
+            del self.conversations[session_id]
+        self.spills += 1
+        return True
+
+    @staticmethod
+    async def _pump_events(handler, events: asyncio.Queue) -> None:
+        try:
+            async for event in handler.stream_events():
+                events.put_nowait(event)
+        finally:
+            events.put_nowait(_DONE)
+
+    async def _until_input(self, conversation: _Conversation) -> dict[str, Any]:
+        # runs the turn until it needs a human or finishes
+        progress = []
+        while (event := await conversation.events.get()) is not _DONE:
+            if isinstance(event, ToolBatchRequestEvent):
+                for request in event.requests:
+                    conversation.pending[request.tool_id] = (event.batch_id, request)
+                return {
+                    "approvals": self._approvals(conversation),
+                    "progress": progress,
+                }
+            if isinstance(event, ProgressEvent):
+                progress.append(event.msg)
+
+        [result] = await asyncio.gather(
+            conversation.session.handler, return_exceptions=True
+        )
+        if isinstance(result, BaseException):
+            return {"error": f"{type(result).__name__}: {result}", "progress": progress}
+        return {"response": str(result["response"]), "progress": progress}
+
+    @staticmethod
+    def _approvals(conversation: _Conversation) -> list[dict[str, Any]]:
+        return [
+            {
+                "tool_id": tool_id,
+                "tool_name": request.tool_name,
+                "tool_kwargs": request.tool_kwargs,
+            }
+            for tool_id, (_, request) in conversation.pending.items()
+        ]
+
+
+def _rss_bytes() -> int | None:
+    """Resident memory of this process, where /proc tells."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _run_worker(
+    app: WorkerApp,
+    index: int,
+    requests: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+    spill_directory: str | None,
+) -> None:
+    asyncio.run(_Worker(app, index, results, spill_directory).serve(requests))
+
+
+@dataclass
+class _Slot:
+    process: multiprocessing.Process
+    requests: multiprocessing.Queue
+    turns: int = 0
+    in_flight: int = 0
+    # cleared while the worker is being recycled, holding back new requests
+    open: asyncio.Event = field(default_factory=asyncio.Event)
+    idle: asyncio.Event = field(default_factory=asyncio.Event)
+    recycling: bool = False
+
+
+class WorkerPool:
+    """Serves concierge sessions from `workers` pre-forked processes.
+
+    `app` is built in this process before forking, so every worker starts with
+    llama-index imported and the agents built, sharing that memory copy-on-write.
+    A session always goes to the same worker (by a hash of its id), so its context
+    and history stay in that worker's memory and are never sent across processes.
+
+    With `max_turns`, a worker is recycled after serving that many turns, as a guard
+    against slow leaks: it finishes what it's doing, checkpoints its sessions (the
+    committed history, the user state and the active speaker), and a fresh worker
+    forked from this process restores them before taking new requests. Turns waiting
+    on approval at that point are cancelled. `recycle` does the same on demand.
+
+    With the app's `memory_quota`, each worker measures the sessions requests have
+    changed when it checks the quota, and spills idle ones to `spill_directory` (a temporary one by default),
+    restoring them on their next message; see `MemoryQuota`. `stats` reports each
+    worker's memory and its top consumers, `top_sessions` the largest sessions overall.
+
+    Every request returns a dict with the turn's "progress" messages and either its
+    "response", the "approvals" it's waiting on (answer them with `decide`), or an
+    "error".
+    """
+
+    def __init__(
+        self,
+        app: WorkerApp,
+        workers: int | None = None,
+        max_turns: int | None = None,
+        spill_directory: str | None = None,
+    ):
+        self.app = app
+        self.workers = workers or os.cpu_count() or 1
+        self.max_turns = max_turns
+        self.spill_directory = spill_directory
+        self._owns_spill_directory = False
+        self._context = multiprocessing.get_context("fork")
+        self._results = self._context.Queue()
+        self._slots: list[_Slot] = []
+        self._pending: dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._reader: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def __aenter__(self) -> "WorkerPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def worker_for(self, session_id: str) -> int:
+        """The worker serving `session_id`; stable across processes and restarts."""
+        return zlib.crc32(session_id.encode()) % self.workers
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self.app.memory_quota is not None and self.spill_directory is None:
+            self.spill_directory = tempfile.mkdtemp(prefix="spilled-sessions-")
+            self._owns_spill_directory = True
+        # objects allocated so far are never collected in the workers, so the
+        # collector doesn't touch (and copy) the pages they share with this process
+        gc.freeze()
+        for index in range(self.workers):
+            self._slots.append(self._spawn(index))
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+
+    async def send(self, session_id: str, user_msg: str) -> dict[str, Any]:
+        """Runs a turn of `session_id` on its worker."""
+        index = self.worker_for(session_id)
+        result = await self._call(index, "turn", session_id, user_msg)
+        slot = self._slots[index]
+        slot.turns += 1
+        if (
+            self.max_turns is not None
+            and slot.turns >= self.max_turns
+            and not slot.recycling
+        ):
+            asyncio.create_task(self.recycle(index))
+        return result
+
+    async def decide(
+        self, session_id: str, decisions: list[tuple[str, bool, str | None]]
+    ) -> dict[str, Any]:
+        """Answers approvals of `session_id` as (tool id, approved, reason) and continues its turn."""
+        return await self._call(
+            self.worker_for(session_id), "decide", session_id, decisions
+        )
+
+    async def stats(self, top: int = TOP_SESSIONS) -> list[dict[str, Any]]:
+        """Each worker's sessions and memory, with its `top` largest sessions."""
+        return list(
+            await asyncio.gather(
+                *(self._call(i, "stats", top) for i in range(self.workers))
+            )
+        )
+
+    async def top_sessions(self, n: int = TOP_SESSIONS) -> list[dict[str, Any]]:
+        """The `n` sessions holding the most memory, across workers, largest first."""
+        sessions = [
+            {"worker": stats["worker"], **session}
+            for stats in await self.stats(top=n)
+            for session in stats["top_sessions"]
+        ]
+        return sorted(sessions, key=lambda session: session["bytes"], reverse=True)[:n]
+
+    async def recycle(self, index: int) -> int:
+        """Replaces worker `index` with a fresh fork, migrating its sessions. Returns how many."""
+        slot = self._slots[index]
+        if slot.recycling:
+            return 0
+        slot.recycling = True
+        slot.open.clear()
+        try:
+            await slot.idle.wait()
+            checkpoints = await self._call(index, "checkpoint", gated=False)
+            await self._stop(slot)
+            fresh = self._spawn(index, open=False)
+            self._slots[index] = fresh
+            await self._call(index, "restore", checkpoints, gated=False)
+            fresh.open.set()
+            return len(checkpoints)
+        finally:
+            slot.recycling = False
+            slot.open.set()
+
+    async def close(self) -> None:
+        for slot in self._slots:
+            await self._stop(slot)
+        self._slots.clear()
+        self._results.put(None)
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self._owns_spill_directory:
+            shutil.rmtree(self.spill_directory, ignore_errors=True)
+            self.spill_directory = None
+            self._owns_spill_directory = False
+
+    def _spawn(self, index: int, open: bool = True) -> _Slot:
+        requests = self._context.Queue()
+        spill_directory = None
+        if self.spill_directory is not None:
+            # a recycled worker picks up the sessions its predecessor spilled
+            spill_directory = os.path.join(self.spill_directory, f"worker-{index}")
+        process = self._context.Process(
+            target=_run_worker,
+            args=(self.app, index, requests, self._results, spill_directory),
+            name=f"concierge-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        slot = _Slot(process=process, requests=requests)
+        slot.idle.set()
+        if open:
+            slot.open.set()
+        return slot
+
+    async def _stop(self, slot: _Slot) -> None:
+        slot.requests.put(None)
+        await asyncio.to_thread(slot.process.join)
+        slot.requests.close()
+
+    async def _call(self, index: int, op: str, *args: Any, gated: bool = True) -> Any:
+        while gated:
+            slot = self._slots[index]
+            await slot.open.wait()
+            # the slot may have been replaced while waiting
+            if self._slots[index] is slot and slot.open.is_set():
+                break
+        slot = self._slots[index]
+
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        slot.in_flight += 1
+        slot.idle.clear()
+        try:
+            slot.requests.put((request_id, op, args))
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+            slot.in_flight -= 1
+            if slot.in_flight == 0:
+                slot.idle.set()
+
+    def _read_results(self) -> None:
+        while (item := self._results.get()) is not None:
+            self._loop.call_soon_threadsafe(self._resolve, *item)
+
+    def _resolve(self, request_id: int, ok: bool, result: Any) -> None:
+        future = self._pending.get(request_id)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(WorkerError(result))
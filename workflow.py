@@ -1,4 +1,8 @@
-from typing import Any
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Iterable
 from pydantic import BaseModel, ConfigDict, Field
 
 from llama_index.core.llms import ChatMessage, LLM
@@ -16,9 +20,25 @@ from llama_index.core.workflow import (
     Context,
 )
 from llama_index.core.workflow.events import InputRequiredEvent, HumanResponseEvent
+from llama_index.core.workflow.handler import WorkflowHandler
 from llama_index.llms.openai import OpenAI
 
-from utils import FunctionToolWithContext
+from approvals import ApprovalPolicy, describe_decision
+from coalescing import tool_call_key
+from conversation_store import ConversationStore
+from conversation_views import ConversationViews
+from fast_path import Command, CommandMatch, match_command
+from llms import ModelSpec
+from preconditions import Precondition, unmet_preconditions
+from prompts import STATE_PLACEHOLDER, PromptBuilder
+from session_log import SessionLog
+from state_store import UserStateStore, use_branch
+from tool_outputs import ToolOutputStore, preview, read_tool_output_tool
+from tool_validation import ArgumentValidator
+from tracing import TraceRecorder, begin, finish, mark, traced
+from utils import (
+    FunctionToolWithContext,
+)
 
 
 # ---- Pydantic models for config/llm prediction ----
@@ -34,6 +54,16 @@ class AgentConfig(BaseModel):
     system_prompt: str | None = None
     tools: list[BaseTool] | None = None
     tools_requiring_human_confirmation: list[str] = Field(default_factory=list)
+    # model chain for this agent; falls back to the workflow's default llm when unset
+    llm: ModelSpec | None = None
+    # rules that decide confirmations automatically, and how long to wait for a human
+    approval_policy: ApprovalPolicy | None = None
+    # user state requirements, checked before routing to the agent or running its tools
+    preconditions: list[Precondition] = Field(default_factory=list)
+    # user state keys shown in the agent's prompt; None shows all of them
+    state_keys: list[str] | None = None
+    # requests obvious enough to run a tool directly, without the LLMs
+    commands: list[Command] = Field(default_factory=list)
 
 
 class TransferToAgent(BaseModel):
@@ -59,6 +89,14 @@ class OrchestratorEvent(Event):
     pass
 
 
+class CommandEvent(Event):
+    """A message that parsed as one of an agent's commands."""
+
+    agent_name: str
+    command: Command
+    tool_kwargs: dict
+
+
 class ToolCallEvent(Event):
     tool_call: ToolSelection
     tools: list[BaseTool]
@@ -74,6 +112,14 @@ class ToolRequestEvent(InputRequiredEvent):
     tool_kwargs: dict
 
 
+class ToolBatchRequestEvent(InputRequiredEvent):
+    """All the tool calls from one agent response that are waiting on a human."""
+
+    batch_id: str
+    requests: list[ToolRequestEvent]
+    timeout: float | None = None
+
+
 class ToolApprovedEvent(HumanResponseEvent):
     tool_name: str
     tool_id: str
@@ -82,10 +128,45 @@ class ToolApprovedEvent(HumanResponseEvent):
     response: str | None = None
 
 
+class ToolBatchApprovedEvent(HumanResponseEvent):
+    """Decisions for some or all of the requests in a batch."""
+
+    batch_id: str
+    decisions: list[ToolApprovedEvent]
+    response: str = ""
+
+
 class ProgressEvent(Event):
     msg: str
 
 
+class ApprovalsExpiredEvent(ProgressEvent):
+    """Streamed when a batch's timeout decides the requests nobody answered."""
+
+    batch_id: str
+    decisions: list[ToolApprovedEvent]
+
+
+class StateChangedEvent(Event):
+    """Streamed after every committed write to the user state."""
+
+    path: str
+    version: int
+
+
+class AgentTimingEvent(Event):
+    """Streamed when an agent finishes its part of a fanned-out request."""
+
+    agent_name: str
+    duration: float
+
+
+class TurnCancelledEvent(Event):
+    """Streamed when a turn is cancelled, before its changes are rolled back."""
+
+    reason: str
+
+
 # ---- Workflow ----
 
 DEFAULT_ORCHESTRATOR_PROMPT = (
@@ -93,10 +174,84 @@ DEFAULT_ORCHESTRATOR_PROMPT = (
     "Your job is to decide which agent to run based on the current state of the user and what they've asked to do.\n"
     "You do not need to figure out dependencies between agents; the agents will handle that themselves.\n"
     "Here the the agents you can choose from:\n{agent_context_str}\n\n"
-    "Here is the current user state:\n{user_state_str}\n\n"
     "Please assist the user and transfer them as needed."
 )
 DEFAULT_TOOL_REJECT_STR = "The tool call was not approved, likely due to a mistake or preconditions not being met."
+DEFAULT_APPROVAL_TIMEOUT_STR = "The tool call was not approved in time."
+DEFAULT_CANCEL_STR = "Cancelled by the user."
+FAN_OUT_PROMPT = (
+    "\nIf the user asks for several things handled by different agents, transfer to all "
+    "of them at once by calling TransferToAgent once per agent."
+)
+# LLM rounds an agent gets to answer its part of a fanned-out request
+MAX_BRANCH_STEPS = 8
+# tool calls run at the same time for one agent response
+TOOL_WORKERS = 4
+# what a conversation keeps in its context from one turn to the next
+SESSION_KEYS = (
+    "active_speaker",
+    "deferred_speaker",
+    "chat_history",
+    "conversation_views",
+    "state_store",
+)
+
+
+def _dedupe_tool_calls(
+    tool_calls: list[ToolSelection], tools: list[BaseTool]
+) -> tuple[list[ToolSelection], dict[str, list[str]]]:
+    """The distinct tool calls, and the ids of the copies of each, by the id of the first.
+
+    Only calls to pure tools are merged; running anything else twice may be intended.
+    """
+    pure = {
+        tool.metadata.get_name()
+        for tool in tools
+        if isinstance(tool, FunctionToolWithContext) and tool.pure
+    }
+    first: dict[str, ToolSelection] = {}
+    duplicates: dict[str, list[str]] = {}
+    for tool_call in tool_calls:
+        if tool_call.tool_name not in pure:
+            first[tool_call.tool_id] = tool_call
+            continue
+        original = first.setdefault(tool_call_key(tool_call), tool_call)
+        if original is not tool_call:
+            duplicates.setdefault(original.tool_id, []).append(tool_call.tool_id)
+    return list(first.values()), duplicates
+
+
+def _with_tool_call_id(message: ChatMessage, tool_id: str) -> ChatMessage:
+    return message.model_copy(
+        update={
+            "additional_kwargs": {**message.additional_kwargs, "tool_call_id": tool_id}
+        }
+    )
+
+
+def _ordered_results(
+    messages: list[ChatMessage],
+    tool_call_ids: list[str],
+    duplicates: dict[str, list[str]],
+) -> list[ChatMessage]:
+    """Tool results with copies for the duplicate calls, in the order of the calls."""
+    results = []
+    for message in messages:
+        results.append(message)
+        for tool_id in duplicates.get(
+            message.additional_kwargs.get("tool_call_id"), []
+        ):
+            results.append(_with_tool_call_id(message, tool_id))
+
+    # results arrive in whatever order tools finish or get approved; keep the
+    # order of the calls so the history doesn't depend on timing
+    order = {tool_id: i for i, tool_id in enumerate(tool_call_ids)}
+    results.sort(
+        key=lambda message: order.get(
+            message.additional_kwargs.get("tool_call_id"), len(order)
+        )
+    )
+    return results
 
 
 class ConciergeAgent(Workflow):
@@ -104,6 +259,15 @@ class ConciergeAgent(Workflow):
         self,
         orchestrator_prompt: str | None = None,
         default_tool_reject_str: str | None = None,
+        orchestrator_llm: ModelSpec | LLM | None = None,
+        fan_out: bool = True,
+        scoped_views: bool = True,
+        fast_path: bool = True,
+        fuse_tool_calls: bool = True,
+        argument_validator: ArgumentValidator | None = None,
+        tool_outputs: ToolOutputStore | None = None,
+        prompt_builder: PromptBuilder | None = None,
+        tracer: TraceRecorder | None = None,
         **kwargs: Any,
     ):
         super().__init__(**kwargs)
@@ -111,11 +275,266 @@ class ConciergeAgent(Workflow):
         self.default_tool_reject_str = (
             default_tool_reject_str or DEFAULT_TOOL_REJECT_STR
         )
+        self.orchestrator_llm = (
+            ModelSpec.coerce(orchestrator_llm) if orchestrator_llm else None
+        )
+        # let the orchestrator send one message to several agents concurrently
+        self.fan_out = fan_out
+        # show each agent its own traffic in full and other agents' as handoff notes
+        self.scoped_views = scoped_views
+        # answer messages that parse as an agent's command without calling an LLM
+        self.fast_path = fast_path
+        # run tool calls that need no approval inside the agent's step
+        self.fuse_tool_calls = fuse_tool_calls
+        # checks tool arguments before tools run, repairing what it can
+        self.argument_validator = argument_validator or ArgumentValidator()
+        # where long tool outputs go, leaving a preview and a handle in the history
+        self.tool_outputs = tool_outputs or ToolOutputStore()
+        # keeps system prompts static and renders the user state after the history
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        # records a sample of turns as traces of their steps, LLM and tool calls
+        self.tracer = tracer
+        # approval timeout tasks, by batch id
+        self._approval_timers: dict[str, asyncio.Task] = {}
+
+    def run(self, *args: Any, **kwargs: Any) -> WorkflowHandler:
+        """Runs one turn, traced if the tracer samples it."""
+        if self.tracer is None:
+            return super().run(*args, **kwargs)
+        # the run's steps are started here, and inherit the turn's trace
+        with self.tracer.turn(label=kwargs.get("user_msg") or "") as trace:
+            handler = super().run(*args, **kwargs)
+        if trace is not None:
+            handler.add_done_callback(lambda _: trace.close())
+        return handler
+
+    async def cancel_turn(
+        self, handler: WorkflowHandler, reason: str = DEFAULT_CANCEL_STR
+    ) -> bool:
+        """Cancels a running turn and rolls back what it changed.
+
+        In-flight LLM requests and tool coroutines are cancelled along with the steps
+        awaiting them, pending approvals are dropped, and the chat history, user state
+        and active speaker are restored to how the turn found them. A
+        `TurnCancelledEvent` is streamed first. Returns False if the turn had already
+        finished successfully, in which case nothing is rolled back.
+
+        The cancelled run can leave events behind in its context, so run the next turn
+        on `await continue_from(handler.ctx)` rather than on that context itself.
+        """
+        ctx = handler.ctx
+        if not handler.done():
+            ctx.write_event_to_stream(TurnCancelledEvent(reason=reason))
+            await self._cancel_approval_timers(ctx)
+            await handler.cancel_run()
+
+        # the run ends either way; only a successful one is kept
+        [outcome] = await asyncio.gather(handler, return_exceptions=True)
+        if not isinstance(outcome, BaseException):
+            return False
+
+        await self._cancel_approval_timers(ctx)
+        await self._rollback_turn(ctx)
+        return True
+
+    async def continue_from(self, ctx: Context) -> Context:
+        """A fresh context that carries the conversation in `ctx` over to the next turn.
+
+        Only the conversation itself moves: the active speaker, the history and the
+        user state store, as the same objects. Events a cancelled run left queued stay
+        behind with the old context.
+        """
+        fresh = Context(self)
+        for key in SESSION_KEYS:
+            value = await ctx.get(key, default=None)
+            if value is not None:
+                await fresh.set(key, value)
+
+        store: UserStateStore | None = await ctx.get("state_store", default=None)
+        if store is not None:
+            # state changes are streamed by whichever run has the store now
+            stop_streaming = await ctx.get("stop_state_events")
+            stop_streaming()
+            await self._stream_state_changes(fresh, store)
+        return fresh
+
+    async def _stream_state_changes(self, ctx: Context, store: UserStateStore) -> None:
+        await ctx.set(
+            "stop_state_events",
+            store.subscribe(
+                lambda change: ctx.write_event_to_stream(
+                    StateChangedEvent(path=change.path, version=change.version)
+                )
+            ),
+        )
+
+    async def _cancel_approval_timers(self, ctx: Context) -> None:
+        pending_approvals = await ctx.get("pending_approvals", default={})
+        for batch_id in set(pending_approvals.values()):
+            timer = self._approval_timers.pop(batch_id, None)
+            if timer is not None:
+                timer.cancel()
+        await ctx.set("pending_approvals", {})
+
+    async def _rollback_turn(self, ctx: Context) -> None:
+        snapshot = await ctx.get("turn_snapshot", default=None)
+        if snapshot is None:
+            return
+
+        # restored in place: callers may hold on to these objects between turns; the
+        # history is only appended to during a turn, so cutting it back is enough
+        chat_history: ConversationStore = await ctx.get("chat_history")
+        del chat_history[snapshot["history_length"] :]
+        store: UserStateStore = await ctx.get("state_store")
+        store.restore(snapshot["user_state"])
+        await ctx.set("active_speaker", snapshot["active_speaker"])
+        await ctx.set("deferred_speaker", snapshot["deferred_speaker"])
+
+    async def _end_turn(self, ctx: Context) -> None:
+        """Commits a finished turn, which leaves nothing to roll back."""
+        await ctx.set("turn_snapshot", None)
+        session_log: SessionLog | None = await ctx.get("session_log", default=None)
+        if session_log is not None:
+            session_log.commit()
+
+    async def _route_preconditions(self, ctx: Context, agent_name: str) -> str:
+        """Follows unmet preconditions from an agent to the one that has to run first."""
+        agent_configs = await ctx.get("agent_configs")
+        user_state = await ctx.get("user_state")
+
+        # each precondition redirects at most once per turn, so an agent that can't
+        # satisfy it doesn't bounce the user back and forth
+        redirected = await ctx.get("precondition_redirects", default=[])
+
+        destination = agent_name
+        visited = set()
+        while agent_name not in visited:
+            visited.add(agent_name)
+            missing = [
+                p
+                for p in unmet_preconditions(
+                    agent_configs[agent_name].preconditions, user_state
+                )
+                if p.satisfied_by in agent_configs
+                and (agent_name, p.key) not in redirected
+            ]
+            if not missing:
+                break
+
+            ctx.write_event_to_stream(
+                ProgressEvent(
+                    msg=f"{agent_name} {missing[0].describe()}; transferring to agent {missing[0].satisfied_by} first"
+                )
+            )
+            # return to the original destination once this precondition holds
+            await ctx.set("deferred_speaker", (destination, missing[0]))
+            redirected.append((agent_name, missing[0].key))
+            agent_name = missing[0].satisfied_by
+
+        await ctx.set("precondition_redirects", redirected)
+        await ctx.set("active_speaker", agent_name)
+        return agent_name
+
+    def _agent_llm_input(
+        self,
+        agent_config: AgentConfig,
+        chat_history: Iterable[ChatMessage],
+        store: UserStateStore,
+    ) -> list[ChatMessage]:
+        return self.prompt_builder.messages(
+            agent_config.system_prompt.strip(),
+            chat_history,
+            store,
+            agent_config.state_keys,
+        )
+
+    async def _agent_history(
+        self, ctx: Context, agent_name: str, chat_history: ConversationStore
+    ) -> Iterable[ChatMessage]:
+        if not self.scoped_views:
+            return chat_history
+        views: ConversationViews = await ctx.get("conversation_views")
+        return views.view(agent_name, chat_history)
+
+    async def _record_messages(
+        self, ctx: Context, chat_history: ConversationStore, agent_name: str
+    ) -> None:
+        views: ConversationViews = await ctx.get("conversation_views")
+        views.record(chat_history, agent_name)
+
+    def _agent_tools(self, agent_config: AgentConfig) -> list[BaseTool]:
+        # inject the request transfer and output paging tools into the list of tools
+        return [
+            get_function_tool(RequestTransfer),
+            read_tool_output_tool,
+        ] + agent_config.tools
+
+    def _check_arguments(
+        self,
+        ctx: Context,
+        tool_call: ToolSelection,
+        tools: list[BaseTool],
+        user_state: dict,
+    ) -> tuple[ToolSelection, ChatMessage | None]:
+        """Repairs a tool call's arguments, or answers the call with what's wrong with them."""
+        tool = next(
+            (
+                tool
+                for tool in [read_tool_output_tool, *tools]
+                if tool.metadata.get_name() == tool_call.tool_name
+            ),
+            None,
+        )
+        if tool is None:
+            return tool_call, None
+
+        checked = self.argument_validator.check(tool, tool_call.tool_kwargs, user_state)
+        if checked.errors:
+            message = ChatMessage(
+                role="tool",
+                content=checked.error_message(tool_call.tool_name),
+                additional_kwargs={
+                    "tool_call_id": tool_call.tool_id,
+                    "name": tool_call.tool_name,
+                },
+            )
+            ctx.write_event_to_stream(
+                ProgressEvent(
+                    msg=f"Invalid arguments for {tool_call.tool_name}: {'; '.join(checked.errors)}"
+                )
+            )
+            return tool_call, message
+        if checked.repairs:
+            ctx.write_event_to_stream(
+                ProgressEvent(
+                    msg=f"Repaired arguments of {tool_call.tool_name}: {'; '.join(checked.repairs)}"
+                )
+            )
+            tool_call = tool_call.model_copy(update={"tool_kwargs": checked.kwargs})
+        return tool_call, None
+
+    def _runnable_command(
+        self, match: CommandMatch, agent_config: AgentConfig, user_state: dict
+    ) -> bool:
+        """Whether a command can run unattended: anything needing a human or a
+        precondition goes through the agent instead."""
+        tool_names = {tool.metadata.get_name() for tool in agent_config.tools or []}
+        return (
+            match.command.tool_name in tool_names
+            and match.command.tool_name
+            not in agent_config.tools_requiring_human_confirmation
+            and not unmet_preconditions(
+                agent_config.preconditions,
+                user_state,
+                match.command.tool_name,
+                match.tool_kwargs,
+            )
+        )
 
     @step
     async def setup(
         self, ctx: Context, ev: StartEvent
-    ) -> ActiveSpeakerEvent | OrchestratorEvent:
+    ) -> ActiveSpeakerEvent | OrchestratorEvent | CommandEvent:
         """Sets up the workflow, validates inputs, and stores them in the context."""
         active_speaker = await ctx.get("active_speaker", default="")
         user_msg = ev.get("user_msg")
@@ -136,15 +555,64 @@ class ConciergeAgent(Workflow):
         if not llm.metadata.is_function_calling_model:
             raise ValueError("LLM must be a function calling model!")
 
+        # the turn appends straight to a session log; a store passed back from an
+        # earlier result is extended in place
+        session_log: SessionLog | None = ev.get("session_log", default=None)
+        if session_log is not None:
+            # whatever a failed turn left behind was never committed
+            session_log.rollback()
+            chat_history = session_log.history
+        elif not isinstance(chat_history, ConversationStore):
+            chat_history = ConversationStore(chat_history)
+        await ctx.set("session_log", session_log)
+
         # store the agent configs in the context
         agent_configs_dict = {ac.name: ac for ac in agent_configs}
         await ctx.set("agent_configs", agent_configs_dict)
         await ctx.set("llm", llm)
+        await ctx.set("tool_outputs", self.tool_outputs)
+
+        # tools write the user state through a store, which is kept across turns as
+        # long as the caller keeps passing the same state dict
+        store: UserStateStore | None = await ctx.get("state_store", default=None)
+        if store is None or store.data is not initial_state:
+            store = UserStateStore(initial_state)
+            await self._stream_state_changes(ctx, store)
+            await ctx.set("state_store", store)
+
+        # what the turn started from, so a cancelled turn can be rolled back
+        await ctx.set(
+            "turn_snapshot",
+            {
+                "history_length": len(chat_history),
+                "user_state": store.snapshot(),
+                "active_speaker": active_speaker,
+                "deferred_speaker": await ctx.get("deferred_speaker", default=None),
+            },
+        )
 
         chat_history.append(ChatMessage(role="user", content=user_msg))
         await ctx.set("chat_history", chat_history)
 
-        await ctx.set("user_state", initial_state)
+        await ctx.set("user_state", store.data)
+        await ctx.set("precondition_redirects", [])
+        # kept across turns, so views only ever fold in new messages
+        if await ctx.get("conversation_views", default=None) is None:
+            await ctx.set("conversation_views", ConversationViews())
+
+        if self.fast_path:
+            match = match_command(
+                user_msg,
+                {name: config.commands for name, config in agent_configs_dict.items()},
+            )
+            if match is not None and self._runnable_command(
+                match, agent_configs_dict[match.agent_name], store.data
+            ):
+                return CommandEvent(
+                    agent_name=match.agent_name,
+                    command=match.command,
+                    tool_kwargs=match.tool_kwargs,
+                )
 
         # if there is an active speaker, we need to transfer forward the user to them
         if active_speaker:
@@ -156,140 +624,418 @@ class ConciergeAgent(Workflow):
     @step
     async def speak_with_sub_agent(
         self, ctx: Context, ev: ActiveSpeakerEvent
-    ) -> ToolCallEvent | ToolRequestEvent | StopEvent:
-        """Speaks with the active sub-agent and handles tool calls (if any)."""
-        # Setup the agent for the active speaker
-        active_speaker = await ctx.get("active_speaker")
+    ) -> ToolCallEvent | ToolBatchRequestEvent | ActiveSpeakerEvent | StopEvent:
+        """Speaks with the active sub-agent and handles tool calls (if any).
+
+        When none of the calls in a response waits on a human, they run right here and
+        their results go back to the agent in this step, rather than through the tool
+        events; `fuse_tool_calls=False` sends every call through the events.
+        """
+        while True:
+            # Setup the agent for the active speaker, unless its preconditions send the
+            # user to another agent first
+            active_speaker = await self._route_preconditions(
+                ctx, await ctx.get("active_speaker")
+            )
 
-        agent_config: AgentConfig = (await ctx.get("agent_configs"))[active_speaker]
-        chat_history = await ctx.get("chat_history")
-        llm = await ctx.get("llm")
+            agent_config: AgentConfig = (await ctx.get("agent_configs"))[active_speaker]
+            chat_history = await ctx.get("chat_history")
+            llm = await ctx.get("llm")
 
-        user_state = await ctx.get("user_state")
-        user_state_str = "\n".join([f"{k}: {v}" for k, v in user_state.items()])
-        system_prompt = (
-            agent_config.system_prompt.strip()
-            + f"\n\nHere is the current user state:\n{user_state_str}"
-        )
+            user_state = await ctx.get("user_state")
+            llm_input = self._agent_llm_input(
+                agent_config,
+                await self._agent_history(ctx, active_speaker, chat_history),
+                await ctx.get("state_store"),
+            )
+            tools = self._agent_tools(agent_config)
+
+            model = agent_config.llm or ModelSpec.coerce(llm)
+            response, tool_calls = await model.achat_with_tool_calls(
+                tools,
+                llm_input,
+                default=llm,
+                on_fallback=lambda msg: ctx.write_event_to_stream(
+                    ProgressEvent(msg=msg)
+                ),
+            )
+            self.prompt_builder.record_usage(active_speaker, response)
+            if len(tool_calls) == 0:
+                chat_history.append(response.message)
+                await self._record_messages(ctx, chat_history, active_speaker)
+                await ctx.set("chat_history", chat_history)
+                # the turn is complete; there is nothing left to roll back
+                await self._end_turn(ctx)
+                return StopEvent(
+                    result={
+                        "response": response.message.content,
+                        "chat_history": chat_history,
+                    }
+                )
 
-        llm_input = [ChatMessage(role="system", content=system_prompt)] + chat_history
+            tool_call_ids = [tool_call.tool_id for tool_call in tool_calls]
+            # identical calls to pure tools in one response run once; the copies get the
+            # same result
+            tool_calls, duplicates = _dedupe_tool_calls(tool_calls, agent_config.tools)
+            if duplicates:
+                ctx.write_event_to_stream(
+                    ProgressEvent(
+                        msg=f"Skipping {sum(map(len, duplicates.values()))} duplicate tool call(s)"
+                    )
+                )
 
-        # inject the request transfer tool into the list of tools
-        tools = [get_function_tool(RequestTransfer)] + agent_config.tools
+            # each call either runs, is answered right away, or waits on a human
+            policy = agent_config.approval_policy
+            to_run: list[ToolSelection] = []
+            answered: list[ChatMessage] = []
+            pending: list[ToolRequestEvent] = []
+            for tool_call in tool_calls:
+                if tool_call.tool_name == "RequestTransfer":
+                    deferred = await ctx.get("deferred_speaker", default=None)
+                    await ctx.set("deferred_speaker", None)
+                    if deferred is not None and deferred[1].holds(user_state):
+                        # the redirect did its job; go back without asking the orchestrator
+                        await ctx.set("active_speaker", deferred[0])
+                        ctx.write_event_to_stream(
+                            ProgressEvent(
+                                msg=f"Transferring back to agent {deferred[0]}"
+                            )
+                        )
+                        return ActiveSpeakerEvent()
+
+                    await ctx.set("active_speaker", None)
+                    ctx.write_event_to_stream(
+                        ProgressEvent(
+                            msg="Agent is requesting a transfer. Please hold."
+                        )
+                    )
+                    return OrchestratorEvent()
 
-        response = await llm.achat_with_tools(tools, chat_history=llm_input)
+                # bad arguments are repaired or sent back before anything else looks at them
+                tool_call, invalid = self._check_arguments(
+                    ctx, tool_call, agent_config.tools, user_state
+                )
+                if invalid is not None:
+                    answered.append(invalid)
+                    continue
+
+                missing = unmet_preconditions(
+                    agent_config.preconditions,
+                    user_state,
+                    tool_call.tool_name,
+                    tool_call.tool_kwargs,
+                )
+                if missing:
+                    answered.append(
+                        ChatMessage(
+                            role="tool",
+                            content=f"Tool {tool_call.tool_name} can't run yet: "
+                            + "; ".join(p.describe() for p in missing)
+                            + ". Call RequestTransfer if another agent has to handle it.",
+                            additional_kwargs={"tool_call_id": tool_call.tool_id},
+                        )
+                    )
+                elif (
+                    tool_call.tool_name
+                    in agent_config.tools_requiring_human_confirmation
+                ):
+                    rule = (
+                        policy.evaluate(
+                            tool_call.tool_name, tool_call.tool_kwargs, user_state
+                        )
+                        if policy
+                        else None
+                    )
+                    if rule is None:
+                        pending.append(
+                            ToolRequestEvent(
+                                prefix=f"Tool {tool_call.tool_name} requires human approval.",
+                                tool_name=tool_call.tool_name,
+                                tool_kwargs=tool_call.tool_kwargs,
+                                tool_id=tool_call.tool_id,
+                            )
+                        )
+                        continue
+
+                    ctx.write_event_to_stream(
+                        ProgressEvent(
+                            msg=describe_decision(
+                                rule, tool_call.tool_name, tool_call.tool_kwargs
+                            )
+                        )
+                    )
+                    if rule.decision == "approve":
+                        to_run.append(tool_call)
+                    else:
+                        answered.append(
+                            ChatMessage(
+                                role="tool",
+                                content=rule.reason or self.default_tool_reject_str,
+                                additional_kwargs={"tool_call_id": tool_call.tool_id},
+                            )
+                        )
+                else:
+                    to_run.append(tool_call)
 
-        tool_calls: list[ToolSelection] = llm.get_tool_calls_from_response(
-            response, error_on_no_tool_call=False
-        )
-        if len(tool_calls) == 0:
             chat_history.append(response.message)
+            await self._record_messages(ctx, chat_history, active_speaker)
             await ctx.set("chat_history", chat_history)
-            return StopEvent(
-                result={
-                    "response": response.message.content,
-                    "chat_history": chat_history,
-                }
-            )
-
-        await ctx.set("num_tool_calls", len(tool_calls))
 
-        for tool_call in tool_calls:
-            if tool_call.tool_name == "RequestTransfer":
-                await ctx.set("active_speaker", None)
-                ctx.write_event_to_stream(
-                    ProgressEvent(msg="Agent is requesting a transfer. Please hold.")
+            if self.fuse_tool_calls and not pending:
+                # nothing to wait for: run the tools here and go back to the agent
+                results = answered + await self._run_tools(
+                    ctx, to_run, agent_config.tools
                 )
-                return OrchestratorEvent()
-            elif tool_call.tool_name in agent_config.tools_requiring_human_confirmation:
-                ctx.write_event_to_stream(
-                    ToolRequestEvent(
-                        prefix=f"Tool {tool_call.tool_name} requires human approval.",
-                        tool_name=tool_call.tool_name,
-                        tool_kwargs=tool_call.tool_kwargs,
-                        tool_id=tool_call.tool_id,
-                    )
+                chat_history.extend(
+                    _ordered_results(results, tool_call_ids, duplicates)
                 )
-            else:
+                await self._record_messages(ctx, chat_history, active_speaker)
+                await ctx.set("chat_history", chat_history)
+                continue
+
+            await ctx.set("tool_call_ids", tool_call_ids)
+            await ctx.set("num_tool_calls", len(tool_calls))
+            await ctx.set("duplicate_tool_calls", duplicates)
+            for message in answered:
+                mark("event", "ToolCallResultEvent")
+                ctx.send_event(ToolCallResultEvent(chat_message=message))
+            for tool_call in to_run:
+                mark("event", "ToolCallEvent", tool_call.tool_name)
                 ctx.send_event(
                     ToolCallEvent(tool_call=tool_call, tools=agent_config.tools)
                 )
+            if pending:
+                await self._request_approvals(ctx, pending, policy)
+            return None
 
-        chat_history.append(response.message)
-        await ctx.set("chat_history", chat_history)
+    async def _request_approvals(
+        self,
+        ctx: Context,
+        requests: list[ToolRequestEvent],
+        policy: ApprovalPolicy | None,
+    ) -> None:
+        """Emits one batch approval event, and arms its timeout if the policy has one."""
+        batch = ToolBatchRequestEvent(
+            prefix=f"{len(requests)} tool call(s) require human approval.",
+            batch_id=str(uuid.uuid4()),
+            requests=requests,
+            timeout=policy.timeout if policy else None,
+        )
+
+        pending_approvals = await ctx.get("pending_approvals", default={})
+        for request in requests:
+            pending_approvals[request.tool_id] = batch.batch_id
+            begin("approval", request.tool_name, key=request.tool_id)
+        await ctx.set("pending_approvals", pending_approvals)
+
+        ctx.write_event_to_stream(batch)
+
+        if batch.timeout is not None:
+            self._approval_timers[batch.batch_id] = asyncio.create_task(
+                self._expire_approvals(ctx, batch, policy.approve_on_timeout)
+            )
+
+    async def _expire_approvals(
+        self, ctx: Context, batch: ToolBatchRequestEvent, approve: bool
+    ) -> None:
+        """Applies the default outcome to requests nobody answered in time."""
+        await asyncio.sleep(batch.timeout)
+        self._approval_timers.pop(batch.batch_id, None)
+
+        pending_approvals = await ctx.get("pending_approvals", default={})
+        expired = [r for r in batch.requests if r.tool_id in pending_approvals]
+        if not expired:
+            return
+
+        outcome = "approved" if approve else "denied"
+        mark("event", "ToolBatchApprovedEvent", f"timeout, {outcome}")
+        decisions = [
+            ToolApprovedEvent(
+                tool_name=request.tool_name,
+                tool_id=request.tool_id,
+                tool_kwargs=request.tool_kwargs,
+                approved=approve,
+                response=None if approve else DEFAULT_APPROVAL_TIMEOUT_STR,
+            )
+            for request in expired
+        ]
+        ctx.write_event_to_stream(
+            ApprovalsExpiredEvent(
+                msg=f"No decision after {batch.timeout}s; {outcome} {len(expired)} pending tool call(s).",
+                batch_id=batch.batch_id,
+                decisions=decisions,
+            )
+        )
+        ctx.send_event(
+            ToolBatchApprovedEvent(batch_id=batch.batch_id, decisions=decisions)
+        )
 
     @step
     async def handle_tool_approval(
-        self, ctx: Context, ev: ToolApprovedEvent
+        self, ctx: Context, ev: ToolApprovedEvent | ToolBatchApprovedEvent
     ) -> ToolCallEvent | ToolCallResultEvent:
-        """Handles the approval or rejection of a tool call."""
-        if ev.approved:
-            active_speaker = await ctx.get("active_speaker")
-            agent_config = (await ctx.get("agent_configs"))[active_speaker]
-            return ToolCallEvent(
-                tools=agent_config.tools,
-                tool_call=ToolSelection(
-                    tool_id=ev.tool_id,
-                    tool_name=ev.tool_name,
-                    tool_kwargs=ev.tool_kwargs,
-                ),
+        """Handles the approval or rejection of one tool call, or of a batch."""
+        decisions = ev.decisions if isinstance(ev, ToolBatchApprovedEvent) else [ev]
+
+        # the first decision for a tool call wins; late answers and timeouts are dropped
+        pending_approvals = await ctx.get("pending_approvals", default={})
+        decisions = [d for d in decisions if d.tool_id in pending_approvals]
+        for decision in decisions:
+            finish(decision.tool_id, "approved" if decision.approved else "denied")
+            batch_id = pending_approvals.pop(decision.tool_id)
+            if batch_id not in pending_approvals.values():
+                timer = self._approval_timers.pop(batch_id, None)
+                if timer is not None:
+                    timer.cancel()
+        await ctx.set("pending_approvals", pending_approvals)
+
+        active_speaker = await ctx.get("active_speaker")
+        agent_config = (await ctx.get("agent_configs"))[active_speaker]
+        for decision in decisions:
+            mark(
+                "event", "ToolCallEvent" if decision.approved else "ToolCallResultEvent"
             )
-        else:
-            return ToolCallResultEvent(
-                chat_message=ChatMessage(
-                    role="tool",
-                    content=ev.response or self.default_tool_reject_str,
-                    additional_kwargs={"tool_call_id": ev.tool_id},
+            if decision.approved:
+                ctx.send_event(
+                    ToolCallEvent(
+                        tools=agent_config.tools,
+                        tool_call=ToolSelection(
+                            tool_id=decision.tool_id,
+                            tool_name=decision.tool_name,
+                            tool_kwargs=decision.tool_kwargs,
+                        ),
+                    )
                 )
+            else:
+                ctx.send_event(
+                    ToolCallResultEvent(
+                        chat_message=ChatMessage(
+                            role="tool",
+                            content=decision.response or self.default_tool_reject_str,
+                            additional_kwargs={"tool_call_id": decision.tool_id},
+                        )
+                    )
+                )
+
+    @step
+    async def run_command(self, ctx: Context, ev: CommandEvent) -> StopEvent:
+        """Runs a command's tool and answers from its template, as the agent would have."""
+        agent_config: AgentConfig = (await ctx.get("agent_configs"))[ev.agent_name]
+        chat_history = await ctx.get("chat_history")
+        tool_call = ToolSelection(
+            tool_id=f"call_{uuid.uuid4().hex[:24]}",
+            tool_name=ev.command.tool_name,
+            tool_kwargs=ev.tool_kwargs,
+        )
+        ctx.write_event_to_stream(
+            ProgressEvent(
+                msg=f"Handling this as a {tool_call.tool_name} command of {ev.agent_name}"
+            )
+        )
+
+        # recorded like the agent's own call, so later turns read the same either way
+        chat_history.append(
+            ChatMessage(
+                role="assistant",
+                content=None,
+                additional_kwargs={
+                    "tool_calls": [
+                        {
+                            "id": tool_call.tool_id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_call.tool_name,
+                                "arguments": json.dumps(tool_call.tool_kwargs),
+                            },
+                        }
+                    ]
+                },
             )
+        )
+        tool_msg = await self._run_tool(ctx, tool_call, agent_config.tools)
+        # rendered from the wrapped output, so long results stay out of the history
+        response = ev.command.render(tool_msg.content, tool_call.tool_kwargs)
+        chat_history.append(tool_msg)
+        chat_history.append(ChatMessage(role="assistant", content=response))
+        await self._record_messages(ctx, chat_history, ev.agent_name)
+        await ctx.set("chat_history", chat_history)
+
+        # follow-ups go to the agent, as if it had been routed to
+        await ctx.set("active_speaker", ev.agent_name)
+        await self._end_turn(ctx)
+        return StopEvent(result={"response": response, "chat_history": chat_history})
 
-    @step(num_workers=4)
+    @step(num_workers=TOOL_WORKERS)
     async def handle_tool_call(
         self, ctx: Context, ev: ToolCallEvent
     ) -> ActiveSpeakerEvent:
         """Handles the execution of a tool call."""
-        tool_call = ev.tool_call
-        tools_by_name = {tool.metadata.get_name(): tool for tool in ev.tools}
+        tool_msg = await self._run_tool(ctx, ev.tool_call, ev.tools)
+        return ToolCallResultEvent(chat_message=tool_msg)
+
+    async def _run_tools(
+        self, ctx: Context, tool_calls: list[ToolSelection], tools: list[BaseTool]
+    ) -> list[ChatMessage]:
+        """Runs tool calls concurrently, as many at a time as `handle_tool_call` does."""
+        limit = asyncio.Semaphore(TOOL_WORKERS)
+
+        async def run(tool_call: ToolSelection) -> ChatMessage:
+            async with limit:
+                return await self._run_tool(ctx, tool_call, tools)
 
-        tool_msg = None
+        return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
 
+    async def _run_tool(
+        self, ctx: Context, tool_call: ToolSelection, tools: list[BaseTool]
+    ) -> ChatMessage:
+        """Runs one tool call and wraps its output (or error) in a tool message."""
+        tools_by_name = {
+            tool.metadata.get_name(): tool for tool in [read_tool_output_tool, *tools]
+        }
         tool = tools_by_name.get(tool_call.tool_name)
         additional_kwargs = {
             "tool_call_id": tool_call.tool_id,
-            "name": tool.metadata.get_name(),
+            "name": tool_call.tool_name,
         }
+
         if not tool:
             tool_msg = ChatMessage(
                 role="tool",
                 content=f"Tool {tool_call.tool_name} does not exist",
                 additional_kwargs=additional_kwargs,
             )
-
-        try:
-            if isinstance(tool, FunctionToolWithContext):
-                tool_output = await tool.acall(ctx, **tool_call.tool_kwargs)
-            else:
-                tool_output = await tool.acall(**tool_call.tool_kwargs)
-
-            tool_msg = ChatMessage(
-                role="tool",
-                content=tool_output.content,
-                additional_kwargs=additional_kwargs,
-            )
-        except Exception as e:
-            tool_msg = ChatMessage(
-                role="tool",
-                content=f"Encountered error in tool call: {e}",
-                additional_kwargs=additional_kwargs,
-            )
+        else:
+            try:
+                with traced(
+                    "tool", tool_call.tool_name, preview(str(tool_call.tool_kwargs), 80)
+                ):
+                    if isinstance(tool, FunctionToolWithContext):
+                        tool_output = await tool.acall(ctx, **tool_call.tool_kwargs)
+                    else:
+                        tool_output = await tool.acall(**tool_call.tool_kwargs)
+
+                content = tool_output.content
+                if tool is not read_tool_output_tool:
+                    # pages of stored outputs are already bounded
+                    content = self.tool_outputs.wrap(content)
+                tool_msg = ChatMessage(
+                    role="tool",
+                    content=content,
+                    additional_kwargs=additional_kwargs,
+                )
+            except Exception as e:
+                tool_msg = ChatMessage(
+                    role="tool",
+                    content=f"Encountered error in tool call: {e}",
+                    additional_kwargs=additional_kwargs,
+                )
 
         ctx.write_event_to_stream(
             ProgressEvent(
-                msg=f"Tool {tool_call.tool_name} called with {tool_call.tool_kwargs} returned {tool_msg.content}"
+                msg=f"Tool {tool_call.tool_name} called with {tool_call.tool_kwargs} returned {preview(tool_msg.content)}"
             )
         )
-
-        return ToolCallResultEvent(chat_message=tool_msg)
+        return tool_msg
 
     @step
     async def aggregate_tool_results(
@@ -302,8 +1048,14 @@ class ConciergeAgent(Workflow):
             return
 
         chat_history = await ctx.get("chat_history")
-        for result in results:
-            chat_history.append(result.chat_message)
+        chat_history.extend(
+            _ordered_results(
+                [result.chat_message for result in results],
+                await ctx.get("tool_call_ids", default=[]),
+                await ctx.get("duplicate_tool_calls", default={}),
+            )
+        )
+        await self._record_messages(ctx, chat_history, await ctx.get("active_speaker"))
         await ctx.set("chat_history", chat_history)
 
         return ActiveSpeakerEvent()
@@ -318,28 +1070,43 @@ class ConciergeAgent(Workflow):
 
         agent_context_str = ""
         for agent_name, agent_config in agent_configs.items():
-            agent_context_str += f"{agent_name}: {agent_config.description}\n"
-
-        user_state = await ctx.get("user_state")
-        user_state_str = "\n".join([f"{k}: {v}" for k, v in user_state.items()])
+            agent_context_str += f"{agent_name}: {agent_config.description}"
+            requirements = [
+                p.describe() for p in agent_config.preconditions if p.tools is None
+            ]
+            if requirements:
+                agent_context_str += f" ({'; '.join(requirements)})"
+            agent_context_str += "\n"
+
+        # the state goes after the history, so the roster stays a cacheable prefix
         system_prompt = self.orchestrator_prompt.format(
-            agent_context_str=agent_context_str, user_state_str=user_state_str
+            agent_context_str=agent_context_str, user_state_str=STATE_PLACEHOLDER
         )
+        if self.fan_out:
+            system_prompt += FAN_OUT_PROMPT
 
-        llm_input = [ChatMessage(role="system", content=system_prompt)] + chat_history
+        llm_input = self.prompt_builder.messages(
+            system_prompt, chat_history, await ctx.get("state_store")
+        )
         llm = await ctx.get("llm")
 
         # convert the TransferToAgent pydantic model to a tool
         tools = [get_function_tool(TransferToAgent)]
 
-        response = await llm.achat_with_tools(tools, chat_history=llm_input)
-        tool_calls = llm.get_tool_calls_from_response(
-            response, error_on_no_tool_call=False
+        model = self.orchestrator_llm or ModelSpec.coerce(llm)
+        response, tool_calls = await model.achat_with_tool_calls(
+            tools,
+            llm_input,
+            default=llm,
+            on_fallback=lambda msg: ctx.write_event_to_stream(ProgressEvent(msg=msg)),
+            allow_parallel_tool_calls=self.fan_out,
         )
+        self.prompt_builder.record_usage("Orchestrator", response)
 
         # if no tool calls were made, the orchestrator probably needs more information
         if len(tool_calls) == 0:
             chat_history.append(response.message)
+            await self._end_turn(ctx)
             return StopEvent(
                 result={
                     "response": response.message.content,
@@ -347,8 +1114,17 @@ class ConciergeAgent(Workflow):
                 }
             )
 
-        tool_call = tool_calls[0]
-        selected_agent = tool_call.tool_kwargs["agent_name"]
+        selected_agents = list(
+            dict.fromkeys(
+                tool_call.tool_kwargs["agent_name"]
+                for tool_call in tool_calls
+                if tool_call.tool_kwargs.get("agent_name") in agent_configs
+            )
+        )
+        if self.fan_out and len(selected_agents) > 1:
+            return await self._fan_out(ctx, selected_agents)
+
+        selected_agent = tool_calls[0].tool_kwargs["agent_name"]
         await ctx.set("active_speaker", selected_agent)
 
         ctx.write_event_to_stream(
@@ -356,3 +1132,183 @@ class ConciergeAgent(Workflow):
         )
 
         return ActiveSpeakerEvent()
+
+    # ---- Fan-out ----
+
+    async def _fan_out(self, ctx: Context, agent_names: list[str]) -> StopEvent:
+        """Runs several agents concurrently on one message and merges their answers.
+
+        Each agent works on its own copy of the conversation and of the user state;
+        the keys they write are merged back once all of them are done. Writes of an
+        agent that failed are dropped, and so are those of a key more than one agent
+        wrote, which keeps its value from before.
+        """
+        chat_history = await ctx.get("chat_history")
+        store: UserStateStore = await ctx.get("state_store")
+        branches = {name: store.branch() for name in agent_names}
+
+        ctx.write_event_to_stream(
+            ProgressEvent(msg=f"Transferring to agents {', '.join(agent_names)}")
+        )
+        answers = await asyncio.gather(
+            *(
+                self._run_branch(ctx, name, chat_history, branches[name])
+                for name in agent_names
+            ),
+            return_exceptions=True,
+        )
+
+        # an agent that failed changes nothing, and a key several agents wrote keeps
+        # its value from before: none of them saw what the others wrote
+        writers: dict[str, list[str]] = {}
+        for name, answer in zip(agent_names, answers):
+            if not isinstance(answer, BaseException):
+                for key in branches[name].written_keys():
+                    writers.setdefault(key, []).append(name)
+        conflicts = {key: names for key, names in writers.items() if len(names) > 1}
+        await store.merge(
+            {
+                key: branches[names[0]].data.get(key)
+                for key, names in writers.items()
+                if key not in conflicts
+            }
+        )
+
+        sections = []
+        for name, answer in zip(agent_names, answers):
+            if isinstance(answer, BaseException):
+                answer = f"Something went wrong: {str(answer) or type(answer).__name__}"
+            if answer:
+                sections.append(f"{name}:\n{answer}")
+        for key, names in conflicts.items():
+            msg = f"{' and '.join(names)} each changed {key}, so it was left as it was."
+            ctx.write_event_to_stream(ProgressEvent(msg=msg))
+            sections.append(msg)
+        response = "\n\n".join(sections)
+
+        chat_history.append(ChatMessage(role="assistant", content=response))
+        await ctx.set("chat_history", chat_history)
+        await ctx.set("active_speaker", None)
+        await self._end_turn(ctx)
+        return StopEvent(result={"response": response, "chat_history": chat_history})
+
+    async def _run_branch(
+        self,
+        ctx: Context,
+        agent_name: str,
+        chat_history: ConversationStore,
+        store: UserStateStore,
+    ) -> str:
+        """Lets one agent answer its part of the message, without a human in the loop."""
+        start = time.monotonic()
+        agent_config: AgentConfig = (await ctx.get("agent_configs"))[agent_name]
+        llm = await ctx.get("llm")
+        model = agent_config.llm or ModelSpec.coerce(llm)
+        tools = self._agent_tools(agent_config)
+        # the branch's own messages only go into this copy
+        history = list(await self._agent_history(ctx, agent_name, chat_history))
+
+        answer = ""
+        missing = unmet_preconditions(agent_config.preconditions, store.data)
+        if missing:
+            answer = "This has to wait: " + "; ".join(p.describe() for p in missing)
+        else:
+            with use_branch(store):
+                for _ in range(MAX_BRANCH_STEPS):
+                    response, tool_calls = await model.achat_with_tool_calls(
+                        tools,
+                        self._agent_llm_input(agent_config, history, store),
+                        default=llm,
+                        on_fallback=lambda msg: ctx.write_event_to_stream(
+                            ProgressEvent(msg=msg)
+                        ),
+                    )
+                    self.prompt_builder.record_usage(agent_name, response)
+                    if not tool_calls:
+                        answer = response.message.content or ""
+                        break
+
+                    history.append(response.message)
+                    unique, duplicates = _dedupe_tool_calls(
+                        tool_calls, agent_config.tools
+                    )
+                    for message in await asyncio.gather(
+                        *(
+                            self._run_branch_tool(ctx, agent_config, tool_call, store)
+                            for tool_call in unique
+                        )
+                    ):
+                        # copies go right after the original they repeat
+                        history.append(message)
+                        for tool_id in duplicates.get(
+                            message.additional_kwargs.get("tool_call_id"), []
+                        ):
+                            history.append(_with_tool_call_id(message, tool_id))
+
+        ctx.write_event_to_stream(
+            AgentTimingEvent(agent_name=agent_name, duration=time.monotonic() - start)
+        )
+        return answer
+
+    async def _run_branch_tool(
+        self,
+        ctx: Context,
+        agent_config: AgentConfig,
+        tool_call: ToolSelection,
+        store: UserStateStore,
+    ) -> ChatMessage:
+        """Runs a tool for a fanned-out agent, where nobody can be asked for approval."""
+        if tool_call.tool_name == "RequestTransfer":
+            return ChatMessage(
+                role="tool",
+                content="Other agents are handling the rest of the request; just answer your part.",
+                additional_kwargs={"tool_call_id": tool_call.tool_id},
+            )
+
+        tool_call, invalid = self._check_arguments(
+            ctx, tool_call, agent_config.tools, store.data
+        )
+        if invalid is not None:
+            return invalid
+
+        refusal = None
+        if missing := unmet_preconditions(
+            agent_config.preconditions,
+            store.data,
+            tool_call.tool_name,
+            tool_call.tool_kwargs,
+        ):
+            refusal = f"Tool {tool_call.tool_name} can't run yet: " + "; ".join(
+                p.describe() for p in missing
+            )
+        elif tool_call.tool_name in agent_config.tools_requiring_human_confirmation:
+            policy = agent_config.approval_policy
+            rule = (
+                policy.evaluate(tool_call.tool_name, tool_call.tool_kwargs, store.data)
+                if policy
+                else None
+            )
+            if rule is None:
+                refusal = (
+                    f"Tool {tool_call.tool_name} needs the user's approval, which can't "
+                    "be asked for while several agents are working. Tell the user to ask "
+                    "for it again on its own."
+                )
+            else:
+                ctx.write_event_to_stream(
+                    ProgressEvent(
+                        msg=describe_decision(
+                            rule, tool_call.tool_name, tool_call.tool_kwargs
+                        )
+                    )
+                )
+                if rule.decision == "deny":
+                    refusal = rule.reason or self.default_tool_reject_str
+
+        if refusal is not None:
+            return ChatMessage(
+                role="tool",
+                content=refusal,
+                additional_kwargs={"tool_call_id": tool_call.tool_id},
+            )
+        return await self._run_tool(ctx, tool_call, agent_config.tools)